@@ -0,0 +1,482 @@
+"""Générateur de données synthétiques à l'échelle de la production.
+
+Insère en masse des utilisateurs, un graphe de suivi en loi de puissance, des
+séances complètes (exercices + séries), des partages, des likes et des
+conversations. Les lignes sont produites en flux et écrites par lots :
+``executemany`` sur SQLite, ``COPY ... FROM STDIN`` sur PostgreSQL.
+
+Le résultat est reproductible : même graine + même date d'ancrage = mêmes
+identifiants et mêmes contenus.
+
+Usage :
+    DATABASE_URL=sqlite:///load.db python scripts/generate_dataset.py --scale medium
+    python scripts/generate_dataset.py --users 100000 --sets 10000000 --seed 7
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import random
+import time
+import uuid
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any
+
+from sqlalchemy import Table, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from api.db import get_engine, init_db
+from api.models import (
+    Conversation,
+    Exercise,
+    Follower,
+    Like,
+    Message,
+    Set,
+    Share,
+    User,
+    Workout,
+    WorkoutExercise,
+    message_preview,
+)
+from api.seeds import seed_exercises
+from api.services.conversations import canonical_pair
+from api.utils.auth import hash_password
+
+LOAD_PASSWORD = "LoadTest123"
+
+WORKOUT_TITLES = (
+    "Push Day", "Pull Day", "Leg Day", "Upper Body", "Lower Body", "Full Body",
+    "Séance Pecs", "Séance Dos", "Jambes", "Épaules & Bras",
+)
+MESSAGE_SNIPPETS = (
+    "Bien joué pour la séance !", "Tu fais quoi demain ?", "On s'entraîne ensemble ?",
+    "Nouveau PR au squat 💪", "Tu utilises quel programme ?", "Merci pour le conseil",
+)
+
+
+@dataclass(frozen=True)
+class DatasetConfig:
+    users: int = 1_000
+    sets: int = 100_000
+    avg_following: int = 20
+    follow_alpha: float = 1.1  # exposant de Zipf : popularité ∝ 1 / rang^alpha
+    exercises_per_workout: int = 5
+    sets_per_exercise: int = 4
+    share_ratio: float = 0.1
+    likes: int = 50_000
+    conversations: int = 2_000
+    messages_per_conversation: int = 20
+    history_days: int = 90
+    seed: int = 42
+    batch_size: int = 5_000
+    prefix: str = "load"
+
+
+SCALES: dict[str, DatasetConfig] = {
+    "small": DatasetConfig(users=200, sets=10_000, likes=2_000, conversations=100),
+    "medium": DatasetConfig(),
+    "large": DatasetConfig(
+        users=100_000, sets=10_000_000, likes=5_000_000,
+        conversations=200_000, batch_size=20_000,
+    ),
+}
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+class _BulkWriter:
+    """Écrit des lignes par lots : executemany (SQLite) ou COPY (PostgreSQL)."""
+
+    def __init__(self, conn: Connection, batch_size: int) -> None:
+        self.conn = conn
+        self.batch_size = batch_size
+        self.use_copy = conn.dialect.name == "postgresql"
+        self.counts: dict[str, int] = {}
+
+    def write(self, table: Table, rows: Iterable[dict[str, Any]]) -> int:
+        batch: list[dict[str, Any]] = []
+        total = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                total += self._flush(table, batch)
+                batch = []
+        if batch:
+            total += self._flush(table, batch)
+        return total
+
+    def _flush(self, table: Table, batch: list[dict[str, Any]]) -> int:
+        if self.use_copy:
+            self._copy(table, batch)
+        else:
+            self.conn.execute(insert(table), batch)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(batch)
+        return len(batch)
+
+    def _copy(self, table: Table, batch: list[dict[str, Any]]) -> None:
+        columns = list(batch[0].keys())
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in batch:
+            # CSV : champ vide non quoté = NULL pour COPY
+            writer.writerow(["" if row[c] is None else row[c] for c in columns])
+        buf.seek(0)
+        col_list = ", ".join(f'"{c}"' for c in columns)
+        raw = self.conn.connection.dbapi_connection
+        with raw.cursor() as cursor:
+            cursor.copy_expert(f'COPY "{table.name}" ({col_list}) FROM STDIN WITH (FORMAT csv)', buf)
+
+
+class _Buffers:
+    """Tampons multi-tables vidés dans l'ordre parent → enfant."""
+
+    def __init__(self, writer: _BulkWriter, tables: list[Table]) -> None:
+        self.writer = writer
+        self.tables = tables
+        self.rows: dict[str, list[dict[str, Any]]] = {t.name: [] for t in tables}
+
+    def add(self, table: Table, row: dict[str, Any]) -> None:
+        bucket = self.rows[table.name]
+        bucket.append(row)
+        if len(bucket) >= self.writer.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        for table in self.tables:
+            bucket = self.rows[table.name]
+            if bucket:
+                self.writer._flush(table, bucket)
+                self.rows[table.name] = []
+
+
+def _popularity_cum_weights(n: int, alpha: float, rng: random.Random) -> tuple[list[int], list[float]]:
+    """Ordre de popularité aléatoire + poids cumulés Zipf (rang 1 = le plus suivi)."""
+    order = list(range(n))
+    rng.shuffle(order)
+    weights = [1.0 / (rank ** alpha) for rank in range(1, n + 1)]
+    return order, list(accumulate(weights))
+
+
+def _weighted_index(rng: random.Random, cum_weights: list[float]) -> int:
+    return bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+
+def _user_rows(cfg: DatasetConfig, rng: random.Random, anchor: datetime, user_ids: list[str]) -> Iterator[dict]:
+    password_hash = hash_password(LOAD_PASSWORD)
+    for i, user_id in enumerate(user_ids):
+        yield {
+            "id": user_id,
+            "username": f"{cfg.prefix}_{i:06d}",
+            "email": f"{cfg.prefix}_{i:06d}@load.test",
+            "password_hash": password_hash,
+            "created_at": anchor - timedelta(days=cfg.history_days, seconds=rng.randrange(86_400)),
+            "consent_to_public_share": True,
+            "profile_completed": True,
+            "email_verified": True,
+            "login_count": 0,
+            "subscription_tier": "free",
+            "ai_programs_generated": 0,
+        }
+
+
+def _follower_rows(
+    cfg: DatasetConfig,
+    rng: random.Random,
+    anchor: datetime,
+    user_ids: list[str],
+    popularity: tuple[list[int], list[float]],
+) -> Iterator[dict]:
+    order, cum_weights = popularity
+    n = len(user_ids)
+    max_follow = max(0, n - 1)
+    for follower in range(n):
+        # Nombre d'abonnements ~ exponentielle autour de la moyenne
+        wanted = min(max_follow, int(rng.expovariate(1 / cfg.avg_following)) if cfg.avg_following else 0)
+        chosen: set[int] = set()
+        attempts = 0
+        while len(chosen) < wanted and attempts < wanted * 4:
+            attempts += 1
+            followed = order[_weighted_index(rng, cum_weights)]
+            if followed != follower:
+                chosen.add(followed)
+        for followed in sorted(chosen):
+            yield {
+                "id": _uuid(rng),
+                "follower_id": user_ids[follower],
+                "followed_id": user_ids[followed],
+                "created_at": anchor - timedelta(seconds=rng.randrange(cfg.history_days * 86_400)),
+            }
+
+
+def _write_workouts(
+    cfg: DatasetConfig,
+    rng: random.Random,
+    anchor: datetime,
+    writer: _BulkWriter,
+    user_ids: list[str],
+    exercise_ids: list[str],
+) -> list[tuple[str, int]]:
+    """Séances terminées + exercices + séries + partages. Retourne [(share_id, owner_idx)]."""
+    workout_t = Workout.__table__
+    we_t = WorkoutExercise.__table__
+    set_t = Set.__table__
+    share_t = Share.__table__
+    buffers = _Buffers(writer, [workout_t, we_t, set_t, share_t])
+
+    sets_per_workout = cfg.exercises_per_workout * cfg.sets_per_exercise
+    n_workouts = max(1, cfg.sets // sets_per_workout) if cfg.sets else 0
+    shares: list[tuple[str, int]] = []
+
+    for _ in range(n_workouts):
+        owner = rng.randrange(len(user_ids))
+        ended = anchor - timedelta(seconds=rng.randrange(cfg.history_days * 86_400))
+        started = ended - timedelta(minutes=rng.randint(40, 100))
+        workout_id = _uuid(rng)
+        title = rng.choice(WORKOUT_TITLES)
+        buffers.add(workout_t, {
+            "id": workout_id,
+            "user_id": user_ids[owner],
+            "client_id": None,
+            "title": title,
+            "status": "completed",
+            "started_at": started,
+            "ended_at": ended,
+            "deleted_at": None,
+            "created_at": started,
+            "updated_at": ended,
+        })
+        for order_index in range(cfg.exercises_per_workout):
+            we_id = _uuid(rng)
+            buffers.add(we_t, {
+                "id": we_id,
+                "client_id": None,
+                "workout_id": workout_id,
+                "exercise_id": rng.choice(exercise_ids),
+                "order_index": order_index,
+                "planned_sets": cfg.sets_per_exercise,
+                "notes": None,
+                "created_at": started,
+                "updated_at": ended,
+            })
+            base_weight = rng.randint(10, 120)
+            for set_index in range(cfg.sets_per_exercise):
+                done_at = started + timedelta(minutes=order_index * 12 + set_index * 3)
+                buffers.add(set_t, {
+                    "id": _uuid(rng),
+                    "client_id": None,
+                    "workout_exercise_id": we_id,
+                    "order": set_index,
+                    "reps": rng.randint(5, 15),
+                    "weight": float(base_weight + rng.choice((-5, 0, 0, 2.5, 5))),
+                    "rpe": round(rng.uniform(6.5, 9.5), 1),
+                    "duration_seconds": None,
+                    "completed": True,
+                    "done_at": done_at,
+                    "created_at": done_at,
+                    "updated_at": done_at,
+                })
+        if rng.random() < cfg.share_ratio:
+            share_id = _uuid(rng)
+            shares.append((share_id, owner))
+            buffers.add(share_t, {
+                "share_id": share_id,
+                "owner_id": user_ids[owner],
+                "owner_username": f"{cfg.prefix}_{owner:06d}",
+                "workout_id": workout_id,
+                "workout_title": title,
+                "exercise_count": cfg.exercises_per_workout,
+                "set_count": sets_per_workout,
+                "caption": None,
+                "color": None,
+                "image_url": None,
+                "created_at": ended,
+            })
+    buffers.flush()
+    return shares
+
+
+def _like_rows(
+    cfg: DatasetConfig,
+    rng: random.Random,
+    anchor: datetime,
+    user_ids: list[str],
+    shares: list[tuple[str, int]],
+    popularity: tuple[list[int], list[float]],
+) -> Iterator[dict]:
+    """Likes concentrés sur les partages des comptes populaires."""
+    if not shares:
+        return
+    order, _ = popularity
+    rank_of = {user: rank for rank, user in enumerate(order, start=1)}
+    share_cum = list(accumulate(1.0 / (rank_of[owner] ** cfg.follow_alpha) for _, owner in shares))
+    n_users = len(user_ids)
+    target = min(cfg.likes, len(shares) * n_users)
+    seen: set[int] = set()
+    attempts = 0
+    while len(seen) < target and attempts < target * 4:
+        attempts += 1
+        share_idx = _weighted_index(rng, share_cum)
+        user_idx = rng.randrange(n_users)
+        key = share_idx * n_users + user_idx
+        if key in seen:
+            continue
+        seen.add(key)
+        yield {
+            "id": _uuid(rng),
+            "share_id": shares[share_idx][0],
+            "user_id": user_ids[user_idx],
+            "created_at": anchor - timedelta(seconds=rng.randrange(cfg.history_days * 86_400)),
+        }
+
+
+def _write_conversations(
+    cfg: DatasetConfig,
+    rng: random.Random,
+    anchor: datetime,
+    writer: _BulkWriter,
+    user_ids: list[str],
+) -> None:
+    conv_t = Conversation.__table__
+    msg_t = Message.__table__
+    buffers = _Buffers(writer, [conv_t, msg_t])
+    n = len(user_ids)
+    if n < 2:
+        return
+    pairs: set[tuple[int, int]] = set()
+    target = min(cfg.conversations, n * (n - 1) // 2)
+    while len(pairs) < target:
+        a, b = rng.sample(range(n), 2)
+        pairs.add((min(a, b), max(a, b)))
+
+    for a, b in sorted(pairs):
+        # Même ordre que l'API : participant1_id < participant2_id (index unique)
+        participant1_id, participant2_id = canonical_pair(user_ids[a], user_ids[b])
+        conv_id = _uuid(rng)
+        started = anchor - timedelta(seconds=rng.randrange(cfg.history_days * 86_400))
+        count = max(1, int(rng.expovariate(1 / cfg.messages_per_conversation)))
+        created = started
+        rows = []
+        for i in range(count):
+            created = created + timedelta(seconds=rng.randint(30, 7_200))
+            sender = participant1_id if rng.random() < 0.5 else participant2_id
+            rows.append({
+                "id": _uuid(rng),
+                "conversation_id": conv_id,
+                "sender_id": sender,
+                "content": rng.choice(MESSAGE_SNIPPETS),
+                # La lecture est portée par la conversation (participant*_last_read_at)
+                "read_at": None,
+                "created_at": created,
+            })
+        # Les deux derniers messages restent non lus : chacun a lu jusqu'au
+        # dernier message reçu avant eux
+        read = rows[:-2]
+        last_read = {
+            reader: max((r["created_at"] for r in read if r["sender_id"] != reader), default=None)
+            for reader in (participant1_id, participant2_id)
+        }
+        unread = {
+            reader: sum(r["sender_id"] != reader and (mark is None or r["created_at"] > mark) for r in rows)
+            for reader, mark in last_read.items()
+        }
+        # Colonnes dénormalisées écrites explicitement : COPY n'applique pas les défauts Python
+        last = rows[-1]
+        buffers.add(conv_t, {
+            "id": conv_id,
+            "participant1_id": participant1_id,
+            "participant2_id": participant2_id,
+            "last_message_at": created,
+            "last_message_id": last["id"],
+            "last_message_sender_id": last["sender_id"],
+            "last_message_preview": message_preview(last["content"]),
+            "participant1_unread": unread[participant1_id],
+            "participant2_unread": unread[participant2_id],
+            "participant1_last_read_at": last_read[participant1_id],
+            "participant2_last_read_at": last_read[participant2_id],
+            "created_at": started,
+        })
+        for row in rows:
+            buffers.add(msg_t, row)
+    buffers.flush()
+
+
+def generate_dataset(
+    cfg: DatasetConfig,
+    engine: Engine | None = None,
+    anchor: datetime | None = None,
+) -> dict[str, Any]:
+    """Génère le jeu de données dans la base pointée par ``engine``.
+
+    Retourne le nombre de lignes insérées par table et la durée totale.
+    """
+    if engine is None:
+        seed_exercises(force=False)
+        engine = get_engine()
+    anchor = anchor or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    rng = random.Random(cfg.seed)
+    start = time.perf_counter()
+
+    with engine.connect() as conn:
+        exercise_ids = sorted(conn.execute(select(Exercise.__table__.c.id)).scalars())
+        existing = conn.execute(
+            select(func.count()).select_from(User.__table__)
+            .where(User.__table__.c.username == f"{cfg.prefix}_000000")
+        ).scalar_one()
+    if existing:
+        raise RuntimeError(f"dataset '{cfg.prefix}' already present; use another --prefix")
+    if not exercise_ids:
+        raise RuntimeError("exercise catalogue is empty")
+
+    user_ids = [_uuid(rng) for _ in range(cfg.users)]
+    popularity = _popularity_cum_weights(cfg.users, cfg.follow_alpha, rng)
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        writer = _BulkWriter(conn, cfg.batch_size)
+        writer.write(User.__table__, _user_rows(cfg, rng, anchor, user_ids))
+        writer.write(Follower.__table__, _follower_rows(cfg, rng, anchor, user_ids, popularity))
+        shares = _write_workouts(cfg, rng, anchor, writer, user_ids, exercise_ids)
+        writer.write(Like.__table__, _like_rows(cfg, rng, anchor, user_ids, shares, popularity))
+        _write_conversations(cfg, rng, anchor, writer, user_ids)
+
+    return {
+        "rows": dict(writer.counts),
+        "user_ids": user_ids,
+        "share_ids": [share_id for share_id, _ in shares],
+        "elapsed_seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def _parse_args(argv: list[str] | None = None) -> DatasetConfig:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    for name in (
+        "users", "sets", "avg_following", "likes", "conversations",
+        "messages_per_conversation", "history_days", "seed", "batch_size",
+    ):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int)
+    parser.add_argument("--follow-alpha", type=float)
+    parser.add_argument("--share-ratio", type=float)
+    parser.add_argument("--prefix")
+    args = vars(parser.parse_args(argv))
+    scale = args.pop("scale")
+    overrides = {k: v for k, v in args.items() if v is not None}
+    return replace(SCALES[scale], **overrides)
+
+
+if __name__ == "__main__":
+    config = _parse_args()
+    init_db()
+    result = generate_dataset(config)
+    for table, count in result["rows"].items():
+        print(f"{table:<20} {count:>12,}")
+    print(f"Done in {result['elapsed_seconds']}s (seed={config.seed}, password={LOAD_PASSWORD})")
@@ -0,0 +1,293 @@
+"""Harnais de test de charge local : trafic mixte rejoué contre l'API.
+
+Se connecte avec des comptes créés par ``generate_dataset.py`` puis envoie un
+mélange pondéré de requêtes (feed, sync push/pull, likes, explore, leaderboard)
+avec une concurrence fixe. Affiche le débit et les latences p50/p95/p99 par
+route ; ``--json`` écrit le rapport dans un fichier.
+
+Usage :
+    python scripts/load_test.py --base-url http://localhost:8000 --duration 30
+    python scripts/load_test.py --in-process --dataset-users 200 --requests 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+
+from generate_dataset import LOAD_PASSWORD
+
+# Poids relatifs du trafic (≈ profil observé sur l'app mobile)
+TRAFFIC_MIX: dict[str, int] = {
+    "feed": 30,
+    "sync_pull": 15,
+    "sync_push": 10,
+    "like": 15,
+    "explore_trending": 15,
+    "leaderboard_volume": 10,
+    "explore_search": 5,
+}
+
+
+@dataclass
+class RouteStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        # Rang le plus proche
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+@dataclass
+class VirtualUser:
+    username: str
+    user_id: str
+    token: str
+    last_pull_ms: int = 0
+
+
+@dataclass
+class LoadContext:
+    client: httpx.AsyncClient
+    rng: random.Random
+    share_ids: list[str] = field(default_factory=list)
+
+    def remember_shares(self, ids: list[str]) -> None:
+        self.share_ids.extend(ids)
+        if len(self.share_ids) > 5_000:
+            del self.share_ids[: len(self.share_ids) - 5_000]
+
+
+def _auth(vu: VirtualUser) -> dict[str, str]:
+    return {"Authorization": f"Bearer {vu.token}"}
+
+
+async def _feed(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    response = await ctx.client.get("/feed", params={"limit": 10}, headers=_auth(vu))
+    if response.status_code == 200:
+        ctx.remember_shares([item["share_id"] for item in response.json().get("items", [])])
+    return response
+
+
+async def _sync_pull(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    response = await ctx.client.get("/sync/pull", params={"since": vu.last_pull_ms}, headers=_auth(vu))
+    vu.last_pull_ms = int(time.time() * 1000)
+    return response
+
+
+async def _sync_push(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    now_ms = int(time.time() * 1000)
+    workout_cid = str(uuid.uuid4())
+    exercise_cid = str(uuid.uuid4())
+    mutations: list[dict[str, Any]] = [
+        {"queue_id": 1, "action": "create-workout", "created_at": now_ms,
+         "payload": {"client_id": workout_cid, "title": "Load test", "status": "draft"}},
+        {"queue_id": 2, "action": "add-exercise", "created_at": now_ms,
+         "payload": {"client_id": exercise_cid, "workoutClientId": workout_cid,
+                     "exerciseId": "load-test", "orderIndex": 0, "plannedSets": 3}},
+    ]
+    for i in range(3):
+        mutations.append({
+            "queue_id": 3 + i, "action": "add-set", "created_at": now_ms,
+            "payload": {"client_id": str(uuid.uuid4()), "exerciseClientId": exercise_cid,
+                        "payload": {"reps": ctx.rng.randint(5, 12), "weight": 60.0}},
+        })
+    return await ctx.client.post("/sync/push", json={"mutations": mutations}, headers=_auth(vu))
+
+
+async def _like(ctx: LoadContext, vu: VirtualUser) -> Optional[httpx.Response]:
+    if not ctx.share_ids:
+        return None
+    share_id = ctx.rng.choice(ctx.share_ids)
+    # user_id est encore exigé par le schéma, le serveur utilise le token
+    return await ctx.client.post(f"/likes/{share_id}", json={"user_id": vu.user_id}, headers=_auth(vu))
+
+
+async def _explore_trending(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    response = await ctx.client.get("/explore/trending", params={"limit": 20}, headers=_auth(vu))
+    if response.status_code == 200:
+        ctx.remember_shares([post["share_id"] for post in response.json()])
+    return response
+
+
+async def _leaderboard_volume(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    period = ctx.rng.choice(("week", "month", "all"))
+    return await ctx.client.get("/leaderboard/volume", params={"period": period}, headers=_auth(vu))
+
+
+async def _explore_search(ctx: LoadContext, vu: VirtualUser) -> httpx.Response:
+    query = ctx.rng.choice(("load_0", "push", "leg", "dos"))
+    return await ctx.client.get("/explore/search", params={"q": query}, headers=_auth(vu))
+
+
+SCENARIOS: dict[str, Callable[[LoadContext, VirtualUser], Awaitable[Optional[httpx.Response]]]] = {
+    "feed": _feed,
+    "sync_pull": _sync_pull,
+    "sync_push": _sync_push,
+    "like": _like,
+    "explore_trending": _explore_trending,
+    "leaderboard_volume": _leaderboard_volume,
+    "explore_search": _explore_search,
+}
+
+
+async def _login(client: httpx.AsyncClient, username: str) -> Optional[VirtualUser]:
+    response = await client.post("/auth/login", json={"username": username, "password": LOAD_PASSWORD})
+    if response.status_code != 200:
+        return None
+    token = response.json()["access_token"]
+    me = await client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    if me.status_code != 200:
+        return None
+    return VirtualUser(username=username, user_id=me.json()["id"], token=token)
+
+
+async def run_load_test(
+    client: httpx.AsyncClient,
+    usernames: list[str],
+    concurrency: int = 10,
+    duration: Optional[float] = 30.0,
+    total_requests: Optional[int] = None,
+    seed: int = 1,
+    mix: Optional[dict[str, int]] = None,
+) -> dict[str, Any]:
+    """Rejoue le trafic mixte et retourne le rapport (débit + percentiles par route)."""
+    rng = random.Random(seed)
+    mix = mix or TRAFFIC_MIX
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    users = [vu for vu in await asyncio.gather(*(_login(client, u) for u in usernames)) if vu]
+    if not users:
+        raise RuntimeError("no virtual user could log in (dataset generated? password?)")
+
+    ctx = LoadContext(client=client, rng=rng)
+    await _explore_trending(ctx, users[0])
+
+    stats: dict[str, RouteStats] = {name: RouteStats() for name in names}
+    budget = total_requests if total_requests is not None else None
+    deadline = time.perf_counter() + duration if duration else None
+    sent = 0
+
+    async def _worker() -> None:
+        nonlocal sent
+        while True:
+            if budget is not None and sent >= budget:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            sent += 1
+            name = rng.choices(names, weights)[0]
+            vu = rng.choice(users)
+            start = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](ctx, vu)
+            except httpx.HTTPError:
+                stats[name].errors += 1
+                continue
+            if response is None:
+                continue
+            stats[name].latencies_ms.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                stats[name].errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for name, route in stats.items():
+        count = len(route.latencies_ms)
+        routes[name] = {
+            "requests": count,
+            "errors": route.errors,
+            "rps": round(count / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(route.percentile(50), 2),
+            "p95_ms": round(route.percentile(95), 2),
+            "p99_ms": round(route.percentile(99), 2),
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "virtual_users": len(users),
+        "concurrency": concurrency,
+        "routes": routes,
+    }
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    print(f"{'route':<20} {'req':>7} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, r in report["routes"].items():
+        print(
+            f"{name:<20} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} "
+            f"{r['p50_ms']:>8}ms {r['p95_ms']:>8}ms {r['p99_ms']:>8}ms"
+        )
+    print(
+        f"total {report['requests']} requests in {report['elapsed_seconds']}s "
+        f"({report['rps']} req/s, {report['virtual_users']} users, concurrency {report['concurrency']})"
+    )
+
+
+async def _main(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    picked = rng.sample(range(args.dataset_users), min(args.users, args.dataset_users))
+    usernames = [f"{args.prefix}_{i:06d}" for i in picked]
+
+    if args.in_process:
+        from api.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://testserver"
+    else:
+        transport = None
+        base_url = args.base_url
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(
+        base_url=base_url, transport=transport, limits=limits, timeout=args.timeout
+    ) as client:
+        return await run_load_test(
+            client,
+            usernames,
+            concurrency=args.concurrency,
+            duration=None if args.requests else args.duration,
+            total_requests=args.requests,
+            seed=args.seed,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="appelle l'app ASGI sans serveur")
+    parser.add_argument("--dataset-users", type=int, default=1_000)
+    parser.add_argument("--prefix", default="load")
+    parser.add_argument("--users", type=int, default=50, help="utilisateurs virtuels connectés")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="secondes")
+    parser.add_argument("--requests", type=int, help="nombre total de requêtes (remplace --duration)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    report = asyncio.run(_main(args))
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
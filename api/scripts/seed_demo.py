@@ -6,12 +6,14 @@ from datetime import datetime, timezone, timedelta
 from sqlalchemy import text
 from sqlmodel import Session, select
 from src.api.db import get_engine
-from src.api.models import User, Share, Follower, Workout, WorkoutExercise, Set, Exercise, Like, Notification, Comment
+from src.api.models import User, Share, Follower, Workout, WorkoutExercise, Set, Like, Notification, Comment
+from src.api.routes.notifications import recount_unread_notifications
+from src.api.services.exercise_index import get_exercise_index
 
 
 def get_exercises_by_muscle(session: Session) -> dict:
     """Récupère les exercices groupés par groupe musculaire avec mapping simplifié."""
-    exercises = session.exec(select(Exercise)).all()
+    index = get_exercise_index(session)
     by_muscle = {}
     
     # Mapping des groupes musculaires vers des catégories simples
@@ -48,12 +50,11 @@ def get_exercises_by_muscle(session: Session) -> dict:
         "forearms": "forearms",
     }
     
-    for ex in exercises:
-        original = (ex.muscle_group or "other").lower()
+    # L'index regroupe déjà par groupe musculaire normalisé (minuscules, sans accents)
+    for muscle, entries in index.by_muscle.items():
+        original = muscle or "other"
         simplified = muscle_mapping.get(original, original)
-        if simplified not in by_muscle:
-            by_muscle[simplified] = []
-        by_muscle[simplified].append(ex)
+        by_muscle.setdefault(simplified, []).extend(entries)
     
     return by_muscle
 
@@ -693,9 +694,12 @@ def seed_demo_data():
                 message=notif_data["message"],
                 read=notif_data["hours_ago"] > 12,  # Les vieilles notifs sont lues
                 created_at=datetime.now(timezone.utc) - timedelta(hours=notif_data["hours_ago"]),
+                updated_at=datetime.now(timezone.utc) - timedelta(hours=notif_data["hours_ago"]),
             )
             session.add(notif)
             created_notifications += 1
+        session.flush()
+        recount_unread_notifications(session, "guest-user")
         
         session.commit()
         
@@ -66,7 +66,7 @@ def init_db() -> None:
         RefreshToken, LoginAttempt, SyncEvent, PassToken, SalleAuditLog,
         Conversation, Message, CommentLike, ProgramWorkout,
         SubscriptionEvent, CoachProfile, ProgramTemplate, ProgramPurchase,
-        SavedPost,
+        SavedPost, CatalogueVersion, OutboxEvent,
     )
 
     url = _database_url()
@@ -76,9 +76,16 @@ def init_db() -> None:
     engine = get_engine()
     SQLModel.metadata.create_all(engine)
     _ensure_slug_column(engine)
+    _ensure_exercise_version_column(engine)
     _ensure_workout_exercise_columns(engine)
     _ensure_share_columns(engine)
     _ensure_subscription_columns(engine)
+    _ensure_conversation_summary_columns(engine)
+    _ensure_conversation_read_marks(engine)
+    _ensure_unique_conversation_pairs(engine)
+    _ensure_message_search_index(engine)
+    _ensure_notification_group_columns(engine)
+    _ensure_unread_notifications_column(engine)
 
 
 def _ensure_slug_column(engine: Engine) -> None:
@@ -125,6 +132,21 @@ def _ensure_slug_column(engine: Engine) -> None:
             session.commit()
 
 
+def _ensure_exercise_version_column(engine: Engine) -> None:
+    url = _database_url()
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+
+    with engine.connect() as connection:
+        cols = _get_table_columns(connection, "exercise", is_sqlite)
+        if "version" not in cols:
+            connection.execute(text("ALTER TABLE exercise ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+            connection.execute(
+                text("CREATE INDEX IF NOT EXISTS ix_exercise_version ON exercise (version)")
+            )
+        connection.commit()
+
+
 def _get_table_columns(connection, table_name: str, is_sqlite: bool) -> set[str]:
     quoted = f'"{table_name}"'
     if is_sqlite:
@@ -199,6 +221,166 @@ def _ensure_subscription_columns(engine: Engine) -> None:
         connection.commit()
 
 
+def _ensure_conversation_summary_columns(engine: Engine) -> None:
+    """Dernier message et compteurs de non-lus sur conversation, remplis depuis message."""
+    from .models import MESSAGE_PREVIEW_LENGTH
+
+    url = _database_url()
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+
+    with engine.connect() as connection:
+        cols = _get_table_columns(connection, "conversation", is_sqlite)
+        if "last_message_id" in cols:
+            return
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN last_message_id TEXT"))
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN last_message_sender_id TEXT"))
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN last_message_preview TEXT"))
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN participant1_unread INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN participant2_unread INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conversation_p1_last_message "
+            "ON conversation (participant1_id, last_message_at)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conversation_p2_last_message "
+            "ON conversation (participant2_id, last_message_at)"
+        ))
+        last = (
+            "(SELECT {column} FROM message m WHERE m.conversation_id = conversation.id "
+            "ORDER BY m.created_at DESC LIMIT 1)"
+        )
+        unread = (
+            "(SELECT COUNT(*) FROM message m WHERE m.conversation_id = conversation.id "
+            "AND m.sender_id <> conversation.{participant} AND m.read_at IS NULL)"
+        )
+        connection.execute(text(
+            "UPDATE conversation SET "
+            f"last_message_id = {last.format(column='m.id')}, "
+            f"last_message_sender_id = {last.format(column='m.sender_id')}, "
+            f"last_message_preview = {last.format(column=f'substr(m.content, 1, {MESSAGE_PREVIEW_LENGTH})')}, "
+            f"participant1_unread = {unread.format(participant='participant1_id')}, "
+            f"participant2_unread = {unread.format(participant='participant2_id')}"
+        ))
+        connection.commit()
+
+
+def _ensure_conversation_read_marks(engine: Engine) -> None:
+    """Date de lecture par participant, déduite des read_at par message existants.
+
+    La date retenue est le dernier read_at des messages reçus ; les compteurs
+    de non-lus sont recalculés à partir de cette date.
+    """
+    url = _database_url()
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+
+    with engine.connect() as connection:
+        cols = _get_table_columns(connection, "conversation", is_sqlite)
+        if "participant1_last_read_at" in cols:
+            return
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN participant1_last_read_at TIMESTAMP"))
+        connection.execute(text("ALTER TABLE conversation ADD COLUMN participant2_last_read_at TIMESTAMP"))
+        last_read = (
+            "(SELECT MAX(m.read_at) FROM message m WHERE m.conversation_id = conversation.id "
+            "AND m.sender_id <> conversation.{participant})"
+        )
+        connection.execute(text(
+            "UPDATE conversation SET "
+            f"participant1_last_read_at = {last_read.format(participant='participant1_id')}, "
+            f"participant2_last_read_at = {last_read.format(participant='participant2_id')}"
+        ))
+        unread = (
+            "(SELECT COUNT(*) FROM message m WHERE m.conversation_id = conversation.id "
+            "AND m.sender_id <> conversation.participant{n}_id "
+            "AND (conversation.participant{n}_last_read_at IS NULL "
+            "OR m.created_at > conversation.participant{n}_last_read_at))"
+        )
+        connection.execute(text(
+            "UPDATE conversation SET "
+            f"participant1_unread = {unread.format(n=1)}, "
+            f"participant2_unread = {unread.format(n=2)}"
+        ))
+        connection.commit()
+
+
+def _ensure_unique_conversation_pairs(engine: Engine) -> None:
+    """Participants en ordre canonique, doublons fusionnés, puis index unique par paire."""
+    from sqlalchemy import inspect
+
+    from .services.conversations import merge_duplicate_conversations
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("conversation")}
+    if "ux_conversation_participants" in indexes:
+        return
+    with Session(engine) as session:
+        session.execute(text("DROP INDEX IF EXISTS ix_conversation_participants"))
+        removed = merge_duplicate_conversations(session)
+        session.execute(text(
+            "CREATE UNIQUE INDEX ux_conversation_participants "
+            "ON conversation (participant1_id, participant2_id)"
+        ))
+        session.commit()
+    if removed:
+        print(f"🔀 {removed} conversation(s) en double fusionnée(s)")
+
+
+def _ensure_message_search_index(engine: Engine) -> None:
+    """Index plein texte des messages (FTS5 sur SQLite, GIN tsvector sur PostgreSQL)."""
+    from sqlalchemy.exc import OperationalError
+
+    from .services.message_search import ensure_message_search_index
+
+    try:
+        with engine.begin() as connection:
+            ensure_message_search_index(connection, engine.dialect.name)
+    except OperationalError as e:
+        # SQLite compilé sans FTS5 : la recherche répondra 503
+        print(f"⚠️  Index de recherche des messages indisponible: {e}")
+
+
+def _ensure_notification_group_columns(engine: Engine) -> None:
+    """Colonnes de regroupement des notifications ; les anciennes lignes restent seules."""
+    url = _database_url()
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+
+    with engine.connect() as connection:
+        cols = _get_table_columns(connection, "notification", is_sqlite)
+        if "group_key" in cols:
+            return
+        connection.execute(text("ALTER TABLE notification ADD COLUMN group_key TEXT"))
+        connection.execute(text("ALTER TABLE notification ADD COLUMN actor_count INTEGER NOT NULL DEFAULT 1"))
+        connection.execute(text("ALTER TABLE notification ADD COLUMN recent_actors TEXT"))
+        connection.execute(text("ALTER TABLE notification ADD COLUMN updated_at TIMESTAMP"))
+        connection.execute(text("UPDATE notification SET updated_at = created_at"))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_notification_user_group ON notification (user_id, group_key)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_notification_user_updated ON notification (user_id, updated_at)"
+        ))
+        connection.commit()
+
+
+def _ensure_unread_notifications_column(engine: Engine) -> None:
+    """Compteur de notifications non lues sur user, initialisé depuis notification."""
+    url = _database_url()
+    parsed_url = make_url(url)
+    is_sqlite = parsed_url.get_backend_name() == "sqlite"
+
+    with engine.connect() as connection:
+        cols = _get_table_columns(connection, "user", is_sqlite)
+        if "unread_notifications" in cols:
+            return
+        connection.execute(text("ALTER TABLE \"user\" ADD COLUMN unread_notifications INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text(
+            "UPDATE \"user\" SET unread_notifications = (SELECT COUNT(*) FROM notification n "
+            "WHERE n.user_id = \"user\".id AND n.read = FALSE)"
+        ))
+        connection.commit()
+
+
 def get_session() -> Iterator[Session]:
     engine = get_engine()
     with Session(engine) as session:
@@ -33,14 +33,21 @@ from .routes import wallet
 from .routes import salle
 from .routes import subscriptions
 from .routes import marketplace
+from .routes import metrics
 
 _IS_PRODUCTION = os.getenv("ENVIRONMENT", "").lower() == "production"
 from .seeds import seed_exercises
 from .services.exercise_loader import import_exercises_from_url
+from .services.outbox import shutdown_outbox, start_outbox
+from .services.program_pool import shutdown_program_pool
+from .services.realtime import shutdown_broker
 from sqlmodel import Session, select, func
 from .db import get_engine, set_session_user_id
 from .models import Exercise, User
 from .utils.auth import hash_password
+from .utils.compression import CompressionMiddleware
+from .utils.metrics import MetricsMiddleware
+from .utils.profiling import ProfilingMiddleware
 
 
 def ensure_demo_user() -> None:
@@ -100,7 +107,9 @@ async def lifespan(app: FastAPI):
             exercises_url = os.getenv("EXERCISES_URL")
             if exercises_url:
                 try:
-                    result = import_exercises_from_url(session, exercises_url, force=False)
+                    result = import_exercises_from_url(
+                        session, exercises_url, force=False, allow_local_files=True
+                    )
                     print(f"✅ Chargé {result['imported']} exercices depuis {exercises_url}")
                 except Exception as e:
                     print(f"⚠️  Erreur lors du chargement depuis {exercises_url}: {e}")
@@ -111,9 +120,15 @@ async def lifespan(app: FastAPI):
                 inserted = seed_exercises(force=False)
                 if inserted > 0:
                     print(f"📦 {inserted} exercices par défaut chargés")
+
+    start_outbox()
     
     yield
 
+    shutdown_outbox()
+    shutdown_program_pool()
+    shutdown_broker()
+
 
 app = FastAPI(title="Gorillax API", version="0.1.0", lifespan=lifespan)
 
@@ -131,6 +146,10 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],  # Explicit methods
     allow_headers=["Authorization", "Content-Type", "Accept", "X-API-Key"],  # Explicit headers
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Profilage à la demande (X-Profile: 1 + X-Admin-Key valide), sans coût sinon
+app.add_middleware(ProfilingMiddleware, authorize=admin.is_admin_key)
 
 app.include_router(health.router)
 app.include_router(exercises.router)
@@ -159,6 +178,7 @@ if not _IS_PRODUCTION:
 
 # Admin routes sont disponibles partout mais protégées par X-Admin-Key
 app.include_router(admin.router)
+app.include_router(metrics.router)
 
 
 @app.get("/privacy", response_class=HTMLResponse, include_in_schema=False)
@@ -61,6 +61,9 @@ class User(SQLModel, table=True):
     revenuecat_app_user_id: Optional[str] = Field(default=None, index=True)
     ai_programs_generated: int = Field(default=0)
 
+    # Notifications non lues, tenu à jour à l'écriture (badge)
+    unread_notifications: int = Field(default=0)
+
 
 class Workout(SQLModel, table=True):
     id: str = Field(default_factory=generate_uuid, primary_key=True)
@@ -84,6 +87,17 @@ class Exercise(SQLModel, table=True):
     equipment: Optional[str] = None
     instructions: Optional[str] = None
     video_url: Optional[str] = None
+    # Version du catalogue à laquelle la ligne a été écrite (delta ?since_version=)
+    version: int = Field(default=0, index=True)
+
+
+class CatalogueVersion(SQLModel, table=True):
+    """Compteur monotone par catalogue, incrémenté à chaque écriture."""
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    # Dernière version ayant supprimé des lignes : un delta plus ancien doit tout recharger
+    reset_version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=utcnow)
 
 
 class WorkoutExercise(SQLModel, table=True):
@@ -216,16 +230,25 @@ class Follower(SQLModel, table=True):
 
 
 class Notification(SQLModel, table=True):
-    """Notification utilisateur."""
+    """Notification utilisateur (éventuellement regroupée : « X et 12 autres… »)."""
+    __table_args__ = (
+        # Regroupement à l'écriture : une ligne par (type, référence, tranche de temps)
+        Index("ux_notification_user_group", "user_id", "group_key", unique=True),
+        Index("ix_notification_user_updated", "user_id", "updated_at"),
+    )
     id: str = Field(default_factory=generate_uuid, primary_key=True)
     user_id: str = Field(index=True)
     type: str  # 'like', 'comment', 'follow', 'mention'
-    actor_id: str  # Utilisateur qui a déclenché la notification
+    actor_id: str  # Dernier utilisateur qui a déclenché la notification
     actor_username: str
     reference_id: Optional[str] = None  # ID du share/comment concerné
     message: str
     read: bool = Field(default=False)
+    group_key: Optional[str] = Field(default=None)  # None : notification non regroupable
+    actor_count: int = Field(default=1)
+    recent_actors: Optional[str] = Field(default=None)  # JSON [{"id", "username"}], plus récent en tête
     created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)  # dernier événement regroupé
 
 
 class Story(SQLModel, table=True):
@@ -268,6 +291,20 @@ class SyncEvent(SQLModel, table=True):
     created_at: datetime = Field(default_factory=utcnow)
 
 
+class OutboxEvent(SQLModel, table=True):
+    """Effet de bord différé, commité avec la transaction qui le déclenche (voir services/outbox)."""
+    __table_args__ = (
+        Index("ix_outboxevent_available", "available_at", "created_at"),
+    )
+    id: str = Field(default_factory=generate_uuid, primary_key=True)
+    kind: str  # 'notification', …
+    payload: str  # JSON
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None)
+    available_at: datetime = Field(default_factory=utcnow)  # reculé après un échec (backoff)
+    created_at: datetime = Field(default_factory=utcnow)
+
+
 def _pass_token_expires_at() -> datetime:
     return datetime.now(timezone.utc) + timedelta(days=365)
 
@@ -290,15 +327,39 @@ class SalleAuditLog(SQLModel, table=True):
     created_at: datetime = Field(default_factory=utcnow)
 
 
+MESSAGE_PREVIEW_LENGTH = 200
+
+
+def message_preview(content: str) -> str:
+    """Aperçu du dernier message affiché dans la liste des conversations."""
+    if len(content) <= MESSAGE_PREVIEW_LENGTH:
+        return content
+    return content[:MESSAGE_PREVIEW_LENGTH - 1].rstrip() + "…"
+
+
 class Conversation(SQLModel, table=True):
     """Conversation privée entre deux utilisateurs."""
     __table_args__ = (
-        Index("ix_conversation_participants", "participant1_id", "participant2_id"),
+        # Une conversation par paire, participant1_id < participant2_id
+        Index("ux_conversation_participants", "participant1_id", "participant2_id", unique=True),
+        # Boîte de réception : conversations d'un participant par dernier message
+        Index("ix_conversation_p1_last_message", "participant1_id", "last_message_at"),
+        Index("ix_conversation_p2_last_message", "participant2_id", "last_message_at"),
     )
     id: str = Field(default_factory=generate_uuid, primary_key=True)
     participant1_id: str = Field(index=True)
     participant2_id: str = Field(index=True)
     last_message_at: Optional[datetime] = Field(default=None)
+    # Dénormalisé à chaque envoi : la liste des conversations ne lit pas Message
+    last_message_id: Optional[str] = Field(default=None)
+    last_message_sender_id: Optional[str] = Field(default=None)
+    last_message_preview: Optional[str] = Field(default=None)
+    # Messages non lus par chaque participant
+    participant1_unread: int = Field(default=0)
+    participant2_unread: int = Field(default=0)
+    # Lecture par participant : tout message créé jusqu'à cette date est lu
+    participant1_last_read_at: Optional[datetime] = Field(default=None)
+    participant2_last_read_at: Optional[datetime] = Field(default=None)
     created_at: datetime = Field(default_factory=utcnow)
 
 
@@ -312,6 +373,7 @@ class Message(SQLModel, table=True):
     conversation_id: str = Field(index=True)
     sender_id: str = Field(index=True)
     content: str
+    # Historique : la lecture est portée par Conversation.participant*_last_read_at
     read_at: Optional[datetime] = Field(default=None)
     created_at: datetime = Field(default_factory=utcnow)
 
@@ -1,6 +1,7 @@
 """Routes d'administration — protégées par X-Admin-Key."""
 import os
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from sqlmodel import Session, select
 from ..db import get_session
 from ..models import User
@@ -10,9 +11,14 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 _ADMIN_SECRET = os.getenv("ADMIN_SECRET", "")
 
 
+def is_admin_key(x_admin_key: str) -> bool:
+    """True si la clé correspond à ADMIN_SECRET (toujours False si non configuré)."""
+    return bool(_ADMIN_SECRET) and x_admin_key == _ADMIN_SECRET
+
+
 def _require_admin(x_admin_key: str = Header(default="")):
     """Vérifie le header X-Admin-Key. Bloque si non configuré ou incorrect."""
-    if not _ADMIN_SECRET or x_admin_key != _ADMIN_SECRET:
+    if not is_admin_key(x_admin_key):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="forbidden")
 
 
@@ -206,3 +212,33 @@ def debug_full_login_test(
         "refresh_token_length": len(refresh_token),
         "expires_at": exp.isoformat()
     }
+
+
+@router.get("/profiles")
+def list_profiles(_: None = Depends(_require_admin)):
+    """Profils de requêtes récents (X-Profile: 1), du plus récent au plus ancien."""
+    from ..utils.profiling import list_reports
+
+    return {"profiles": [r.summary() for r in list_reports()]}
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile_report(profile_id: str, _: None = Depends(_require_admin)):
+    """Détail d'un profil : résumé, requêtes SQL et piles au format collapsed."""
+    from ..utils.profiling import get_report
+
+    report = get_report(profile_id)
+    if not report:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile_not_found")
+    return {**report.summary(), "sql": report.sql, "collapsed": report.collapsed()}
+
+
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+def get_profile_collapsed(profile_id: str, _: None = Depends(_require_admin)):
+    """Piles au format collapsed, à passer à flamegraph.pl / speedscope."""
+    from ..utils.profiling import get_report
+
+    report = get_report(profile_id)
+    if not report:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile_not_found")
+    return PlainTextResponse(report.collapsed())
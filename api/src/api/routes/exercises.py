@@ -1,6 +1,9 @@
+import time
+from threading import Lock
 from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, status
+from fastapi.responses import Response
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
@@ -9,10 +12,15 @@ from ..models import Exercise, User
 from ..schemas import (
     ExerciseCreate,
     ExerciseRead,
+    ExerciseSearchResult,
 )
 from ..utils.slug import make_exercise_slug
+from ..services.exercise_catalogue import bump_catalogue_version, get_catalogue_state
 from ..services.exercise_loader import import_exercises_from_url
+from ..services.exercise_search import search_exercises
 from ..utils.dependencies import get_current_user as _require_authenticated_user
+from ..utils.metrics import record_cache
+from ..utils.responses import FastJSONResponse, dumps
 
 router = APIRouter(prefix="/exercises", tags=["exercises"])
 
@@ -22,11 +30,93 @@ class ImportExercisesRequest(BaseModel):
     force: bool = False
 
 
+def _exercise_payload(exercise: Exercise) -> dict:
+    """Même forme que ExerciseRead, sans passer par la validation Pydantic."""
+    return {
+        "name": exercise.name,
+        "muscle_group": exercise.muscle_group,
+        "equipment": exercise.equipment,
+        "description": None,
+        "image_url": None,
+        "source_type": "local",
+        "source_value": None,
+        "id": exercise.id,
+        "created_at": None,
+    }
+
+
+# Catalogue complet déjà sérialisé, réutilisé tant que la version en base ne change pas
+_catalogue_cache: dict[str, bytes] = {}
+_catalogue_cache_lock = Lock()
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _catalogue_body(session: Session, etag: str) -> bytes:
+    with _catalogue_cache_lock:
+        body = _catalogue_cache.get(etag)
+    record_cache("exercise_catalogue", body is not None)
+    if body is None:
+        results = session.exec(select(Exercise)).all()
+        body = dumps([_exercise_payload(result) for result in results])
+        with _catalogue_cache_lock:
+            _catalogue_cache.clear()
+            _catalogue_cache[etag] = body
+    return body
+
+
 @router.get("", response_model=list[ExerciseRead], summary="List exercises")
-def list_exercises(session=Depends(get_session)) -> list[ExerciseRead]:
-    statement = select(Exercise)
-    results = session.exec(statement).all()
-    return [ExerciseRead.model_validate(result) for result in results]
+def list_exercises(
+    since_version: Optional[int] = Query(None, ge=0, description="Delta : exercices écrits après cette version"),
+    if_none_match: Optional[str] = Header(None),
+    session=Depends(get_session),
+) -> Response:
+    """Catalogue complet (ETag fort, 304 si inchangé) ou delta depuis ``since_version``.
+
+    ``X-Catalogue-Version`` donne la version à renvoyer au prochain delta ;
+    ``X-Catalogue-Delta: full`` signale que le client doit remplacer son catalogue
+    (delta trop ancien : des exercices ont été supprimés depuis).
+    """
+    state = get_catalogue_state(session)
+    headers = {"X-Catalogue-Version": str(state.version)}
+
+    if since_version is not None and since_version >= state.reset_version:
+        changed = session.exec(
+            select(Exercise).where(Exercise.version > since_version)
+        ).all()
+        headers["X-Catalogue-Delta"] = "partial"
+        return FastJSONResponse([_exercise_payload(result) for result in changed], headers=headers)
+
+    if since_version is not None:
+        headers["X-Catalogue-Delta"] = "full"
+    headers["ETag"] = state.etag
+    headers["Cache-Control"] = "no-cache"
+    if _etag_matches(if_none_match, state.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(_catalogue_body(session, state.etag), media_type="application/json", headers=headers)
+
+
+@router.get("/search", response_model=list[ExerciseSearchResult], summary="Search exercises (autocomplete)")
+def search_exercises_endpoint(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=50),
+    session=Depends(get_session),
+) -> FastJSONResponse:
+    """Recherche floue FR/EN, insensible aux accents et tolérante aux fautes de frappe."""
+    start = time.perf_counter()
+    hits = search_exercises(session, q, limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return FastJSONResponse(
+        [{**_exercise_payload(hit.exercise), "score": hit.score} for hit in hits],
+        headers={"Server-Timing": f"search;dur={elapsed_ms:.3f}"},
+    )
 
 
 @router.get(
@@ -70,6 +160,7 @@ def create_exercise(
         image_url=payload.image_url,
         source_type=payload.source_type,
         source_value=payload.source_value,
+        version=bump_catalogue_version(session),
     )
     session.add(exercise)
     session.commit()
@@ -84,11 +175,14 @@ def create_exercises_bulk(
     _current_user: User = Depends(_require_authenticated_user),
 ) -> list[ExerciseRead]:
     exercises = []
+    version: Optional[int] = None
     for payload in payloads:
         slug = make_exercise_slug(payload.name, payload.muscle_group)
         existing = session.exec(select(Exercise).where(Exercise.slug == slug)).first()
         if existing:
             continue
+        if version is None:
+            version = bump_catalogue_version(session)
         exercises.append(
             Exercise(
                 slug=slug,
@@ -99,6 +193,7 @@ def create_exercises_bulk(
                 image_url=payload.image_url,
                 source_type=payload.source_type,
                 source_value=payload.source_value,
+                version=version,
             )
         )
     session.add_all(exercises)
@@ -144,8 +239,13 @@ def import_exercises(
             force=payload.force,
         )
         return {
-            "message": f"Import réussi : {result['imported']} exercices importés, {result['skipped']} ignorés",
+            "message": (
+                f"Import réussi : {result['inserted']} exercices ajoutés, "
+                f"{result['updated']} mis à jour, {result['skipped']} inchangés"
+            ),
             "imported": result['imported'],
+            "inserted": result['inserted'],
+            "updated": result['updated'],
             "skipped": result['skipped'],
             "total": result['total'],
         }
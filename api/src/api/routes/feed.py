@@ -12,6 +12,7 @@ from ..db import get_session
 from ..models import Follower, Share, User, Comment, Like
 from ..schemas import FeedResponse, FeedItem, FollowRequest
 from ..utils.dependencies import get_current_user as _get_current_user_required, get_current_user_optional as _get_current_user_optional
+from ..utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/feed", tags=["feed"])
 
@@ -67,7 +68,7 @@ def get_feed(
     cursor: Optional[str] = Query(None),
     session: Session = Depends(get_session),
     current_user: User = Depends(_get_current_user_required)
-) -> FeedResponse:
+) -> FastJSONResponse:
     user = current_user
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="user_not_found")
@@ -108,7 +109,7 @@ def get_feed(
     share_ids = [share.share_id for share in shares]
     
     if not share_ids:
-        return FeedResponse(items=[], next_cursor=None)
+        return FastJSONResponse({"items": [], "next_cursor": None})
     
     # Récupérer tous les commentaires en une seule requête (limité à 2 par share)
     # Pour chaque share, on veut les 2 derniers commentaires
@@ -168,5 +169,5 @@ def get_feed(
             ],
         })
 
-    cursor_value = next_cursor.isoformat() if next_cursor else None
-    return FeedResponse(items=items, next_cursor=cursor_value)
+    # Données lues en base : pas de revalidation par FeedResponse (schéma OpenAPI uniquement)
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
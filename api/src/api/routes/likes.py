@@ -5,8 +5,9 @@ from sqlmodel import Session, select, func
 from typing import Optional
 
 from ..db import get_session
-from ..models import Like, Share, User, Comment, Notification, CommentLike
+from ..models import Like, Share, User, Comment, CommentLike
 from ..utils.dependencies import get_current_user as _get_current_user_required
+from .notifications import enqueue_notification
 
 router = APIRouter(prefix="/likes", tags=["likes"])
 
@@ -73,12 +74,11 @@ def toggle_like(
         # Like
         new_like = Like(user_id=current_user.id, share_id=share_id)
         session.add(new_like)
-        session.commit()
-        liked = True
         
-        # Créer une notification si ce n'est pas son propre post
+        # Notification si ce n'est pas son propre post (outbox, même transaction)
         if share.owner_id != current_user.id:
-            notification = Notification(
+            enqueue_notification(
+                session,
                 user_id=share.owner_id,
                 type="like",
                 actor_id=current_user.id,
@@ -86,8 +86,8 @@ def toggle_like(
                 reference_id=share_id,
                 message=f"{user.username} a aimé ta séance",
             )
-            session.add(notification)
-            session.commit()
+        session.commit()
+        liked = True
     
     # Compter le nombre total de likes
     like_count = session.exec(
@@ -163,12 +163,11 @@ def add_comment(
         content=content,
     )
     session.add(comment)
-    session.commit()
-    session.refresh(comment)
     
-    # Créer une notification si ce n'est pas son propre post
+    # Notification si ce n'est pas son propre post (outbox, même transaction)
     if share.owner_id != current_user.id:
-        notification = Notification(
+        enqueue_notification(
+            session,
             user_id=share.owner_id,
             type="comment",
             actor_id=current_user.id,
@@ -176,8 +175,8 @@ def add_comment(
             reference_id=share_id,
             message=f"{user.username} a commenté ta séance: \"{content[:50]}{'...' if len(content) > 50 else ''}\"",
         )
-        session.add(notification)
-        session.commit()
+    session.commit()
+    session.refresh(comment)
     
     return CommentResponse(
         id=comment.id,
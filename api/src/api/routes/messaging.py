@@ -1,16 +1,22 @@
 """Routes pour la messagerie privée entre utilisateurs."""
 from __future__ import annotations
 
+import asyncio
+import json
+import os
 from datetime import datetime, timezone
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import func, or_, and_
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 
-from ..db import get_session
-from ..models import Conversation, Message, User
+from ..db import get_engine, get_session, set_session_user_id
+from ..models import Conversation, Message, User, message_preview
 from ..schemas import (
     ConversationListResponse,
     ConversationRead,
@@ -19,30 +25,24 @@ from ..schemas import (
     CreateConversationResponse,
     MessageListResponse,
     MessageRead,
+    MessageSearchHit,
+    MessageSearchResponse,
     SendMessageRequest,
     SendMessageResponse,
 )
-from ..utils.dependencies import get_current_user as _get_current_user_required
+from ..services.conversations import get_or_create_conversation
+from ..services.message_search import search_messages
+from ..services.realtime import Subscription, get_broker, publish
+from ..utils.dependencies import (
+    _user_from_token,
+    get_current_user as _get_current_user_required,
+    get_stream_user,
+)
 
 router = APIRouter(prefix="/messaging", tags=["messaging"])
 
-
-def find_existing_conversation(
-    session: Session, user1_id: str, user2_id: str
-) -> Optional[Conversation]:
-    statement = select(Conversation).where(
-        or_(
-            and_(
-                Conversation.participant1_id == user1_id,
-                Conversation.participant2_id == user2_id,
-            ),
-            and_(
-                Conversation.participant1_id == user2_id,
-                Conversation.participant2_id == user1_id,
-            ),
-        )
-    )
-    return session.exec(statement).first()
+# Commentaire SSE envoyé sans événement pendant cet intervalle (proxies, détection de déconnexion)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
 
 
 def get_other_participant(conversation: Conversation, user_id: str) -> str:
@@ -51,6 +51,120 @@ def get_other_participant(conversation: Conversation, user_id: str) -> str:
     return conversation.participant1_id
 
 
+def _get_participant_conversation(session: Session, conversation_id: str, user_id: str) -> Conversation:
+    conversation = session.get(Conversation, conversation_id)
+    if conversation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="conversation_not_found",
+        )
+    if user_id not in [conversation.participant1_id, conversation.participant2_id]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="not_participant",
+        )
+    return conversation
+
+
+def _unread_column(conversation: Conversation, user_id: str):
+    if conversation.participant1_id == user_id:
+        return Conversation.participant1_unread
+    return Conversation.participant2_unread
+
+
+def _unread_count(conversation: Conversation, user_id: str) -> int:
+    if conversation.participant1_id == user_id:
+        return conversation.participant1_unread
+    return conversation.participant2_unread
+
+
+def _last_read_at(conversation: Conversation, user_id: str) -> Optional[datetime]:
+    if conversation.participant1_id == user_id:
+        value = conversation.participant1_last_read_at
+    else:
+        value = conversation.participant2_last_read_at
+    # SQLite rend des dates naïves (UTC)
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _message_read(conversation: Conversation, message: Message) -> MessageRead:
+    """``read_at`` : date de lecture du destinataire si elle couvre le message."""
+    read = MessageRead.model_validate(message)
+    mark = _last_read_at(conversation, get_other_participant(conversation, message.sender_id))
+    created_at = read.created_at if read.created_at.tzinfo else read.created_at.replace(tzinfo=timezone.utc)
+    read.read_at = mark if mark is not None and created_at <= mark else None
+    return read
+
+
+def _last_message(conversation: Conversation) -> Optional[MessageRead]:
+    """Aperçu du dernier message, depuis les colonnes dénormalisées."""
+    if conversation.last_message_id is None:
+        return None
+    return _message_read(
+        conversation,
+        Message(
+            id=conversation.last_message_id,
+            conversation_id=conversation.id,
+            sender_id=conversation.last_message_sender_id,
+            content=conversation.last_message_preview or "",
+            created_at=conversation.last_message_at,
+        ),
+    )
+
+
+def _record_message(session: Session, conversation: Conversation, message: Message) -> None:
+    """Dernier message + non-lus du destinataire, en un UPDATE (pas d'incrément perdu entre deux envois)."""
+    recipient_unread = _unread_column(conversation, get_other_participant(conversation, message.sender_id))
+    session.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values({
+            Conversation.last_message_at: message.created_at,
+            Conversation.last_message_id: message.id,
+            Conversation.last_message_sender_id: message.sender_id,
+            Conversation.last_message_preview: message_preview(message.content),
+            recipient_unread: recipient_unread + 1,
+        })
+    )
+
+
+def _mark_conversation_read(session: Session, conversation: Conversation, user_id: str) -> Optional[datetime]:
+    """Avance la date de lecture de ``user_id`` (un UPDATE, à committer) ; renvoie la date si elle a changé."""
+    if _unread_count(conversation, user_id) == 0:
+        return None
+    now = datetime.now(timezone.utc)
+    if conversation.participant1_id == user_id:
+        values = {Conversation.participant1_last_read_at: now, Conversation.participant1_unread: 0}
+    else:
+        values = {Conversation.participant2_last_read_at: now, Conversation.participant2_unread: 0}
+    session.execute(update(Conversation).where(Conversation.id == conversation.id).values(values))
+    return now
+
+
+# ── Événements temps réel (après commit) ──
+
+def _publish_message(conversation: Conversation, message: MessageRead) -> None:
+    publish(
+        [conversation.participant1_id, conversation.participant2_id],
+        "message",
+        message.model_dump(mode="json"),
+    )
+
+
+def _publish_read(other_user_id: str, conversation_id: str, reader_id: str, read_at: datetime) -> None:
+    publish(
+        [other_user_id],
+        "read",
+        {"conversation_id": conversation_id, "reader_id": reader_id, "read_at": read_at.isoformat()},
+    )
+
+
+def _publish_typing(other_user_id: str, conversation_id: str, user_id: str) -> None:
+    publish([other_user_id], "typing", {"conversation_id": conversation_id, "user_id": user_id})
+
+
 @router.get("/conversations", response_model=ConversationListResponse)
 def list_conversations(
     limit: int = Query(20, ge=1, le=50),
@@ -89,55 +203,20 @@ def list_conversations(
             next_cursor = last_conv.last_message_at.isoformat()
         conversations = conversations[:limit]
 
-    # Batch-load to avoid N+1: users, last messages, unread counts
-    conv_ids = [conv.id for conv in conversations]
+    # Dernier message et non-lus sont portés par la conversation : seuls les
+    # autres participants restent à charger
     other_user_ids = list({get_other_participant(conv, user_id) for conv in conversations})
-
-    # 1) Batch-load all other participants
     users_map: dict[str, User] = {}
     if other_user_ids:
         users_list = session.exec(select(User).where(User.id.in_(other_user_ids))).all()
         users_map = {u.id: u for u in users_list}
 
-    # 2) Batch-load last message per conversation (using a lateral-style subquery)
-    last_messages_map: dict[str, Message] = {}
-    if conv_ids:
-        # Get newest message per conversation via a window function approach
-        from sqlalchemy import desc
-        all_msgs = session.exec(
-            select(Message)
-            .where(Message.conversation_id.in_(conv_ids))
-            .order_by(Message.conversation_id, desc(Message.created_at))
-        ).all()
-        for msg in all_msgs:
-            if msg.conversation_id not in last_messages_map:
-                last_messages_map[msg.conversation_id] = msg
-
-    # 3) Batch-load unread counts per conversation
-    unread_map: dict[str, int] = {cid: 0 for cid in conv_ids}
-    if conv_ids:
-        unread_rows = session.exec(
-            select(Message.conversation_id, func.count(Message.id))
-            .where(
-                Message.conversation_id.in_(conv_ids),
-                Message.sender_id != user_id,
-                Message.read_at.is_(None),
-            )
-            .group_by(Message.conversation_id)
-        ).all()
-        for cid, cnt in unread_rows:
-            unread_map[cid] = cnt
-
     result_conversations = []
     for conv in conversations:
-        other_user_id = get_other_participant(conv, user_id)
-        other_user = users_map.get(other_user_id)
+        other_user = users_map.get(get_other_participant(conv, user_id))
         if other_user is None:
             continue
 
-        last_message = last_messages_map.get(conv.id)
-        unread_count = unread_map.get(conv.id, 0)
-
         result_conversations.append(
             ConversationRead(
                 id=conv.id,
@@ -146,8 +225,8 @@ def list_conversations(
                     username=other_user.username,
                     avatar_url=other_user.avatar_url,
                 ),
-                last_message=MessageRead.model_validate(last_message) if last_message else None,
-                unread_count=unread_count,
+                last_message=_last_message(conv),
+                unread_count=_unread_count(conv, user_id),
                 last_message_at=conv.last_message_at,
                 created_at=conv.created_at,
             )
@@ -159,6 +238,43 @@ def list_conversations(
     )
 
 
+@router.get("/search", response_model=MessageSearchResponse)
+def search_my_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(_get_current_user_required),
+) -> MessageSearchResponse:
+    """Recherche dans les messages des conversations de l'utilisateur, par pertinence."""
+    try:
+        hits, next_cursor = search_messages(session, current_user.id, q, limit, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor format",
+        )
+    except (OperationalError, ProgrammingError):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="search_unavailable",
+        )
+    return MessageSearchResponse(
+        results=[
+            MessageSearchHit(
+                id=hit.id,
+                conversation_id=hit.conversation_id,
+                sender_id=hit.sender_id,
+                snippet=hit.snippet,
+                created_at=hit.created_at,
+                score=hit.score,
+            )
+            for hit in hits
+        ],
+        next_cursor=next_cursor,
+    )
+
+
 @router.post("/conversations", response_model=CreateConversationResponse)
 def create_or_get_conversation(
     payload: CreateConversationRequest,
@@ -180,32 +296,9 @@ def create_or_get_conversation(
             detail="user_not_found",
         )
 
-    existing = find_existing_conversation(session, user_id, payload.participant_id)
-
-    if existing:
-        return CreateConversationResponse(
-            conversation=ConversationRead(
-                id=existing.id,
-                participant=ConversationParticipant(
-                    id=other_user.id,
-                    username=other_user.username,
-                    avatar_url=other_user.avatar_url,
-                ),
-                last_message=None,
-                unread_count=0,
-                last_message_at=existing.last_message_at,
-                created_at=existing.created_at,
-            ),
-            created=False,
-        )
-
-    conversation = Conversation(
-        participant1_id=user_id,
-        participant2_id=payload.participant_id,
-    )
-    session.add(conversation)
-    session.commit()
-    session.refresh(conversation)
+    conversation, created = get_or_create_conversation(session, user_id, payload.participant_id)
+    if created:
+        session.commit()
 
     return CreateConversationResponse(
         conversation=ConversationRead(
@@ -215,12 +308,12 @@ def create_or_get_conversation(
                 username=other_user.username,
                 avatar_url=other_user.avatar_url,
             ),
-            last_message=None,
-            unread_count=0,
-            last_message_at=None,
+            last_message=_last_message(conversation),
+            unread_count=_unread_count(conversation, user_id),
+            last_message_at=conversation.last_message_at,
             created_at=conversation.created_at,
         ),
-        created=True,
+        created=created,
     )
 
 
@@ -264,20 +357,20 @@ def list_messages(
 
     next_cursor = None
     if len(messages) > limit:
-        next_cursor = messages[-1].created_at.isoformat()
         messages = messages[:limit]
+        next_cursor = messages[-1].created_at.isoformat()
 
-    for msg in messages:
-        if msg.sender_id != user_id and msg.read_at is None:
-            msg.read_at = datetime.now(timezone.utc)
-    session.commit()
-
-    messages = list(reversed(messages))
-
-    return MessageListResponse(
-        messages=[MessageRead.model_validate(m) for m in messages],
+    # La première page contient les derniers messages : tout est lu jusqu'à maintenant
+    read_at = _mark_conversation_read(session, conversation, user_id) if cursor is None else None
+    response = MessageListResponse(
+        messages=[_message_read(conversation, m) for m in reversed(messages)],
         next_cursor=next_cursor,
     )
+    if read_at is not None:
+        other_user_id = get_other_participant(conversation, user_id)
+        session.commit()
+        _publish_read(other_user_id, conversation_id, user_id, read_at)
+    return response
 
 
 @router.post("/conversations/{conversation_id}/messages", response_model=SendMessageResponse)
@@ -307,7 +400,7 @@ def send_message(
         content=payload.content.strip(),
     )
     session.add(message)
-    conversation.last_message_at = datetime.now(timezone.utc)
+    _record_message(session, conversation, message)
 
     try:
         session.commit()
@@ -316,8 +409,10 @@ def send_message(
         session.rollback()
         raise HTTPException(status_code=500, detail="send_message_failed")
 
+    message_read = MessageRead.model_validate(message)
+    _publish_message(conversation, message_read)
     return SendMessageResponse(
-        message=MessageRead.model_validate(message),
+        message=message_read,
         conversation_id=conversation_id,
     )
 
@@ -329,30 +424,23 @@ def mark_as_read(
     current_user: User = Depends(_get_current_user_required),
 ) -> None:
     user_id = current_user.id
-    conversation = session.get(Conversation, conversation_id)
-    if conversation is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="conversation_not_found",
-        )
-
-    if user_id not in [conversation.participant1_id, conversation.participant2_id]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="not_participant",
-        )
+    conversation = _get_participant_conversation(session, conversation_id, user_id)
+    other_user_id = get_other_participant(conversation, user_id)
+    read_at = _mark_conversation_read(session, conversation, user_id)
+    if read_at is not None:
+        session.commit()
+        _publish_read(other_user_id, conversation_id, user_id, read_at)
 
-    statement = select(Message).where(
-        Message.conversation_id == conversation_id,
-        Message.sender_id != user_id,
-        Message.read_at.is_(None),
-    )
-    unread_messages = session.exec(statement).all()
 
-    now = datetime.now(timezone.utc)
-    for msg in unread_messages:
-        msg.read_at = now
-    session.commit()
+@router.post("/conversations/{conversation_id}/typing", status_code=status.HTTP_204_NO_CONTENT)
+def notify_typing(
+    conversation_id: str,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(_get_current_user_required),
+) -> None:
+    """Indicateur « en train d'écrire » pour les clients SSE (le WebSocket l'envoie directement)."""
+    conversation = _get_participant_conversation(session, conversation_id, current_user.id)
+    _publish_typing(get_other_participant(conversation, current_user.id), conversation_id, current_user.id)
 
 
 @router.get("/unread-count")
@@ -362,22 +450,22 @@ def get_unread_count(
 ) -> dict:
     user_id = current_user.id
 
-    conv_statement = select(Conversation.id).where(
+    unread_stmt = select(
+        func.coalesce(
+            func.sum(
+                case(
+                    (Conversation.participant1_id == user_id, Conversation.participant1_unread),
+                    else_=Conversation.participant2_unread,
+                )
+            ),
+            0,
+        )
+    ).where(
         or_(
             Conversation.participant1_id == user_id,
             Conversation.participant2_id == user_id,
         )
     )
-    conversation_ids = [row for row in session.exec(conv_statement).all()]
-
-    if not conversation_ids:
-        return {"unread_count": 0}
-
-    unread_stmt = select(func.count(Message.id)).where(
-        Message.conversation_id.in_(conversation_ids),
-        Message.sender_id != user_id,
-        Message.read_at.is_(None),
-    )
     unread_count = session.exec(unread_stmt).one()
 
     return {"unread_count": unread_count}
@@ -410,14 +498,7 @@ def send_direct_message(
             detail="user_not_found",
         )
 
-    conversation = find_existing_conversation(session, user_id, payload.recipient_id)
-    if not conversation:
-        conversation = Conversation(
-            participant1_id=user_id,
-            participant2_id=payload.recipient_id,
-        )
-        session.add(conversation)
-        session.flush()
+    conversation, _ = get_or_create_conversation(session, user_id, payload.recipient_id)
 
     message = Message(
         conversation_id=conversation.id,
@@ -425,7 +506,7 @@ def send_direct_message(
         content=payload.content.strip(),
     )
     session.add(message)
-    conversation.last_message_at = datetime.now(timezone.utc)
+    _record_message(session, conversation, message)
 
     try:
         session.commit()
@@ -434,8 +515,10 @@ def send_direct_message(
         session.rollback()
         raise HTTPException(status_code=500, detail="send_message_failed")
 
+    message_read = MessageRead.model_validate(message)
+    _publish_message(conversation, message_read)
     return SendMessageResponse(
-        message=MessageRead.model_validate(message),
+        message=message_read,
         conversation_id=conversation.id,
     )
 
@@ -467,3 +550,130 @@ def delete_conversation(
 
     session.delete(conversation)
     session.commit()
+
+
+# ── Temps réel : WebSocket, et SSE en repli ──
+#
+# Événements serveur → client (JSON) :
+#   {"type": "message", "data": MessageRead}
+#   {"type": "read", "data": {"conversation_id", "reader_id", "read_at"}}
+#   {"type": "typing", "data": {"conversation_id", "user_id"}}
+# Client → serveur (WebSocket) : {"type": "typing" | "read", "conversation_id": ...}
+
+
+def _socket_user_id(access_token: Optional[str], authorization: Optional[str]) -> Optional[str]:
+    token = access_token
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization.split(" ", 1)[1]
+    if not token:
+        return None
+    with Session(get_engine()) as session:
+        try:
+            return _user_from_token(token, session).id
+        except HTTPException:
+            return None
+
+
+def _socket_other_participant(conversation_id: str, user_id: str) -> Optional[str]:
+    with Session(get_engine()) as session:
+        set_session_user_id(session, user_id)
+        conversation = session.get(Conversation, conversation_id)
+        if conversation is None or user_id not in [conversation.participant1_id, conversation.participant2_id]:
+            return None
+        return get_other_participant(conversation, user_id)
+
+
+def _socket_mark_read(conversation_id: str, user_id: str, other_user_id: str) -> bool:
+    """Marque la conversation lue ; ``False`` si elle n'existe plus (supprimée depuis)."""
+    with Session(get_engine()) as session:
+        set_session_user_id(session, user_id)
+        conversation = session.get(Conversation, conversation_id)
+        if conversation is None:
+            return False
+        read_at = _mark_conversation_read(session, conversation, user_id)
+        session.commit()
+    if read_at is not None:
+        _publish_read(other_user_id, conversation_id, user_id, read_at)
+    return True
+
+
+async def _forward_events(websocket: WebSocket, subscription: Subscription) -> None:
+    try:
+        while True:
+            payload = await subscription.get()
+            await websocket.send_text(payload.decode())
+    except Exception:
+        pass  # connexion fermée : la boucle de réception s'arrête aussi
+
+
+@router.websocket("/ws")
+async def messaging_socket(websocket: WebSocket) -> None:
+    """Flux d'événements de l'utilisateur ; token en ``access_token`` ou en Bearer."""
+    user_id = await run_in_threadpool(
+        _socket_user_id,
+        websocket.query_params.get("access_token"),
+        websocket.headers.get("authorization"),
+    )
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # conversation → autre participant (None : conversation inaccessible)
+    others: dict[str, Optional[str]] = {}
+    async with get_broker().subscribe(user_id) as subscription:
+        # Abonné avant l'accept : aucun événement perdu une fois la connexion ouverte
+        await websocket.accept()
+        forward = asyncio.create_task(_forward_events(websocket, subscription))
+        try:
+            while True:
+                try:
+                    event = json.loads(await websocket.receive_text())
+                except ValueError:
+                    continue
+                if not isinstance(event, dict) or event.get("type") not in ("typing", "read"):
+                    continue
+                conversation_id = str(event.get("conversation_id") or "")
+                if conversation_id not in others:
+                    others[conversation_id] = await run_in_threadpool(
+                        _socket_other_participant, conversation_id, user_id
+                    )
+                other_user_id = others[conversation_id]
+                if other_user_id is None:
+                    continue
+                if event["type"] == "typing":
+                    await run_in_threadpool(_publish_typing, other_user_id, conversation_id, user_id)
+                elif not await run_in_threadpool(_socket_mark_read, conversation_id, user_id, other_user_id):
+                    del others[conversation_id]
+        except WebSocketDisconnect:
+            pass
+        finally:
+            forward.cancel()
+
+
+async def _event_stream(
+    user_id: str,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    async with get_broker().subscribe(user_id) as subscription:
+        yield b"retry: 3000\n\n"
+        while not await is_disconnected():
+            try:
+                payload = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield b"data: " + payload + b"\n\n"
+
+
+@router.get("/events")
+async def messaging_events(
+    request: Request,
+    current_user: User = Depends(get_stream_user),
+) -> StreamingResponse:
+    """Repli SSE du WebSocket (EventSource : token en ``access_token``)."""
+    return StreamingResponse(
+        _event_stream(current_user.id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
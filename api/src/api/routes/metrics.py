@@ -0,0 +1,23 @@
+"""Endpoint /metrics (format texte Prometheus) — protégé par X-Admin-Key."""
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from ..utils.metrics import REGISTRY, threadpool_samples
+from .admin import _require_admin
+
+router = APIRouter(tags=["admin"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(_: None = Depends(_require_admin)) -> PlainTextResponse:
+    """Latences par route, requêtes en cours, threadpool, pool DB, caches et files."""
+    # Async : lu depuis la boucle d'événements, seul endroit où le limiter anyio est accessible
+    body = REGISTRY.render(extra=[(
+        "gorillax_threadpool_threads",
+        "gauge",
+        "Default anyio thread limiter: borrowed, total and waiting tasks.",
+        threadpool_samples(),
+    )])
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,16 +1,52 @@
 """API endpoints pour les notifications."""
-from typing import Optional
+import asyncio
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 
-from ..db import get_session
-from ..models import Notification, User
+from ..db import get_engine, get_session, set_session_user_id
+from ..models import Notification, User, utcnow
+from ..services.outbox import RealtimeEvent, enqueue, register_handler
+from ..services.realtime import get_broker, publish
 from ..utils.dependencies import get_current_user as _get_current_user_required
+from ..utils.dependencies import get_stream_user
+from ..utils.responses import dumps
+from .messaging import SSE_HEARTBEAT_SECONDS
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# Les événements d'une même tranche (même type, même référence) partagent une notification
+NOTIFICATION_GROUP_HOURS = int(os.getenv("NOTIFICATION_GROUP_HOURS", "24"))
+# Acteurs conservés sur une notification regroupée (affichage « A, B et 12 autres »)
+RECENT_ACTORS_MAX = 3
+
+# Notifications rejouées au plus à la reconnexion (Last-Event-ID) ; au-delà : resync
+NOTIFICATION_REPLAY_LIMIT = 100
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# type -> fin de phrase au pluriel ; les autres types ne sont pas regroupés
+_GROUPED_MESSAGES = {
+    "like": "ont aimé ta séance",
+    "comment": "ont commenté ta séance",
+    "follow": "ont commencé à te suivre",
+}
+
+
+class NotificationActor(BaseModel):
+    id: str
+    username: str
+
 
 class NotificationResponse(BaseModel):
     id: str
@@ -21,6 +57,9 @@ class NotificationResponse(BaseModel):
     message: str
     read: bool
     created_at: str
+    actor_count: int = 1
+    actors: list[NotificationActor] = []
+    updated_at: Optional[str] = None
 
 
 class NotificationListResponse(BaseModel):
@@ -28,6 +67,118 @@ class NotificationListResponse(BaseModel):
     unread_count: int
 
 
+class UnreadCountResponse(BaseModel):
+    unread_count: int
+
+
+def _add_unread(session: Session, user_id: str, delta: int) -> None:
+    """Ajuste ``User.unread_notifications`` en une requête atomique (jamais négatif)."""
+    counter = User.unread_notifications + delta
+    if delta < 0:
+        counter = case((counter > 0, counter), else_=0)
+    session.execute(update(User).where(User.id == user_id).values(unread_notifications=counter))
+
+
+def recount_unread_notifications(session: Session, user_id: str) -> None:
+    """Recalcule le compteur depuis la table notification (seed, réparation)."""
+    unread = session.exec(
+        select(func.count(Notification.id))
+        .where(Notification.user_id == user_id)
+        .where(Notification.read == False)
+    ).one()
+    session.execute(update(User).where(User.id == user_id).values(unread_notifications=unread))
+
+
+def notification_group_key(type: str, reference_id: Optional[str], at: datetime) -> str:
+    bucket = int(at.timestamp()) // (NOTIFICATION_GROUP_HOURS * 3600)
+    return f"{type}:{reference_id or ''}:{bucket}"
+
+
+def _grouped_message(type: str, actors: list[dict], actor_count: int, message: str) -> str:
+    if actor_count == 1:
+        return message
+    first = actors[0]["username"]
+    if actor_count == 2 and len(actors) > 1:
+        return f"{first} et {actors[1]['username']} {_GROUPED_MESSAGES[type]}"
+    others = actor_count - 1
+    return f"{first} et {others} autre{'s' if others > 1 else ''} {_GROUPED_MESSAGES[type]}"
+
+
+def _write_notification(
+    session: Session,
+    user_id: str,
+    type: str,
+    actor_id: str,
+    actor_username: str,
+    message: str,
+    reference_id: Optional[str] = None,
+) -> tuple[Notification, bool]:
+    """Crée la notification, ou la fusionne dans celle du même groupe (like, comment, follow).
+
+    Le groupe est (destinataire, type, référence, tranche de NOTIFICATION_GROUP_HOURS).
+    Un acteur déjà parmi les derniers acteurs (like / unlike / like) n'est pas recompté.
+    Ne committe pas ; renvoie ``(notification, devenue_non_lue)`` : création,
+    ou groupe déjà lu qui reçoit un nouvel acteur.
+    """
+    now = utcnow()
+    actor = {"id": actor_id, "username": actor_username}
+    if type not in _GROUPED_MESSAGES:
+        notification = Notification(
+            user_id=user_id,
+            type=type,
+            actor_id=actor_id,
+            actor_username=actor_username,
+            reference_id=reference_id,
+            message=message,
+            read=False,
+            recent_actors=json.dumps([actor]),
+        )
+        session.add(notification)
+        return notification, True
+
+    group_key = notification_group_key(type, reference_id, now)
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    result = session.execute(
+        dialect.insert(Notification)
+        .values(
+            user_id=user_id,
+            type=type,
+            actor_id=actor_id,
+            actor_username=actor_username,
+            reference_id=reference_id,
+            message=message,
+            read=False,
+            group_key=group_key,
+            recent_actors=json.dumps([actor]),
+            created_at=now,
+            updated_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "group_key"])
+    )
+    statement = select(Notification).where(
+        Notification.user_id == user_id,
+        Notification.group_key == group_key,
+    )
+    if result.rowcount == 1:
+        return session.exec(statement).one(), True
+
+    # Groupe existant : mise à jour en place, ligne verrouillée (PostgreSQL)
+    notification = session.exec(statement.with_for_update()).one()
+    actors = json.loads(notification.recent_actors or "[]")
+    if not any(a["id"] == actor_id for a in actors):
+        notification.actor_count += 1
+    actors = [actor] + [a for a in actors if a["id"] != actor_id]
+    notification.recent_actors = json.dumps(actors[:RECENT_ACTORS_MAX])
+    notification.actor_id = actor_id
+    notification.actor_username = actor_username
+    notification.message = _grouped_message(type, actors, notification.actor_count, message)
+    reopened = notification.read
+    notification.read = False
+    notification.updated_at = now
+    session.add(notification)
+    return notification, reopened
+
+
 def create_notification(
     session: Session,
     user_id: str,
@@ -37,21 +188,82 @@ def create_notification(
     message: str,
     reference_id: Optional[str] = None,
 ) -> Notification:
-    notification = Notification(
-        user_id=user_id,
-        type=type,
-        actor_id=actor_id,
-        actor_username=actor_username,
-        reference_id=reference_id,
-        message=message,
-        read=False,
+    """Écrit la notification et met à jour le compteur de non-lues, dans la requête."""
+    notification, unread = _write_notification(
+        session, user_id, type, actor_id, actor_username, message, reference_id
     )
-    session.add(notification)
+    if unread:
+        _add_unread(session, user_id, 1)
     session.commit()
     session.refresh(notification)
     return notification
 
 
+def enqueue_notification(
+    session: Session,
+    user_id: str,
+    type: str,
+    actor_id: str,
+    actor_username: str,
+    message: str,
+    reference_id: Optional[str] = None,
+) -> None:
+    """Différée : écrite par l'outbox après le commit de l'appelant (même transaction que l'action)."""
+    enqueue(session, "notification", {
+        "user_id": user_id,
+        "type": type,
+        "actor_id": actor_id,
+        "actor_username": actor_username,
+        "message": message,
+        "reference_id": reference_id,
+    })
+
+
+def _dispatch_notifications(session: Session, payloads: list[dict]) -> list[RealtimeEvent]:
+    """Handler outbox : un lot de notifications, un UPDATE de compteur par destinataire."""
+    written: dict[str, Notification] = {}
+    unread: Counter[str] = Counter()
+    for payload in payloads:
+        notification, became_unread = _write_notification(session, **payload)
+        written[notification.id] = notification
+        if became_unread:
+            unread[payload["user_id"]] += 1
+    for user_id, delta in unread.items():
+        _add_unread(session, user_id, delta)
+    session.flush()
+
+    counters = dict(session.exec(
+        select(User.id, User.unread_notifications).where(User.id.in_({n.user_id for n in written.values()}))
+    ).all())
+    return [
+        ([n.user_id], "notification", {
+            "notification": _notification_response(n).model_dump(),
+            "unread_count": counters.get(n.user_id, 0),
+        })
+        for n in written.values()
+    ]
+
+
+register_handler("notification", _dispatch_notifications)
+
+
+def _notification_response(n: Notification) -> NotificationResponse:
+    actors = json.loads(n.recent_actors) if n.recent_actors else [{"id": n.actor_id, "username": n.actor_username}]
+    return NotificationResponse(
+        id=n.id,
+        type=n.type,
+        actor_id=n.actor_id,
+        actor_username=n.actor_username,
+        reference_id=n.reference_id,
+        message=n.message,
+        read=n.read,
+        created_at=n.created_at.isoformat(),
+        actor_count=n.actor_count,
+        actors=[NotificationActor(**a) for a in actors],
+        updated_at=(n.updated_at or n.created_at).isoformat(),
+    )
+
+
 @router.get("", response_model=NotificationListResponse)
 def get_notifications(
     limit: int = Query(50, ge=1, le=100),
@@ -61,27 +273,116 @@ def get_notifications(
     notifications = session.exec(
         select(Notification)
         .where(Notification.user_id == current_user.id)
-        .order_by(Notification.created_at.desc())
+        .order_by(Notification.updated_at.desc())
         .limit(limit)
     ).all()
 
-    unread_count = len([n for n in notifications if not n.read])
-
     return NotificationListResponse(
-        notifications=[
-            NotificationResponse(
-                id=n.id,
-                type=n.type,
-                actor_id=n.actor_id,
-                actor_username=n.actor_username,
-                reference_id=n.reference_id,
-                message=n.message,
-                read=n.read,
-                created_at=n.created_at.isoformat(),
+        notifications=[_notification_response(n) for n in notifications],
+        unread_count=current_user.unread_notifications,
+    )
+
+
+@router.get("/unread-count", response_model=UnreadCountResponse)
+def get_unread_count(
+    current_user: User = Depends(_get_current_user_required),
+) -> UnreadCountResponse:
+    """Badge : compteur maintenu sur l'utilisateur, aucune lecture de notification."""
+    return UnreadCountResponse(unread_count=current_user.unread_notifications)
+
+
+def event_cursor(updated_at: datetime) -> str:
+    """Id d'événement SSE : ``updated_at`` en microsecondes (reprise par Last-Event-ID)."""
+    if updated_at.tzinfo is None:  # SQLite : UTC naïf
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return str((updated_at - _EPOCH) // timedelta(microseconds=1))
+
+
+def _parse_event_cursor(last_event_id: Optional[str]) -> Optional[datetime]:
+    try:
+        return _EPOCH + timedelta(microseconds=int(last_event_id))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _sse_frame(event_type: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    frame = b"data: " + dumps({"type": event_type, "data": data}) + b"\n\n"
+    return f"id: {event_id}\n".encode() + frame if event_id else frame
+
+
+def _publish_unread_count(user: User) -> None:
+    """Après commit : le badge des autres appareils suit les lectures."""
+    publish([user.id], "unread_count", {"unread_count": user.unread_notifications})
+
+
+def _missed_frames(user_id: str, since: datetime) -> list[bytes]:
+    """Notifications créées ou regroupées après ``since``, plus ancienne en tête."""
+    with Session(get_engine()) as session:
+        set_session_user_id(session, user_id)
+        missed = session.exec(
+            select(Notification)
+            .where(Notification.user_id == user_id)
+            .where(Notification.updated_at > since)
+            .order_by(Notification.updated_at, Notification.id)
+            .limit(NOTIFICATION_REPLAY_LIMIT + 1)
+        ).all()
+        if len(missed) > NOTIFICATION_REPLAY_LIMIT:
+            return [_sse_frame("resync", {})]  # le client recharge GET /notifications
+        unread_count = session.get(User, user_id).unread_notifications
+        return [
+            _sse_frame(
+                "notification",
+                {"notification": _notification_response(n), "unread_count": unread_count},
+                event_cursor(n.updated_at),
             )
-            for n in notifications
-        ],
-        unread_count=unread_count,
+            for n in missed
+        ]
+
+
+async def _notification_stream(
+    user_id: str,
+    unread_count: int,
+    since: Optional[datetime],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    # Abonné avant le rattrapage : une notification ne peut pas tomber entre
+    # les deux (au pire envoyée deux fois, le client dédoublonne par id)
+    async with get_broker().subscribe(user_id) as subscription:
+        yield b"retry: 3000\n\n"
+        yield _sse_frame("unread_count", {"unread_count": unread_count})
+        if since is not None:
+            for frame in await run_in_threadpool(_missed_frames, user_id, since):
+                yield frame
+        while not await is_disconnected():
+            try:
+                payload = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            event = json.loads(payload)
+            if event["type"] == "notification":
+                updated_at = datetime.fromisoformat(event["data"]["notification"]["updated_at"])
+                yield f"id: {event_cursor(updated_at)}\n".encode() + b"data: " + payload + b"\n\n"
+            elif event["type"] == "unread_count":
+                yield b"data: " + payload + b"\n\n"
+
+
+@router.get("/stream")
+async def notification_stream(
+    request: Request,
+    current_user: User = Depends(get_stream_user),
+) -> StreamingResponse:
+    """SSE : nouvelles notifications et compteur de non-lues (EventSource : token en ``access_token``).
+
+    À la reconnexion, EventSource renvoie ``Last-Event-ID`` : les notifications
+    manquées sont rejouées depuis la base.
+    """
+    since = _parse_event_cursor(request.headers.get("last-event-id"))
+    return StreamingResponse(
+        _notification_stream(current_user.id, current_user.unread_notifications, since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -90,19 +391,21 @@ def mark_all_read(
     session: Session = Depends(get_session),
     current_user: User = Depends(_get_current_user_required),
 ) -> dict:
-    notifications = session.exec(
-        select(Notification)
+    result = session.execute(
+        update(Notification)
         .where(Notification.user_id == current_user.id)
         .where(Notification.read == False)
-    ).all()
-
-    for n in notifications:
-        n.read = True
-        session.add(n)
-
+        .values(read=True)
+        .execution_options(synchronize_session=False)
+    )
+    # Décrément plutôt que remise à zéro : une notification arrivée entre-temps reste comptée
+    if result.rowcount:
+        _add_unread(session, current_user.id, -result.rowcount)
     session.commit()
+    if result.rowcount:
+        _publish_unread_count(current_user)
 
-    return {"marked_read": len(notifications)}
+    return {"marked_read": result.rowcount}
 
 
 @router.post("/{notification_id}/read")
@@ -118,9 +421,18 @@ def mark_read(
     if notification.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="not_your_notification")
 
-    notification.read = True
-    session.add(notification)
+    # Conditionnel : deux lectures concurrentes ne décrémentent qu'une fois
+    result = session.execute(
+        update(Notification)
+        .where(Notification.id == notification_id)
+        .where(Notification.read == False)
+        .values(read=True)
+    )
+    if result.rowcount == 1:
+        _add_unread(session, current_user.id, -1)
     session.commit()
+    if result.rowcount == 1:
+        _publish_unread_count(current_user)
     return {"success": True}
 
 
@@ -137,6 +449,11 @@ def delete_notification(
     if notification.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="not_your_notification")
 
+    was_unread = not notification.read
+    if was_unread:
+        _add_unread(session, current_user.id, -1)
     session.delete(notification)
     session.commit()
+    if was_unread:
+        _publish_unread_count(current_user)
     return {"success": True}
@@ -7,8 +7,9 @@ from sqlmodel import Session, select, func
 from typing import Optional
 
 from ..db import get_session
-from ..models import User, Share, Follower, Like, Notification, SavedPost
+from ..models import User, Share, Follower, Like, SavedPost
 from ..utils.dependencies import get_current_user as _get_current_user, get_current_user_optional as _get_current_user_optional
+from .notifications import enqueue_notification
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -291,10 +292,10 @@ def follow_user(
     if not existing:
         follow = Follower(follower_id=follower_id, followed_id=user_id)
         session.add(follow)
-        session.commit()
         
-        # Créer une notification pour le suivi
-        notification = Notification(
+        # Notification pour le suivi (outbox, même transaction)
+        enqueue_notification(
+            session,
             user_id=user_id,
             type="follow",
             actor_id=follower_id,
@@ -302,7 +303,6 @@ def follow_user(
             reference_id=None,
             message=f"{current_user.username} a commencé à te suivre",
         )
-        session.add(notification)
         session.commit()
 
 
@@ -1,19 +1,36 @@
+import os
+from collections import OrderedDict
+from threading import Lock
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from pydantic import BaseModel, Field
+from sqlalchemy import insert
 from sqlmodel import Session, select
 import random
 from collections import defaultdict
 
 from ..db import get_session
-from ..models import Program, ProgramSession, ProgramSet, Exercise, Workout, WorkoutExercise, Set, User
+from ..models import (
+    CoachProfile, Program, ProgramSession, ProgramSet, Workout, WorkoutExercise, Set, User, generate_uuid,
+)
+from ..services.exercise_index import get_exercise_index
+from ..services.program_pool import generate_programs
 from ..schemas import ProgramCreate, ProgramRead
-from ..utils.dependencies import get_current_user as _get_current_user_required, check_ai_program_limit
+from ..utils.dependencies import (
+    get_current_user as _get_current_user_required,
+    check_ai_program_limit,
+    check_ai_program_quota,
+)
+from ..utils.metrics import record_cache, register_cache
+from ..utils.responses import dumps
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/programs", tags=["programs"])
 
+# Profils maximum par appel à /programs/generate/batch
+PROGRAM_BATCH_MAX = int(os.getenv("PROGRAM_BATCH_MAX", "50"))
+
 
 def _get_user_profile_data(user: User) -> dict:
     """Récupère et structure les données du profil utilisateur pour la génération de programmes"""
@@ -122,6 +139,63 @@ class GenerateProgramRequest(BaseModel):
     equipment_available: Optional[list[str]] = None
     cardio: Optional[str] = None  # "oui" ou "non"
     methode_preferee: Optional[str] = None  # "fullbody", "upperlower", "split", "ppl"
+    seed: Optional[int] = None  # variante : même profil + même seed → même programme
+
+
+def _build_generation_profile(payload: GenerateProgramRequest, user_id: str, user_profile: dict) -> dict:
+    """Profil du générateur : la requête prime, le profil utilisateur complète."""
+    return {
+        'frequency': max(2, min(6, payload.frequency)),
+        'duration_weeks': payload.duration_weeks,
+        # 🎯 Utiliser l'objectif du profil si non spécifié dans la requête
+        'objective': payload.objective or user_profile.get('objective') or 'Hypertrophie',
+        # 🎯 Utiliser le niveau du profil si non spécifié
+        'niveau': payload.niveau or user_profile.get('experience_level') or 'Intermédiaire',
+        # 🎯 Utiliser la fréquence du profil si disponible
+        'duree_seance': payload.duree_seance or '45',
+        'exercises_per_session': payload.exercises_per_session,
+        'priorite': payload.priorite,
+        'priorite_first': payload.priorite_first,
+        'priorite_second': payload.priorite_second,
+        # 🎯 Détecter automatiquement les blessures depuis le profil
+        'has_blessure': payload.has_blessure or bool(user_profile.get('injuries')),
+        'blessure_first': payload.blessure_first or (
+            user_profile['injuries'].split(',')[0].strip() if user_profile.get('injuries') else None
+        ),
+        'blessure_second': payload.blessure_second,
+        # 🎯 Utiliser l'équipement du profil si non spécifié
+        'equipment_available': payload.equipment_available or user_profile.get('equipment_available', []),
+        'cardio': payload.cardio,
+        'methode_preferee': payload.methode_preferee,
+        'user_id': user_id,
+        # 🎯 NOUVEAU: Données supplémentaires du profil
+        'user_height': user_profile.get('height'),
+        'user_weight': user_profile.get('weight'),
+        'user_gender': user_profile.get('gender'),
+        'user_location': user_profile.get('location'),
+    }
+
+
+# --- Lecture groupée + cache des programmes sérialisés ---
+# Un programme n'est jamais modifié après création : son JSON est mis en cache
+# par id (LRU), invalidé par les écritures.
+PROGRAM_CACHE_MAX = int(os.getenv("PROGRAM_CACHE_MAX", "2048"))
+_program_cache: OrderedDict[str, bytes] = OrderedDict()
+_program_cache_lock = Lock()
+
+register_cache("program", lambda: len(_program_cache))
+
+
+def invalidate_program_cache(*program_ids: str) -> None:
+    with _program_cache_lock:
+        for program_id in program_ids:
+            _program_cache.pop(program_id, None)
+
+
+def _insert_rows(session: Session, model, rows: list[dict]) -> None:
+    """INSERT multi-lignes (executemany) ; les ids sont générés côté client."""
+    if rows:
+        session.execute(insert(model), rows)
 
 
 def _upsert_program(session: Session, payload: ProgramCreate) -> Program:
@@ -132,67 +206,125 @@ def _upsert_program(session: Session, payload: ProgramCreate) -> Program:
         user_id=payload.user_id,
     )
     session.add(program)
-    session.flush()
 
+    session_rows: list[dict] = []
+    set_rows: list[dict] = []
     for sess in payload.sessions:
-        prog_session = ProgramSession(
-            program_id=program.id,
-            day_index=sess.day_index,
-            title=sess.title,
-            focus=sess.focus,
-            estimated_minutes=sess.estimated_minutes,
-        )
-        session.add(prog_session)
-        session.flush()
+        session_id = generate_uuid()
+        session_rows.append({
+            "id": session_id,
+            "program_id": program.id,
+            "day_index": sess.day_index,
+            "title": sess.title,
+            "focus": sess.focus,
+            "estimated_minutes": sess.estimated_minutes,
+        })
         for s in sess.sets:
-            session.add(
-                ProgramSet(
-                    program_session_id=prog_session.id,
-                    exercise_slug=s.exercise_slug,
-                    reps=s.reps,
-                    weight=s.weight,
-                    rpe=s.rpe,
-                    order_index=s.order_index,
-                    notes=s.notes,
-                )
-            )
+            set_rows.append({
+                "id": generate_uuid(),
+                "program_session_id": session_id,
+                "exercise_slug": s.exercise_slug,
+                "reps": s.reps,
+                "weight": s.weight,
+                "rpe": s.rpe,
+                "order_index": s.order_index,
+                "notes": s.notes,
+            })
+    _insert_rows(session, ProgramSession, session_rows)
+    _insert_rows(session, ProgramSet, set_rows)
+    invalidate_program_cache(program.id)
     return program
 
 
-@router.get("", response_model=list[ProgramRead], summary="Lister les programmes")
-def list_programs(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(_get_current_user_required)
-) -> list[ProgramRead]:
-    # Only return programs for the authenticated user
-    programs = session.exec(select(Program).where(Program.user_id == current_user.id)).all()
-    results: list[ProgramRead] = []
-    for prog in programs:
-        sessions = session.exec(select(ProgramSession).where(ProgramSession.program_id == prog.id)).all()
-        session_reads = []
-        for ps in sessions:
-            sets = session.exec(select(ProgramSet).where(ProgramSet.program_session_id == ps.id).order_by(ProgramSet.order_index)).all()
-            session_reads.append(
+def _load_program_bodies(session: Session, programs: list[Program]) -> dict[str, bytes]:
+    """Sérialise N programmes en 2 requêtes IN (sessions puis sets), regroupées en mémoire."""
+    program_ids = [program.id for program in programs]
+    sessions_by_program: dict[str, list[ProgramSession]] = defaultdict(list)
+    for ps in session.exec(
+        select(ProgramSession)
+        .where(ProgramSession.program_id.in_(program_ids))
+        .order_by(ProgramSession.day_index)
+    ).all():
+        sessions_by_program[ps.program_id].append(ps)
+
+    session_ids = [ps.id for sessions in sessions_by_program.values() for ps in sessions]
+    sets_by_session: dict[str, list[dict]] = defaultdict(list)
+    if session_ids:
+        for ps_set in session.exec(
+            select(ProgramSet)
+            .where(ProgramSet.program_session_id.in_(session_ids))
+            .order_by(ProgramSet.order_index)
+        ).all():
+            sets_by_session[ps_set.program_session_id].append({
+                "id": ps_set.id,
+                "exercise_slug": ps_set.exercise_slug,
+                "reps": ps_set.reps,
+                "weight": ps_set.weight,
+                "rpe": ps_set.rpe,
+                "order_index": ps_set.order_index,
+                "notes": ps_set.notes,
+            })
+
+    return {
+        program.id: dumps({
+            "id": program.id,
+            "title": program.title,
+            "objective": program.objective,
+            "duration_weeks": program.duration_weeks,
+            "user_id": program.user_id,
+            "sessions": [
                 {
                     "id": ps.id,
                     "day_index": ps.day_index,
                     "title": ps.title,
                     "focus": ps.focus,
                     "estimated_minutes": ps.estimated_minutes,
-                    "sets": sets,
+                    "sets": sets_by_session[ps.id],
                 }
-            )
-        results.append(
-            ProgramRead(
-                id=prog.id,
-                title=prog.title,
-                objective=prog.objective,
-                duration_weeks=prog.duration_weeks,
-                user_id=prog.user_id,
-                sessions=session_reads,
-            )
-        )
-    return results
+                for ps in sessions_by_program[program.id]
+            ],
+        })
+        for program in programs
+    }
+
+
+def _program_bodies(session: Session, programs: list[Program]) -> list[bytes]:
+    """JSON ProgramRead de chaque programme, depuis le cache ou chargé en un passage."""
+    bodies: dict[str, bytes] = {}
+    with _program_cache_lock:
+        for program in programs:
+            body = _program_cache.get(program.id)
+            if body is not None:
+                _program_cache.move_to_end(program.id)
+                bodies[program.id] = body
+            record_cache("program", body is not None)
+    missing = [program for program in programs if program.id not in bodies]
+    if missing:
+        loaded = _load_program_bodies(session, missing)
+        bodies.update(loaded)
+        with _program_cache_lock:
+            _program_cache.update(loaded)
+            while len(_program_cache) > PROGRAM_CACHE_MAX:
+                _program_cache.popitem(last=False)
+    return [bodies[program.id] for program in programs]
+
+
+def _json_body_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+def _program_read(session: Session, program: Program) -> ProgramRead:
+    return ProgramRead.model_validate_json(_program_bodies(session, [program])[0])
+
+
+@router.get("", response_model=list[ProgramRead], summary="Lister les programmes")
+def list_programs(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(_get_current_user_required)
+) -> Response:
+    # Only return programs for the authenticated user
+    programs = session.exec(select(Program).where(Program.user_id == current_user.id)).all()
+    return _json_body_response(b"[" + b",".join(_program_bodies(session, list(programs))) + b"]")
 
 
 @router.post("", response_model=ProgramRead, status_code=status.HTTP_201_CREATED, summary="Créer un programme avec sessions/sets")
@@ -200,7 +332,7 @@ def create_program(
     payload: ProgramCreate, 
     session: Session = Depends(get_session),
     current_user: User = Depends(_get_current_user_required)
-) -> ProgramRead:
+) -> Response:
     # Set the user_id to the authenticated user
     payload.user_id = current_user.id
     program = _upsert_program(session, payload)
@@ -211,29 +343,7 @@ def create_program(
         raise HTTPException(status_code=500, detail="create_program_failed")
     session.refresh(program)
 
-    sessions = session.exec(select(ProgramSession).where(ProgramSession.program_id == program.id)).all()
-    session_reads = []
-    for ps in sessions:
-        sets = session.exec(select(ProgramSet).where(ProgramSet.program_session_id == ps.id).order_by(ProgramSet.order_index)).all()
-        session_reads.append(
-            {
-                "id": ps.id,
-                "day_index": ps.day_index,
-                "title": ps.title,
-                "focus": ps.focus,
-                "estimated_minutes": ps.estimated_minutes,
-                "sets": sets,
-            }
-        )
-
-    return ProgramRead(
-        id=program.id,
-        title=program.title,
-        objective=program.objective,
-        duration_weeks=program.duration_weeks,
-        user_id=program.user_id,
-        sessions=session_reads,
-    )
+    return _json_body_response(_program_bodies(session, [program])[0], status.HTTP_201_CREATED)
 
 
 @router.get("/{program_id}", response_model=ProgramRead, summary="Détail d'un programme")
@@ -241,7 +351,7 @@ def get_program(
     program_id: str, 
     session: Session = Depends(get_session),
     current_user: User = Depends(_get_current_user_required)
-) -> ProgramRead:
+) -> Response:
     program = session.get(Program, program_id)
     if not program:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Programme introuvable")
@@ -249,28 +359,7 @@ def get_program(
     # Only allow access to own programs
     if program.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="access_denied")
-    sessions = session.exec(select(ProgramSession).where(ProgramSession.program_id == program.id)).all()
-    session_reads = []
-    for ps in sessions:
-        sets = session.exec(select(ProgramSet).where(ProgramSet.program_session_id == ps.id).order_by(ProgramSet.order_index)).all()
-        session_reads.append(
-            {
-                "id": ps.id,
-                "day_index": ps.day_index,
-                "title": ps.title,
-                "focus": ps.focus,
-                "estimated_minutes": ps.estimated_minutes,
-                "sets": sets,
-            }
-        )
-    return ProgramRead(
-        id=program.id,
-        title=program.title,
-        objective=program.objective,
-        duration_weeks=program.duration_weeks,
-        user_id=program.user_id,
-        sessions=session_reads,
-    )
+    return _json_body_response(_program_bodies(session, [program])[0])
 
 
 @router.post("/generate", response_model=ProgramRead, summary="Générer un programme intelligent basé sur le profil utilisateur")
@@ -281,45 +370,17 @@ def generate_program(
 ) -> ProgramRead:
     from ..services.program_generator import generate_program as generate_program_logic
     
-    exercises = session.exec(select(Exercise)).all()
-    if not exercises:
+    if not len(get_exercise_index(session)):
         raise HTTPException(status_code=400, detail="Aucun exercice en base pour générer un programme")
 
     # 🎯 NOUVEAU: Récupérer automatiquement les données du profil utilisateur
     user_profile = _get_user_profile_data(current_user)
     
     # Construire le profil utilisateur pour le générateur en fusionnant les données
-    profile = {
-        'frequency': max(2, min(6, payload.frequency)),
-        'duration_weeks': payload.duration_weeks,
-        # 🎯 Utiliser l'objectif du profil si non spécifié dans la requête
-        'objective': payload.objective or user_profile.get('objective') or 'Hypertrophie',
-        # 🎯 Utiliser le niveau du profil si non spécifié
-        'niveau': payload.niveau or user_profile.get('experience_level') or 'Intermédiaire',
-        # 🎯 Utiliser la fréquence du profil si disponible
-        'duree_seance': payload.duree_seance or '45',
-        'exercises_per_session': payload.exercises_per_session,
-        'priorite': payload.priorite,
-        'priorite_first': payload.priorite_first,
-        'priorite_second': payload.priorite_second,
-        # 🎯 Détecter automatiquement les blessures depuis le profil
-        'has_blessure': payload.has_blessure or bool(user_profile.get('injuries')),
-        'blessure_first': payload.blessure_first or user_profile.get('injuries', '').split(',')[0].strip() if user_profile.get('injuries') else None,
-        'blessure_second': payload.blessure_second,
-        # 🎯 Utiliser l'équipement du profil si non spécifié
-        'equipment_available': payload.equipment_available or user_profile.get('equipment_available', []),
-        'cardio': payload.cardio,
-        'methode_preferee': payload.methode_preferee,
-        'user_id': current_user.id,
-        # 🎯 NOUVEAU: Données supplémentaires du profil
-        'user_height': user_profile.get('height'),
-        'user_weight': user_profile.get('weight'),
-        'user_gender': user_profile.get('gender'),
-        'user_location': user_profile.get('location'),
-    }
+    profile = _build_generation_profile(payload, current_user.id, user_profile)
 
     # Générer le programme avec la logique V1
-    program_data = generate_program_logic(session, profile, payload.title)
+    program_data = generate_program_logic(session, profile, payload.title, seed=payload.seed)
 
     # Créer le programme en base
     program_create = ProgramCreate(**program_data)
@@ -337,29 +398,74 @@ def generate_program(
     session.refresh(program)
 
     # Retourner le programme créé
-    sessions_db = session.exec(select(ProgramSession).where(ProgramSession.program_id == program.id)).all()
-    session_reads = []
-    for ps in sessions_db:
-        sets = session.exec(select(ProgramSet).where(ProgramSet.program_session_id == ps.id).order_by(ProgramSet.order_index)).all()
-        session_reads.append(
-            {
-                "id": ps.id,
-                "day_index": ps.day_index,
-                "title": ps.title,
-                "focus": ps.focus,
-                "estimated_minutes": ps.estimated_minutes,
-                "sets": sets,
-            }
-        )
-
-    return ProgramRead(
-        id=program.id,
-        title=program.title,
-        objective=program.objective,
-        duration_weeks=program.duration_weeks,
-        user_id=program.user_id,
-        sessions=session_reads,
-    )
+    return _program_read(session, program)
+
+
+class GenerateProgramBatchRequest(BaseModel):
+    profiles: list[GenerateProgramRequest] = Field(min_length=1, max_length=PROGRAM_BATCH_MAX)
+
+
+class GenerateProgramBatchItem(BaseModel):
+    index: int
+    program: Optional[ProgramRead] = None
+    error: Optional[str] = None
+
+
+class GenerateProgramBatchResponse(BaseModel):
+    generated: int
+    failed: int
+    results: list[GenerateProgramBatchItem]
+
+
+@router.post("/generate/batch", response_model=GenerateProgramBatchResponse, summary="Générer des programmes pour plusieurs clients (coachs)")
+def generate_program_batch(
+    payload: GenerateProgramBatchRequest,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(_get_current_user_required),
+) -> GenerateProgramBatchResponse:
+    """Un programme par profil, générés sur le pool de processus et enregistrés en une transaction.
+
+    Les profils décrivent les clients : le profil du coach n'est pas fusionné.
+    Les programmes appartiennent au coach. Quota vérifié une fois pour tout le lot.
+    """
+    coach = session.exec(select(CoachProfile).where(CoachProfile.user_id == current_user.id)).first()
+    if not coach:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="not_a_coach")
+    check_ai_program_quota(current_user, len(payload.profiles))
+    if not len(get_exercise_index(session)):
+        raise HTTPException(status_code=400, detail="Aucun exercice en base pour générer un programme")
+
+    jobs = [
+        (_build_generation_profile(item, current_user.id, {}), item.title, item.seed)
+        for item in payload.profiles
+    ]
+    outcomes = generate_programs(session, jobs)
+
+    created: dict[int, Program] = {}
+    errors: dict[int, str] = {}
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            errors[index] = "generate_program_failed"
+            continue
+        created[index] = _upsert_program(session, ProgramCreate(**outcome))
+
+    current_user.ai_programs_generated += len(created)
+    session.add(current_user)
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise HTTPException(status_code=500, detail="generate_program_failed")
+
+    results = []
+    for index in range(len(outcomes)):
+        program = created.get(index)
+        results.append(GenerateProgramBatchItem(
+            index=index,
+            program=_program_read(session, program) if program is not None else None,
+            error=errors.get(index),
+        ))
+    return GenerateProgramBatchResponse(generated=len(created), failed=len(errors), results=results)
 
 
 class ProgramSaveResponse(BaseModel):
@@ -382,8 +488,20 @@ def save_program(
     if program.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="access_denied")
 
-    # Récupérer toutes les sessions du programme
-    prog_sessions = session.exec(select(ProgramSession).where(ProgramSession.program_id == program.id)).all()
+    # Récupérer toutes les sessions du programme et leurs sets (2 requêtes)
+    prog_sessions = session.exec(
+        select(ProgramSession)
+        .where(ProgramSession.program_id == program.id)
+        .order_by(ProgramSession.day_index)
+    ).all()
+    sets_by_session: dict[str, list[ProgramSet]] = defaultdict(list)
+    if prog_sessions:
+        for prog_set in session.exec(
+            select(ProgramSet)
+            .where(ProgramSet.program_session_id.in_([ps.id for ps in prog_sessions]))
+            .order_by(ProgramSet.order_index)
+        ).all():
+            sets_by_session[prog_set.program_session_id].append(prog_set)
     
     def _parse_reps(reps_str: str | None) -> int:
         """Parse reps string like '8-12' into an int (takes the lower bound)."""
@@ -403,67 +521,66 @@ def save_program(
     workouts_created = []
     user_id = current_user.id
     now = datetime.now(timezone.utc)
+    workout_rows: list[dict] = []
+    exercise_rows: list[dict] = []
+    set_rows: list[dict] = []
 
     for prog_session in prog_sessions:
         # Créer un workout pour chaque session du programme
-        workout = Workout(
-            user_id=user_id,
-            title=prog_session.title or f"Séance {prog_session.day_index + 1} du programme",
-            status="draft",
-            created_at=now,
-            updated_at=now,
-        )
-        session.add(workout)
-        session.flush()
-
-        # Récupérer les sets de la session
-        prog_sets = session.exec(
-            select(ProgramSet)
-            .where(ProgramSet.program_session_id == prog_session.id)
-            .order_by(ProgramSet.order_index)
-        ).all()
+        workout_id = generate_uuid()
+        title = prog_session.title or f"Séance {prog_session.day_index + 1} du programme"
+        workout_rows.append({
+            "id": workout_id,
+            "user_id": user_id,
+            "title": title,
+            "status": "draft",
+            "created_at": now,
+            "updated_at": now,
+        })
 
         # Grouper les sets par exercice
         exercises_map: dict[str, list[ProgramSet]] = {}
-        for prog_set in prog_sets:
+        for prog_set in sets_by_session[prog_session.id]:
             slug = prog_set.exercise_slug
             if slug not in exercises_map:
                 exercises_map[slug] = []
             exercises_map[slug].append(prog_set)
 
         # Créer les exercices et sets
-        order_index = 0
-        for exercise_slug, sets_list in exercises_map.items():
-            workout_exercise = WorkoutExercise(
-                workout_id=workout.id,
-                exercise_id=exercise_slug,
-                order_index=order_index,
-                planned_sets=len(sets_list),
-            )
-            session.add(workout_exercise)
-            session.flush()
-
-            # Créer les sets
+        for order_index, (exercise_slug, sets_list) in enumerate(exercises_map.items()):
+            workout_exercise_id = generate_uuid()
+            exercise_rows.append({
+                "id": workout_exercise_id,
+                "workout_id": workout_id,
+                "exercise_id": exercise_slug,
+                "order_index": order_index,
+                "planned_sets": len(sets_list),
+                "created_at": now,
+                "updated_at": now,
+            })
             for set_index, prog_set in enumerate(sets_list):
-                set_entry = Set(
-                    workout_exercise_id=workout_exercise.id,
-                    reps=_parse_reps(prog_set.reps),
-                    weight=prog_set.weight,
-                    rpe=prog_set.rpe,
-                    order=set_index,
-                    created_at=now,
-                    completed=False,
-                )
-                session.add(set_entry)
-            
-            order_index += 1
+                set_rows.append({
+                    "id": generate_uuid(),
+                    "workout_exercise_id": workout_exercise_id,
+                    "reps": _parse_reps(prog_set.reps),
+                    "weight": prog_set.weight,
+                    "rpe": prog_set.rpe,
+                    "order": set_index,
+                    "created_at": now,
+                    "updated_at": now,
+                    "completed": False,
+                })
 
         workouts_created.append({
-            "id": workout.id,
-            "title": workout.title,
+            "id": workout_id,
+            "title": title,
             "day_index": prog_session.day_index,
         })
 
+    _insert_rows(session, Workout, workout_rows)
+    _insert_rows(session, WorkoutExercise, exercise_rows)
+    _insert_rows(session, Set, set_rows)
+
     try:
         session.commit()
     except Exception:
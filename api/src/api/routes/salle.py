@@ -15,6 +15,8 @@ from pydantic import BaseModel
 from sqlmodel import Session, select
 
 from ..db import get_session
+from ..utils.metrics import record_cache, register_cache
+from ..services.exercise_index import resolve_exercises
 from ..models import (
     User,
     PassToken,
@@ -22,7 +24,6 @@ from ..models import (
     Workout,
     WorkoutExercise,
     Set,
-    Exercise,
 )
 
 router = APIRouter(prefix="/salle", tags=["salle"])
@@ -109,13 +110,18 @@ def _get_cached(key: str, fetch_fn: Callable[[], Any], ttl: int = SALLE_CACHE_TT
         if key in _salle_cache:
             expires_at, value = _salle_cache[key]
             if now < expires_at:
+                record_cache("salle", hit=True)
                 return value
+    record_cache("salle", hit=False)
     value = fetch_fn()
     with _salle_cache_lock:
         _salle_cache[key] = (now + ttl, value)
     return value
 
 
+register_cache("salle", lambda: len(_salle_cache))
+
+
 # --- Schémas ---
 
 
@@ -220,10 +226,7 @@ def _fetch_current_session_uncached(session: Session, user_id: str) -> Optional[
     exercise_ids = list({we.exercise_id for we in exercises})
     we_ids = [we.id for we in exercises]
 
-    exercises_map: dict[str, Exercise] = {}
-    if exercise_ids:
-        ex_list = session.exec(select(Exercise).where(Exercise.id.in_(exercise_ids))).all()
-        exercises_map = {ex.id: ex for ex in ex_list}
+    exercises_map = resolve_exercises(session, exercise_ids) if exercise_ids else {}
 
     sets_by_we: dict[str, list[Set]] = {wid: [] for wid in we_ids}
     if we_ids:
@@ -9,15 +9,18 @@ from sqlmodel import Session, select
 from ..db import get_engine
 from ..models import (
     User, Share, Follower, Workout, WorkoutExercise,
-    Set, Exercise, Like, Notification, Comment, Conversation, Message
+    Set, Like, Notification, Comment, Message
 )
+from ..services.conversations import get_or_create_conversation, refresh_conversation_summary
+from ..services.exercise_index import get_exercise_index
+from .notifications import recount_unread_notifications
 
 router = APIRouter(prefix="/seed", tags=["seed"])
 
 
 def get_exercises_by_muscle(session: Session) -> dict:
     """Récupère les exercices groupés par groupe musculaire."""
-    exercises = session.exec(select(Exercise)).all()
+    index = get_exercise_index(session)
     by_muscle = {}
     
     muscle_mapping = {
@@ -44,12 +47,11 @@ def get_exercises_by_muscle(session: Session) -> dict:
         "forearms": "forearms",
     }
     
-    for ex in exercises:
-        original = (ex.muscle_group or "other").lower()
+    # L'index regroupe déjà par groupe musculaire normalisé (minuscules, sans accents)
+    for muscle, entries in index.by_muscle.items():
+        original = muscle or "other"
         simplified = muscle_mapping.get(original, original)
-        if simplified not in by_muscle:
-            by_muscle[simplified] = []
-        by_muscle[simplified].append(ex)
+        by_muscle.setdefault(simplified, []).extend(entries)
     
     return by_muscle
 
@@ -377,9 +379,12 @@ def seed_demo_data():
                 message=notif_data["message"],
                 read=False,
                 created_at=datetime.now(timezone.utc) - timedelta(hours=notif_data["hours_ago"]),
+                updated_at=datetime.now(timezone.utc) - timedelta(hours=notif_data["hours_ago"]),
             )
             session.add(notif)
             created_notifications += 1
+        session.flush()
+        recount_unread_notifications(session, "guest-user")
         
         session.commit()
         
@@ -501,36 +506,18 @@ def seed_messages_data(user_id: str = "guest-user"):
         created_messages = 0
         
         for conv_data in conversations_data:
-            # Vérifier si la conversation existe déjà
-            existing_conv = session.exec(
-                select(Conversation).where(
-                    ((Conversation.participant1_id == my_id) & 
-                     (Conversation.participant2_id == conv_data["participant_id"])) |
-                    ((Conversation.participant1_id == conv_data["participant_id"]) & 
-                     (Conversation.participant2_id == my_id))
-                )
-            ).first()
-            
-            if existing_conv:
+            conversation, created = get_or_create_conversation(session, my_id, conv_data["participant_id"])
+            if created:
+                created_conversations += 1
+            else:
                 # Supprimer les anciens messages pour rafraîchir
                 old_messages = session.exec(
-                    select(Message).where(Message.conversation_id == existing_conv.id)
+                    select(Message).where(Message.conversation_id == conversation.id)
                 ).all()
                 for old_msg in old_messages:
                     session.delete(old_msg)
-                conversation = existing_conv
-            else:
-                # Créer nouvelle conversation
-                conversation = Conversation(
-                    participant1_id=my_id,
-                    participant2_id=conv_data["participant_id"],
-                )
-                session.add(conversation)
-                session.flush()
-                created_conversations += 1
-            
+
             # Ajouter les messages
-            last_message_time = None
             for msg_data in conv_data["messages"]:
                 msg_time = datetime.now(timezone.utc) - timedelta(minutes=msg_data["mins_ago"])
                 # Remplacer "ME" par l'ID de l'utilisateur actuel
@@ -544,12 +531,16 @@ def seed_messages_data(user_id: str = "guest-user"):
                 )
                 session.add(message)
                 created_messages += 1
-                
-                if last_message_time is None or msg_time > last_message_time:
-                    last_message_time = msg_time
             
-            # Mettre à jour le timestamp du dernier message
-            conversation.last_message_at = last_message_time
+            # Messages envoyés lus par l'autre, messages reçus non lus
+            if conversation.participant1_id == my_id:
+                conversation.participant1_last_read_at = None
+                conversation.participant2_last_read_at = datetime.now(timezone.utc)
+            else:
+                conversation.participant1_last_read_at = datetime.now(timezone.utc)
+                conversation.participant2_last_read_at = None
+            session.flush()
+            refresh_conversation_summary(session, conversation)
         
         session.commit()
         
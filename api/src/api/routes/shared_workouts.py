@@ -4,7 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session, select
 
 from ..db import get_session
-from ..models import Share, Workout, WorkoutExercise, Exercise, Set
+from ..models import Share, Workout, WorkoutExercise, Set
+from ..services.exercise_index import resolve_exercises
 
 router = APIRouter(prefix="/workouts/shared", tags=["feed"])
 
@@ -15,12 +16,8 @@ def _slug_to_name(slug: str) -> str:
 
 
 def _resolve_exercise(session: Session, exercise_id: str) -> dict:
-    """Look up an Exercise record by id or slug; fall back to slug-derived name."""
-    ex = session.get(Exercise, exercise_id)
-    if ex:
-        return {"name": ex.name, "slug": ex.slug or exercise_id, "muscle_group": ex.muscle_group}
-
-    ex = session.exec(select(Exercise).where(Exercise.slug == exercise_id)).first()
+    """Look up an exercise by id or slug; fall back to slug-derived name."""
+    ex = resolve_exercises(session, [exercise_id]).get(exercise_id)
     if ex:
         return {"name": ex.name, "slug": ex.slug or exercise_id, "muscle_group": ex.muscle_group}
 
@@ -49,16 +46,8 @@ def get_shared_workout(share_id: str, session: Session = Depends(get_session)) -
         exercise_ids = list({we.exercise_id for we in workout_exercises})
         we_ids = [we.id for we in workout_exercises]
 
-        exercises_by_id: dict[str, Exercise] = {}
-        exercises_by_slug: dict[str, Exercise] = {}
-        if exercise_ids:
-            all_exercises = session.exec(select(Exercise).where(Exercise.id.in_(exercise_ids))).all()
-            exercises_by_id = {ex.id: ex for ex in all_exercises}
-            # Also try slug lookup for IDs not found by primary key
-            missing_ids = [eid for eid in exercise_ids if eid not in exercises_by_id]
-            if missing_ids:
-                slug_exercises = session.exec(select(Exercise).where(Exercise.slug.in_(missing_ids))).all()
-                exercises_by_slug = {ex.slug: ex for ex in slug_exercises if ex.slug}
+        # Résolution par id puis slug via l'index partagé (base seulement pour les inconnus)
+        exercises_by_ref = resolve_exercises(session, exercise_ids) if exercise_ids else {}
 
         sets_by_we: dict[str, list[Set]] = {wid: [] for wid in we_ids}
         if we_ids:
@@ -69,7 +58,7 @@ def get_shared_workout(share_id: str, session: Session = Depends(get_session)) -
                 sets_by_we[s.workout_exercise_id].append(s)
 
         for we in workout_exercises:
-            ex = exercises_by_id.get(we.exercise_id) or exercises_by_slug.get(we.exercise_id)
+            ex = exercises_by_ref.get(we.exercise_id)
             if ex:
                 ex_info = {"name": ex.name, "slug": ex.slug or we.exercise_id, "muscle_group": ex.muscle_group}
             else:
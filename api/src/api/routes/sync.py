@@ -9,6 +9,7 @@ from ..db import get_session
 from ..models import Set, SyncEvent, User, Workout, WorkoutExercise
 from ..schemas import SyncPullResponse, SyncPushRequest, SyncPushResponse
 from ..utils.dependencies import get_current_user
+from ..utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 
@@ -269,7 +270,7 @@ def pull_changes(
     since: int = Query(0, ge=0),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
-) -> SyncPullResponse:
+) -> FastJSONResponse:
     cutoff = datetime.fromtimestamp(since / 1000, tz=timezone.utc)
     events: list[dict] = []
 
@@ -334,4 +335,5 @@ def pull_changes(
             "created_at": workout.updated_at,
         })
 
-    return SyncPullResponse(server_time=datetime.now(timezone.utc), events=events)
+    # Données lues en base : pas de revalidation par SyncPullResponse (schéma OpenAPI uniquement)
+    return FastJSONResponse({"server_time": datetime.now(timezone.utc), "events": events})
@@ -10,6 +10,7 @@ from ..db import get_session
 from ..models import User, PassToken
 from ..services.apple_pass import generate_pkpass
 from ..services.google_wallet import get_add_to_wallet_url
+from ..utils.compression import skip_compression
 from ..utils.dependencies import get_current_user, get_current_user_header_or_query
 
 router = APIRouter(prefix="/wallet", tags=["wallet"])
@@ -83,6 +84,7 @@ def renew_pass_token(
 
 
 @router.get("/apple/pass")
+@skip_compression  # .pkpass = archive zip, déjà compressée
 def get_apple_pass(
     current_user: User = Depends(get_current_user_header_or_query),
     session: Session = Depends(get_session),
@@ -207,6 +207,10 @@ class ExerciseRead(ExerciseBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ExerciseSearchResult(ExerciseRead):
+    score: float
+
+
 class UserProfileBase(BaseModel):
     id: str
     username: str
@@ -502,6 +506,20 @@ class CreateConversationResponse(BaseModel):
     created: bool  # True si nouvelle conversation, False si existante
 
 
+class MessageSearchHit(BaseModel):
+    id: str
+    conversation_id: str
+    sender_id: str
+    snippet: str  # extrait, termes trouvés entre <mark></mark>
+    created_at: datetime
+    score: float  # plus petit = plus pertinent
+
+
+class MessageSearchResponse(BaseModel):
+    results: list[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
+
 # Profile Setup Schemas
 class ProfileSetupStep1(BaseModel):
     """Étape 1: Informations de base"""
@@ -10,6 +10,7 @@ from sqlmodel import select
 from .db import get_engine
 from .db import init_db
 from .models import Exercise, Share, User, Workout, WorkoutExercise, Set, Story
+from .services.exercise_catalogue import bump_catalogue_version
 from .utils.slug import make_exercise_slug
 
 
@@ -131,6 +132,7 @@ def seed_exercises(force: bool = False) -> int:
     engine = get_engine()
     with Session(engine) as session:
         if force:
+            bump_catalogue_version(session, reset=True)
             session.exec(delete(Exercise))
             session.commit()
 
@@ -138,6 +140,8 @@ def seed_exercises(force: bool = False) -> int:
         if existing_count >= len(SEED_EXERCISES):
             return 0
 
+        version = bump_catalogue_version(session)
+
         for item in SEED_EXERCISES:
             data = item.__dict__.copy()
             data["slug"] = make_exercise_slug(item.name, item.muscle_group)
@@ -147,7 +151,7 @@ def seed_exercises(force: bool = False) -> int:
             data.pop("description", None)
             data.pop("source_type", None)
             data.pop("source_value", None)
-            session.add(Exercise(**data))
+            session.add(Exercise(**data, version=version))
         session.commit()
         return len(SEED_EXERCISES)
 
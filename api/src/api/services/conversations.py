@@ -0,0 +1,137 @@
+"""
+Conversations privées : une seule par paire d'utilisateurs.
+
+Les participants sont rangés dans l'ordre canonique (``participant1_id <
+participant2_id``) sous un index unique : la recherche d'une conversation est
+une lecture d'index, et deux créations concurrentes pour la même paire
+aboutissent à la même ligne (INSERT … ON CONFLICT DO NOTHING).
+"""
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from ..models import Conversation, Message, message_preview
+
+
+def canonical_pair(user1_id: str, user2_id: str) -> tuple[str, str]:
+    return (user1_id, user2_id) if user1_id <= user2_id else (user2_id, user1_id)
+
+
+def find_existing_conversation(session: Session, user1_id: str, user2_id: str) -> Optional[Conversation]:
+    participant1_id, participant2_id = canonical_pair(user1_id, user2_id)
+    return session.exec(
+        select(Conversation).where(
+            Conversation.participant1_id == participant1_id,
+            Conversation.participant2_id == participant2_id,
+        )
+    ).first()
+
+
+def get_or_create_conversation(session: Session, user1_id: str, user2_id: str) -> tuple[Conversation, bool]:
+    """Conversation de la paire, créée au besoin ; renvoie ``(conversation, created)``."""
+    existing = find_existing_conversation(session, user1_id, user2_id)
+    if existing is not None:
+        return existing, False
+
+    participant1_id, participant2_id = canonical_pair(user1_id, user2_id)
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    result = session.execute(
+        dialect.insert(Conversation)
+        .values(participant1_id=participant1_id, participant2_id=participant2_id)
+        .on_conflict_do_nothing(index_elements=["participant1_id", "participant2_id"])
+    )
+    # Perdue face à une création concurrente : on relit la gagnante
+    return find_existing_conversation(session, user1_id, user2_id), result.rowcount == 1
+
+
+def refresh_conversation_summary(session: Session, conversation: Conversation) -> None:
+    """Recalcule dernier message et non-lus depuis ``Message`` (seed, fusion de doublons)."""
+    last = session.exec(
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.created_at.desc())
+        .limit(1)
+    ).first()
+    conversation.last_message_at = last.created_at if last else None
+    conversation.last_message_id = last.id if last else None
+    conversation.last_message_sender_id = last.sender_id if last else None
+    conversation.last_message_preview = message_preview(last.content) if last else None
+
+    for slot in (1, 2):
+        participant_id = getattr(conversation, f"participant{slot}_id")
+        last_read_at = getattr(conversation, f"participant{slot}_last_read_at")
+        statement = select(func.count(Message.id)).where(
+            Message.conversation_id == conversation.id,
+            Message.sender_id != participant_id,
+        )
+        if last_read_at is not None:
+            statement = statement.where(Message.created_at > last_read_at)
+        setattr(conversation, f"participant{slot}_unread", session.exec(statement).one())
+    session.add(conversation)
+
+
+def merge_duplicate_conversations(session: Session) -> int:
+    """Ramène les conversations à l'ordre canonique et fusionne les doublons par paire.
+
+    La plus ancienne conversation de chaque paire est conservée : elle reçoit
+    les messages des autres et, par participant, la lecture la plus récente.
+    Renvoie le nombre de conversations supprimées ; l'appelant committe.
+    """
+    # Ordre canonique : échange des colonnes par participant (les expressions
+    # SET lisent les valeurs d'avant la mise à jour)
+    session.execute(
+        update(Conversation)
+        .where(Conversation.participant1_id > Conversation.participant2_id)
+        .values({
+            Conversation.participant1_id: Conversation.participant2_id,
+            Conversation.participant2_id: Conversation.participant1_id,
+            Conversation.participant1_unread: Conversation.participant2_unread,
+            Conversation.participant2_unread: Conversation.participant1_unread,
+            Conversation.participant1_last_read_at: Conversation.participant2_last_read_at,
+            Conversation.participant2_last_read_at: Conversation.participant1_last_read_at,
+        })
+        .execution_options(synchronize_session=False)
+    )
+    session.expire_all()
+
+    duplicated = session.exec(
+        select(Conversation.participant1_id, Conversation.participant2_id)
+        .group_by(Conversation.participant1_id, Conversation.participant2_id)
+        .having(func.count(Conversation.id) > 1)
+    ).all()
+    if not duplicated:
+        return 0
+
+    removed = 0
+    for participant1_id, participant2_id in duplicated:
+        group = session.exec(
+            select(Conversation)
+            .where(
+                Conversation.participant1_id == participant1_id,
+                Conversation.participant2_id == participant2_id,
+            )
+            .order_by(Conversation.created_at, Conversation.id)
+        ).all()
+        keep, duplicates = group[0], group[1:]
+        for slot in (1, 2):
+            marks = [
+                getattr(conv, f"participant{slot}_last_read_at")
+                for conv in group
+                if getattr(conv, f"participant{slot}_last_read_at") is not None
+            ]
+            setattr(keep, f"participant{slot}_last_read_at", max(marks) if marks else None)
+        duplicate_ids = [conv.id for conv in duplicates]
+        session.execute(
+            update(Message)
+            .where(Message.conversation_id.in_(duplicate_ids))
+            .values(conversation_id=keep.id)
+            .execution_options(synchronize_session=False)
+        )
+        for conv in duplicates:
+            session.delete(conv)
+        session.flush()
+        refresh_conversation_summary(session, keep)
+        removed += len(duplicates)
+    return removed
@@ -0,0 +1,62 @@
+"""
+Version du catalogue d'exercices.
+
+Chaque écriture (création, bulk, import, seed) incrémente un compteur persistant
+(table ``catalogueversion``) dans la même transaction et tamponne les lignes
+écrites avec cette version. Le compteur est partagé par tous les workers : un
+cache ou un client peut comparer sa version à celle de la base avec une seule
+lecture par clé primaire.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from ..models import CatalogueVersion, utcnow
+
+EXERCISES_CATALOGUE = "exercises"
+
+
+@dataclass(frozen=True)
+class CatalogueState:
+    version: int
+    # Dernière version ayant supprimé des lignes (import force, reseed)
+    reset_version: int
+    updated_at: Optional[datetime] = None
+
+    @property
+    def etag(self) -> str:
+        # L'horodatage distingue deux bases recréées qui repartent à la même version
+        stamp = int(self.updated_at.timestamp() * 1_000_000) if self.updated_at else 0
+        return f'"exercises-{self.version}-{stamp:x}"'
+
+
+def get_catalogue_state(session: Session, name: str = EXERCISES_CATALOGUE) -> CatalogueState:
+    row = session.get(CatalogueVersion, name)
+    if row is None:
+        return CatalogueState(version=0, reset_version=0)
+    return CatalogueState(
+        version=row.version, reset_version=row.reset_version, updated_at=row.updated_at
+    )
+
+
+def bump_catalogue_version(
+    session: Session, reset: bool = False, name: str = EXERCISES_CATALOGUE
+) -> int:
+    """Incrémente la version dans la transaction courante (commit à la charge de l'appelant).
+
+    ``reset=True`` quand l'écriture supprime des lignes : les deltas antérieurs
+    ne peuvent plus être appliqués et les clients doivent tout recharger.
+    """
+    row = session.exec(
+        select(CatalogueVersion).where(CatalogueVersion.name == name).with_for_update()
+    ).first()
+    if row is None:
+        row = CatalogueVersion(name=name)
+    row.version += 1
+    if reset:
+        row.reset_version = row.version
+    row.updated_at = utcnow()
+    session.add(row)
+    return row.version
@@ -0,0 +1,152 @@
+"""
+Index mémoire du catalogue d'exercices, partagé par tout le process.
+
+Le catalogue change rarement (voir ``exercise_catalogue``) mais il est relu à
+chaque génération de programme, partage ou séance en cours. L'index est un
+instantané immuable (entrées figées + dictionnaires par id, slug, groupe
+musculaire normalisé et équipement). Il est reconstruit quand la version du
+catalogue en base change puis remplacé d'un bloc : un lecteur voit toujours
+soit l'ancien index complet, soit le nouveau.
+"""
+from dataclasses import dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlmodel import Session, select
+
+from ..models import Exercise
+from ..utils.metrics import record_cache, register_cache
+from ..utils.slug import normalize
+from .exercise_catalogue import CatalogueState, get_catalogue_state
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Clé de regroupement : minuscules, sans accents ni espaces superflus."""
+    return normalize(value or "").lower().strip()
+
+
+@dataclass(frozen=True, slots=True)
+class ExerciseEntry:
+    """Copie figée d'une ligne Exercise (mêmes attributs, sans session)."""
+
+    id: str
+    name: str
+    slug: Optional[str]
+    category: Optional[str]
+    muscle_group: str
+    equipment: Optional[str]
+    instructions: Optional[str]
+    video_url: Optional[str]
+    version: int
+
+    @classmethod
+    def from_row(cls, row: Exercise) -> "ExerciseEntry":
+        return cls(
+            id=row.id,
+            name=row.name,
+            slug=row.slug,
+            category=row.category,
+            muscle_group=row.muscle_group,
+            equipment=row.equipment,
+            instructions=row.instructions,
+            video_url=row.video_url,
+            version=row.version,
+        )
+
+
+def _group(entries: tuple[ExerciseEntry, ...], key) -> Mapping[str, tuple[ExerciseEntry, ...]]:
+    groups: dict[str, list[ExerciseEntry]] = {}
+    for entry in entries:
+        groups.setdefault(key(entry), []).append(entry)
+    return MappingProxyType({k: tuple(v) for k, v in groups.items()})
+
+
+class ExerciseIndex:
+    """Instantané du catalogue. Ne jamais modifier : reconstruire."""
+
+    __slots__ = ("state", "exercises", "by_id", "by_slug", "by_muscle", "by_equipment")
+
+    def __init__(self, state: CatalogueState, entries: tuple[ExerciseEntry, ...]) -> None:
+        self.state = state
+        self.exercises = entries
+        self.by_id: Mapping[str, ExerciseEntry] = MappingProxyType({e.id: e for e in entries})
+        self.by_slug: Mapping[str, ExerciseEntry] = MappingProxyType(
+            {e.slug: e for e in entries if e.slug}
+        )
+        self.by_muscle = _group(entries, lambda e: normalize_key(e.muscle_group))
+        self.by_equipment = _group(entries, lambda e: normalize_key(e.equipment))
+
+    def __len__(self) -> int:
+        return len(self.exercises)
+
+    def resolve(self, id_or_slug: str) -> Optional[ExerciseEntry]:
+        """Recherche par id puis par slug (les clients hors ligne envoient parfois le slug)."""
+        return self.by_id.get(id_or_slug) or self.by_slug.get(id_or_slug)
+
+    def for_muscle(self, muscle_group: str) -> tuple[ExerciseEntry, ...]:
+        return self.by_muscle.get(normalize_key(muscle_group), ())
+
+    def for_equipment(self, equipment: str) -> tuple[ExerciseEntry, ...]:
+        return self.by_equipment.get(normalize_key(equipment), ())
+
+
+_index: Optional[ExerciseIndex] = None
+_index_lock = Lock()
+
+register_cache("exercise_index", lambda: len(_index) if _index is not None else 0)
+
+
+def get_exercise_index(session: Session) -> ExerciseIndex:
+    """Index courant ; une lecture par clé primaire pour vérifier la version.
+
+    Les lignes écrites sans passer par ``bump_catalogue_version`` n'y
+    apparaissent qu'au prochain changement de version : les appelants qui
+    résolvent un id inconnu retombent sur la base (voir ``resolve_exercises``).
+    """
+    global _index
+    state = get_catalogue_state(session)
+    current = _index
+    if current is not None and current.state == state:
+        record_cache("exercise_index", True)
+        return current
+    record_cache("exercise_index", False)
+    with _index_lock:
+        current = _index
+        if current is not None and current.state == state:
+            return current
+        # Ordre stable : bitsets et ordre des candidats (donc programmes à graine) en dépendent
+        rows = session.exec(select(Exercise).order_by(Exercise.id)).all()
+        current = ExerciseIndex(state, tuple(ExerciseEntry.from_row(row) for row in rows))
+        _index = current
+        return current
+
+
+def invalidate_exercise_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def resolve_exercises(session: Session, ids: list[str]) -> dict[str, ExerciseEntry]:
+    """Résout des ids (ou slugs) via l'index, avec repli en base pour les inconnus."""
+    index = get_exercise_index(session)
+    found: dict[str, ExerciseEntry] = {}
+    missing: list[str] = []
+    for exercise_id in ids:
+        entry = index.resolve(exercise_id)
+        if entry is None:
+            missing.append(exercise_id)
+        else:
+            found[exercise_id] = entry
+    if missing:
+        rows = session.exec(
+            select(Exercise).where(Exercise.id.in_(missing) | Exercise.slug.in_(missing))
+        ).all()
+        by_id = {row.id: row for row in rows}
+        by_slug = {row.slug: row for row in rows if row.slug}
+        for exercise_id in missing:
+            row = by_id.get(exercise_id) or by_slug.get(exercise_id)
+            if row is not None:
+                found[exercise_id] = ExerciseEntry.from_row(row)
+    return found
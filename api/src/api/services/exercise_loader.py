@@ -1,14 +1,22 @@
 """
 Service pour charger des exercices depuis une source externe (URL, Google Drive, etc.)
 """
+import itertools
 import json
+import os
 import re
-from typing import Optional
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
 import httpx
+from sqlalchemy import insert, update
 from sqlmodel import Session, select
 
-from ..models import Exercise
+from ..models import Exercise, generate_uuid
 from ..utils.slug import make_exercise_slug
+from .exercise_catalogue import bump_catalogue_version
 
 
 def convert_google_drive_url(url: str) -> str:
@@ -31,7 +39,154 @@ def convert_google_drive_url(url: str) -> str:
     return url
 
 
-def load_exercises_from_url(url: str, timeout: int = 30) -> list[dict]:
+EXERCISE_IMPORT_BATCH_SIZE = int(os.getenv("EXERCISE_IMPORT_BATCH_SIZE", "500"))
+# Un élément du tableau plus gros que ça = fichier corrompu (on arrête de bufferiser)
+_MAX_ITEM_CHARS = 1_000_000
+_READ_CHUNK_CHARS = 64 * 1024
+_WHITESPACE = " \t\r\n"
+
+
+def _is_local_source(url: str) -> bool:
+    return url.startswith("file://") or "://" not in url
+
+
+def _iter_source_text(url: str, timeout: int, allow_local_files: bool) -> Iterator[str]:
+    """Lit la source par morceaux de texte : fichier local, file:// ou HTTP(S)."""
+    if _is_local_source(url):
+        if not allow_local_files:
+            raise ValueError("Les fichiers locaux ne sont pas autorisés pour cet import")
+        path = url2pathname(urlparse(url).path) if url.startswith("file://") else url
+        with open(path, encoding="utf-8") as fh:
+            while chunk := fh.read(_READ_CHUNK_CHARS):
+                yield chunk
+        return
+
+    # Convertir l'URL Google Drive si nécessaire
+    if 'drive.google.com' in url:
+        url = convert_google_drive_url(url)
+    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
+        with client.stream("GET", url) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """Décode un tableau JSON élément par élément, sans charger le document entier."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    state = "start"  # start -> first/item -> sep -> ... -> end
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("Le JSON doit être un tableau d'exercices")
+                pos += 1
+                state = "first"
+            elif state == "first" and char == "]":
+                pos += 1
+                state = "end"
+            elif state in ("first", "item"):
+                try:
+                    value, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Élément incomplet : attendre le morceau suivant
+                    if len(buffer) - pos > _MAX_ITEM_CHARS:
+                        raise
+                    break
+                state = "sep"
+                yield value
+            elif state == "sep" and char in ",]":
+                pos += 1
+                state = "item" if char == "," else "end"
+            else:
+                raise ValueError(f"JSON invalide près de : {buffer[pos:pos + 40]!r}")
+    if state != "end":
+        if state in ("first", "item") and buffer[pos:].strip():
+            decoder.raw_decode(buffer, pos)  # lève l'erreur JSON précise
+        raise ValueError("JSON tronqué : le tableau d'exercices n'est pas fermé")
+
+
+def normalize_exercise_item(item: Any, idx: int, source: str) -> dict:
+    """Valide un élément du fichier et le ramène au format interne.
+
+    Formats acceptés : V1 (muscle_group) ou V2 (primary_muscle / category / group),
+    equipment en chaîne ou tableau.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"L'exercice à l'index {idx} doit être un objet")
+
+    # Vérifier que le nom existe
+    if 'name' not in item:
+        raise ValueError(f"L'exercice à l'index {idx} manque le champ 'name'")
+
+    # Mapper les différents formats possibles
+    # Format V1 : muscle_group directement
+    # Format V2 : primary_muscle ou category
+    muscle_group = (
+        item.get('muscle_group') or 
+        item.get('primary_muscle') or 
+        item.get('category') or 
+        item.get('group') or 
+        'other'
+    )
+    
+    # Normaliser le groupe musculaire (mettre en minuscules)
+    muscle_group = str(muscle_group).lower().strip()
+    
+    # Gérer equipment (peut être une chaîne ou un tableau)
+    equipment_raw = item.get('equipment', '')
+    if isinstance(equipment_raw, list):
+        # Prendre le premier équipement ou joindre avec virgule
+        equipment = equipment_raw[0] if equipment_raw else 'bodyweight'
+    else:
+        equipment = str(equipment_raw).strip() or 'bodyweight'
+    
+    # Normaliser l'équipement (mettre en minuscules)
+    equipment = equipment.lower()
+    
+    # Construire la description à partir des champs disponibles
+    description_parts = []
+    if item.get('description'):
+        description_parts.append(str(item['description']).strip())
+    if item.get('cues'):
+        description_parts.append(f"Cues: {item['cues']}")
+    if item.get('common_errors'):
+        description_parts.append(f"Common errors: {item['common_errors']}")
+    if item.get('movement_pattern'):
+        description_parts.append(f"Pattern: {item['movement_pattern']}")
+    
+    description = ' | '.join(description_parts) if description_parts else None
+    
+    return {
+        'name': str(item['name']).strip(),
+        'muscle_group': muscle_group,
+        'equipment': equipment,
+        'description': description,
+        'image_url': str(item.get('image_url') or '').strip() or None,
+        'video_url': str(item.get('video_url') or '').strip() or None,
+        'source_type': item.get('source_type', 'external'),
+        'source_value': item.get('source_value', source),
+    }
+
+
+def iter_exercises(
+    url: str, timeout: int = 30, allow_local_files: bool = False
+) -> Iterator[dict]:
+    """Itère sur les exercices normalisés d'une source, au fil de la lecture."""
+    chunks = _iter_source_text(url, timeout, allow_local_files)
+    for idx, item in enumerate(iter_json_array(chunks)):
+        yield normalize_exercise_item(item, idx, url)
+
+
+def load_exercises_from_url(url: str, timeout: int = 30, allow_local_files: bool = False) -> list[dict]:
     """Charge des exercices depuis une URL (JSON)
     
     Format attendu du JSON :
@@ -49,7 +204,8 @@ def load_exercises_from_url(url: str, timeout: int = 30) -> list[dict]:
     ]
     
     Args:
-        url: URL du fichier JSON (peut être un lien Google Drive)
+        url: URL du fichier JSON (peut être un lien Google Drive, ou file:// / chemin
+            local si allow_local_files)
         timeout: Timeout en secondes pour la requête HTTP
         
     Returns:
@@ -60,79 +216,53 @@ def load_exercises_from_url(url: str, timeout: int = 30) -> list[dict]:
         json.JSONDecodeError: Si le JSON est invalide
         ValueError: Si le format des données est invalide
     """
-    # Convertir l'URL Google Drive si nécessaire
-    if 'drive.google.com' in url:
-        url = convert_google_drive_url(url)
-    
-    # Faire la requête HTTP
-    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
-        response = client.get(url)
-        response.raise_for_status()
-        data = response.json()
-    
-    # Valider le format
-    if not isinstance(data, list):
-        raise ValueError("Le JSON doit être un tableau d'exercices")
-    
-    # Valider chaque exercice
-    exercises = []
-    for idx, item in enumerate(data):
-        if not isinstance(item, dict):
-            raise ValueError(f"L'exercice à l'index {idx} doit être un objet")
-        
-        # Vérifier que le nom existe
-        if 'name' not in item:
-            raise ValueError(f"L'exercice à l'index {idx} manque le champ 'name'")
-        
-        # Mapper les différents formats possibles
-        # Format V1 : muscle_group directement
-        # Format V2 : primary_muscle ou category
-        muscle_group = (
-            item.get('muscle_group') or 
-            item.get('primary_muscle') or 
-            item.get('category') or 
-            item.get('group') or 
-            'other'
-        )
-        
-        # Normaliser le groupe musculaire (mettre en minuscules)
-        muscle_group = str(muscle_group).lower().strip()
-        
-        # Gérer equipment (peut être une chaîne ou un tableau)
-        equipment_raw = item.get('equipment', '')
-        if isinstance(equipment_raw, list):
-            # Prendre le premier équipement ou joindre avec virgule
-            equipment = equipment_raw[0] if equipment_raw else 'bodyweight'
+    return list(iter_exercises(url, timeout, allow_local_files))
+
+
+# Colonnes comparées pour décider d'une mise à jour
+_UPSERT_FIELDS = ("name", "category", "muscle_group", "equipment", "instructions", "video_url")
+
+
+def _exercise_row(ex_data: dict, slug: str) -> dict:
+    return {
+        'slug': slug,
+        'name': ex_data['name'],
+        # Comme le seed : catégorie = groupe musculaire
+        'category': ex_data['muscle_group'],
+        'muscle_group': ex_data['muscle_group'],
+        'equipment': ex_data['equipment'],
+        'instructions': ex_data['description'],
+        'video_url': ex_data.get('video_url'),
+    }
+
+
+def _upsert_batch(session: Session, batch: dict[str, dict], version: int) -> tuple[int, int, int]:
+    """Upsert d'un lot par slug : un SELECT, puis un INSERT et un UPDATE en executemany."""
+    columns = [getattr(Exercise, field) for field in _UPSERT_FIELDS]
+    existing = {
+        row[1]: row
+        for row in session.execute(
+            select(Exercise.id, Exercise.slug, *columns).where(Exercise.slug.in_(list(batch)))
+        ).all()
+    }
+
+    to_insert: list[dict] = []
+    to_update: list[dict] = []
+    skipped = 0
+    for slug, row in batch.items():
+        current = existing.get(slug)
+        if current is None:
+            to_insert.append({**row, 'id': generate_uuid(), 'version': version})
+        elif tuple(current[2:]) != tuple(row[field] for field in _UPSERT_FIELDS):
+            to_update.append({**row, 'id': current[0], 'version': version})
         else:
-            equipment = str(equipment_raw).strip() or 'bodyweight'
-        
-        # Normaliser l'équipement (mettre en minuscules)
-        equipment = equipment.lower()
-        
-        # Construire la description à partir des champs disponibles
-        description_parts = []
-        if item.get('description'):
-            description_parts.append(str(item['description']).strip())
-        if item.get('cues'):
-            description_parts.append(f"Cues: {item['cues']}")
-        if item.get('common_errors'):
-            description_parts.append(f"Common errors: {item['common_errors']}")
-        if item.get('movement_pattern'):
-            description_parts.append(f"Pattern: {item['movement_pattern']}")
-        
-        description = ' | '.join(description_parts) if description_parts else None
-        
-        exercises.append({
-            'name': str(item['name']).strip(),
-            'muscle_group': muscle_group,
-            'equipment': equipment,
-            'description': description,
-            'image_url': str(item.get('image_url', '')).strip() or None,
-            'source_type': item.get('source_type', 'external'),
-            'source_value': item.get('source_value', url),
-        })
-    
-    return exercises
+            skipped += 1
+
+    if to_insert:
+        session.execute(insert(Exercise), to_insert)
+    if to_update:
+        session.execute(update(Exercise), to_update)
+    return len(to_insert), len(to_update), skipped
 
 
 def import_exercises_from_url(
@@ -140,60 +270,61 @@ def import_exercises_from_url(
     url: str,
     force: bool = False,
     timeout: int = 30,
+    batch_size: int = EXERCISE_IMPORT_BATCH_SIZE,
+    allow_local_files: bool = False,
 ) -> dict:
     """Importe des exercices depuis une URL dans la base de données
     
+    Le fichier est lu en flux et upserté par lots de ``batch_size`` slugs, dans une
+    seule transaction : une erreur (JSON invalide, exercice sans nom) annule tout.
+
     Args:
         session: Session SQLModel
-        url: URL du fichier JSON
+        url: URL du fichier JSON, ou chemin local / file:// si allow_local_files
         force: Si True, supprime les exercices existants avant d'importer
         timeout: Timeout en secondes pour la requête HTTP
+        batch_size: Nombre d'exercices par aller-retour en base
+        allow_local_files: Autorise les chemins locaux (jamais pour une URL fournie par un client)
         
     Returns:
-        Dictionnaire avec 'imported' (nombre d'exercices importés), 
-        'skipped' (nombre d'exercices ignorés car déjà existants),
-        'total' (nombre total d'exercices dans le fichier)
+        Dictionnaire avec 'inserted', 'updated', 'skipped' (déjà à jour),
+        'total' (nombre d'exercices dans le fichier) et 'imported' (= inserted,
+        nom historique)
     """
-    from sqlmodel import delete, func
-    
+    from sqlmodel import delete
+
+    exercises = iter_exercises(url, timeout, allow_local_files)
+    # Lire le premier élément avant d'écrire : une source injoignable ne vide pas le catalogue
+    first = next(exercises, None)
+
+    version = bump_catalogue_version(session, reset=force)
     if force:
         session.exec(delete(Exercise))
-        session.commit()
-    
-    # Charger les exercices depuis l'URL
-    exercises_data = load_exercises_from_url(url, timeout)
-    
-    imported = 0
-    skipped = 0
-    
-    for ex_data in exercises_data:
-        slug = make_exercise_slug(ex_data['name'], ex_data['muscle_group'])
-        
-        # Vérifier si l'exercice existe déjà
-        existing = session.exec(select(Exercise).where(Exercise.slug == slug)).first()
-        if existing:
-            skipped += 1
-            continue
-        
-        # Créer le nouvel exercice
-        exercise = Exercise(
-            slug=slug,
-            name=ex_data['name'],
-            muscle_group=ex_data['muscle_group'],
-            equipment=ex_data['equipment'],
-            description=ex_data['description'],
-            image_url=ex_data['image_url'],
-            source_type=ex_data['source_type'],
-            source_value=ex_data['source_value'],
-        )
-        session.add(exercise)
-        imported += 1
-    
+
+    inserted = updated = skipped = total = 0
+    batch: dict[str, dict] = {}
+    try:
+        for ex_data in itertools.chain([first] if first else [], exercises):
+            total += 1
+            slug = make_exercise_slug(ex_data['name'], ex_data['muscle_group'])
+            if slug in batch or len(batch) >= batch_size:
+                counts = _upsert_batch(session, batch, version)
+                inserted, updated, skipped = inserted + counts[0], updated + counts[1], skipped + counts[2]
+                batch = {}
+            batch[slug] = _exercise_row(ex_data, slug)
+        if batch:
+            counts = _upsert_batch(session, batch, version)
+            inserted, updated, skipped = inserted + counts[0], updated + counts[1], skipped + counts[2]
+    except Exception:
+        session.rollback()
+        raise
+
     session.commit()
     
     return {
-        'imported': imported,
+        'inserted': inserted,
+        'updated': updated,
         'skipped': skipped,
-        'total': len(exercises_data),
+        'total': total,
+        'imported': inserted,
     }
-
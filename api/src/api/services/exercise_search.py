@@ -0,0 +1,170 @@
+"""
+Recherche floue d'exercices (autocomplete) sur un index trigrammes en mémoire.
+
+Texte indexé par exercice : nom, groupe musculaire (avec sa traduction FR/EN
+d'après ``MUSCLE_GROUP_MAP``) et équipement, normalisés sans accents ni
+majuscules. Chaque mot est découpé en trigrammes complétés d'espaces (comme
+pg_trgm) : « benhc » retrouve « bench », « epaules » retrouve « Épaules ».
+
+Le dernier mot de la requête est traité comme un préfixe (saisie en cours).
+L'index est reconstruit quand l'index d'exercices change (nouvelle version du
+catalogue) puis remplacé d'un bloc.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+from sqlmodel import Session
+
+from .exercise_index import ExerciseEntry, ExerciseIndex, get_exercise_index, normalize_key
+from .program_generator import MUSCLE_GROUP_MAP
+
+# Similarité minimale (Jaccard sur trigrammes) pour qu'un mot de la requête compte
+MIN_SIMILARITY = 0.3
+# Les correspondances hors du nom (muscle, équipement) pèsent moins
+_META_WEIGHT = 0.8
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Traductions FR <-> EN des groupes musculaires, clés normalisées
+_MUSCLE_SYNONYMS: dict[str, set[str]] = {}
+for _fr, _en in MUSCLE_GROUP_MAP.items():
+    _MUSCLE_SYNONYMS.setdefault(normalize_key(_fr), set()).add(_en)
+    _MUSCLE_SYNONYMS.setdefault(_en, set()).add(normalize_key(_fr))
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return _WORD_RE.findall(normalize_key(text).replace("_", " "))
+
+
+def trigrams(word: str) -> frozenset[str]:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    exercise: ExerciseEntry
+    score: float
+
+
+class ExerciseSearchIndex:
+    """Index trigrammes sur le vocabulaire + vocabulaire trié (préfixes). Immuable.
+
+    Les trigrammes pointent vers les mots (quelques centaines) et non vers les
+    exercices : une requête compare ses mots au vocabulaire, puis remonte aux
+    exercices via les listes mot → exercices.
+    """
+
+    def __init__(self, source: ExerciseIndex) -> None:
+        self.source = source
+        self._entries = source.exercises
+        word_ids: dict[str, int] = {}
+        word_docs: list[dict[int, float]] = []
+        for doc_id, entry in enumerate(self._entries):
+            weighted: dict[str, float] = {}
+            for word in tokenize(entry.name):
+                weighted[word] = 1.0
+            meta = tokenize(entry.muscle_group) + tokenize(entry.equipment)
+            for word in list(meta):
+                meta.extend(_MUSCLE_SYNONYMS.get(word, ()))
+            for word in meta:
+                weighted.setdefault(word, _META_WEIGHT)
+            for word, weight in weighted.items():
+                word_id = word_ids.setdefault(word, len(word_ids))
+                if word_id == len(word_docs):
+                    word_docs.append({})
+                word_docs[word_id][doc_id] = weight
+
+        self._words = list(word_ids)
+        self._word_ids = word_ids
+        self._word_docs = tuple(tuple(docs.items()) for docs in word_docs)
+        gram_words: dict[str, list[int]] = {}
+        self._word_gram_counts: list[int] = []
+        for word_id, word in enumerate(self._words):
+            grams = trigrams(word)
+            self._word_gram_counts.append(len(grams))
+            for gram in grams:
+                gram_words.setdefault(gram, []).append(word_id)
+        self._gram_words = {gram: tuple(ids) for gram, ids in gram_words.items()}
+        self._sorted_vocabulary = sorted(word_ids)
+
+    def _match_word(self, query: str, is_prefix: bool) -> dict[int, float]:
+        """Mots du vocabulaire proches de ``query`` → similarité (0..1)."""
+        grams = trigrams(query)
+        common: Counter[int] = Counter()
+        for gram in grams:
+            common.update(self._gram_words.get(gram, ()))
+        matches: dict[int, float] = {}
+        for word_id, shared in common.items():
+            similarity = shared / (len(grams) + self._word_gram_counts[word_id] - shared)
+            if similarity >= MIN_SIMILARITY:
+                matches[word_id] = similarity
+        if is_prefix:
+            start = bisect_left(self._sorted_vocabulary, query)
+            for word in self._sorted_vocabulary[start:]:
+                if not word.startswith(query):
+                    break
+                word_id = self._word_ids[word]
+                matches[word_id] = max(matches.get(word_id, 0.0), 0.9)
+        exact = self._word_ids.get(query)
+        if exact is not None:
+            matches[exact] = 1.0
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        words = tokenize(query)
+        if not words:
+            return []
+
+        totals: Optional[dict[int, float]] = None
+        last = len(words) - 1
+        for i, word in enumerate(words):
+            per_doc: dict[int, float] = {}
+            for word_id, similarity in self._match_word(word, i == last).items():
+                for doc_id, weight in self._word_docs[word_id]:
+                    score = similarity * weight
+                    if score > per_doc.get(doc_id, 0.0):
+                        per_doc[doc_id] = score
+            # Chaque mot de la requête doit correspondre à quelque chose
+            if totals is None:
+                totals = per_doc
+            else:
+                totals = {d: totals[d] + score for d, score in per_doc.items() if d in totals}
+            if not totals:
+                return []
+
+        entries = self._entries
+        best = heapq.nsmallest(
+            limit,
+            totals.items(),
+            key=lambda item: (-item[1], len(entries[item[0]].name), entries[item[0]].name),
+        )
+        return [SearchHit(entries[doc_id], round(total / len(words), 4)) for doc_id, total in best]
+
+
+_search_index: Optional[ExerciseSearchIndex] = None
+_search_lock = Lock()
+
+
+def get_search_index(session: Session) -> ExerciseSearchIndex:
+    """Index de recherche aligné sur l'index d'exercices courant."""
+    global _search_index
+    source = get_exercise_index(session)
+    current = _search_index
+    if current is not None and current.source is source:
+        return current
+    with _search_lock:
+        current = _search_index
+        if current is None or current.source is not source:
+            current = ExerciseSearchIndex(source)
+            _search_index = current
+        return current
+
+
+def search_exercises(session: Session, query: str, limit: int = 20) -> list[SearchHit]:
+    return get_search_index(session).search(query, limit)
@@ -0,0 +1,182 @@
+"""
+Recherche plein texte dans les messages privés.
+
+- SQLite : table FTS5 ``message_fts`` à contenu externe (``message``, clé
+  ``rowid``), tenue à jour par triggers, tokenizer ``unicode61`` sans
+  accents. ``message`` n'a pas de clé INTEGER PRIMARY KEY : un VACUUM peut
+  renuméroter ses rowid, il doit être suivi de ``rebuild_message_search_index`` ;
+- PostgreSQL : index GIN sur ``to_tsvector('simple', content)`` (multilingue,
+  pas de racinisation).
+
+La requête est réduite à ses mots (pas de syntaxe FTS exposée), tous
+obligatoires, le dernier en préfixe (saisie en cours). Les résultats sont
+limités aux conversations de l'utilisateur, classés par pertinence puis id,
+et paginés par curseur (score, id).
+"""
+import base64
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+
+_WORD_RE = re.compile(r"\w+")
+
+# Contenu externe : les triggers adressent l'index par rowid (commande
+# 'delete'), sans parcourir la table FTS
+SQLITE_SETUP = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+    "content, content = 'message', content_rowid = 'rowid', "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN "
+    "INSERT INTO message_fts (rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN "
+    "INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_update AFTER UPDATE OF content ON message BEGIN "
+    "INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    "INSERT INTO message_fts (rowid, content) VALUES (new.rowid, new.content); END",
+)
+_SQLITE_TRIGGERS = ("message_fts_insert", "message_fts_delete", "message_fts_update")
+
+POSTGRES_SETUP = (
+    "CREATE INDEX IF NOT EXISTS ix_message_content_fts ON message "
+    "USING GIN (to_tsvector('simple', content))",
+)
+
+_SQLITE_SEARCH = text(f"""
+    SELECT id, conversation_id, sender_id, created_at, snippet, score FROM (
+        SELECT m.id AS id, m.conversation_id AS conversation_id, m.sender_id AS sender_id,
+               m.created_at AS created_at,
+               snippet(message_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 12) AS snippet,
+               bm25(message_fts) AS score
+        FROM message_fts
+        JOIN message m ON m.rowid = message_fts.rowid
+        JOIN conversation c ON c.id = m.conversation_id
+        WHERE message_fts MATCH :query
+          AND (c.participant1_id = :user_id OR c.participant2_id = :user_id)
+    ) AS hits
+    WHERE :after_score IS NULL OR score > :after_score OR (score = :after_score AND id > :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+""")
+
+# ts_headline est coûteux : calculé sur la page seulement
+_POSTGRES_SEARCH = text(f"""
+    SELECT hits.id, hits.conversation_id, hits.sender_id, hits.created_at,
+           ts_headline('simple', hits.content, to_tsquery('simple', :query),
+                       'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=24, MinWords=8') AS snippet,
+           hits.score
+    FROM (
+        SELECT m.id, m.conversation_id, m.sender_id, m.created_at, m.content,
+               -ts_rank(to_tsvector('simple', m.content), to_tsquery('simple', :query)) AS score
+        FROM message m
+        JOIN conversation c ON c.id = m.conversation_id
+        WHERE to_tsvector('simple', m.content) @@ to_tsquery('simple', :query)
+          AND (c.participant1_id = :user_id OR c.participant2_id = :user_id)
+    ) AS hits
+    WHERE CAST(:after_score AS DOUBLE PRECISION) IS NULL
+       OR hits.score > :after_score OR (hits.score = :after_score AND hits.id > :after_id)
+    ORDER BY hits.score, hits.id
+    LIMIT :limit
+""")
+
+
+def ensure_message_search_index(connection: Connection, dialect: str) -> None:
+    """Crée l'index plein texte ; pour SQLite, l'alimente avec les messages existants."""
+    if dialect == "postgresql":
+        for statement in POSTGRES_SETUP:
+            connection.execute(text(statement))
+        return
+    existing = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'"
+    )).scalar()
+    if existing is not None and "content_rowid" not in existing:
+        # Ancienne table (message_id UNINDEXED) : triggers et index recréés
+        for trigger in _SQLITE_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("DROP TABLE message_fts"))
+        existing = None
+    for statement in SQLITE_SETUP:
+        connection.execute(text(statement))
+    if existing is None:
+        rebuild_message_search_index(connection)
+
+
+def rebuild_message_search_index(connection: Connection) -> None:
+    """SQLite : reconstruit l'index depuis ``message`` (après un VACUUM)."""
+    connection.execute(text("INSERT INTO message_fts (message_fts) VALUES ('rebuild')"))
+
+
+def search_terms(query: str) -> list[str]:
+    return _WORD_RE.findall(query.lower())
+
+
+def _match_query(terms: list[str], dialect: str) -> str:
+    if dialect == "postgresql":
+        quoted = [f"'{term}'" for term in terms]
+        quoted[-1] += ":*"
+        return " & ".join(quoted)
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def encode_cursor(score: float, message_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}|{message_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    """Lève ValueError si le curseur est invalide."""
+    try:
+        score, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(score), message_id
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("invalid_cursor") from exc
+
+
+@dataclass(frozen=True, slots=True)
+class MessageHit:
+    id: str
+    conversation_id: str
+    sender_id: str
+    snippet: str
+    created_at: datetime
+    score: float
+
+
+def search_messages(
+    session: Session,
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> tuple[list[MessageHit], Optional[str]]:
+    """Page de résultats + curseur de la suivante (``None`` en fin de liste)."""
+    terms = search_terms(query)
+    if not terms:
+        return [], None
+    after_score, after_id = decode_cursor(cursor) if cursor else (None, None)
+    dialect = session.get_bind().dialect.name
+    statement = _POSTGRES_SEARCH if dialect == "postgresql" else _SQLITE_SEARCH
+    rows = session.execute(statement, {
+        "query": _match_query(terms, dialect),
+        "user_id": user_id,
+        "after_score": after_score,
+        "after_id": after_id,
+        "limit": limit + 1,
+    }).all()
+
+    hits = []
+    for row in rows[:limit]:
+        created_at = row.created_at
+        if isinstance(created_at, str):  # SQLite via text() : pas de conversion de type
+            created_at = datetime.fromisoformat(created_at)
+        hits.append(MessageHit(row.id, row.conversation_id, row.sender_id, row.snippet, created_at, row.score))
+    next_cursor = encode_cursor(hits[-1].score, hits[-1].id) if len(rows) > limit else None
+    return hits, next_cursor
@@ -0,0 +1,232 @@
+"""
+Outbox : effets de bord différés (notifications, compteurs, temps réel).
+
+Les routes enregistrent l'événement dans leur propre transaction
+(``enqueue``) : il est commité avec le like / commentaire / abonnement, ou
+pas du tout, et la requête répond sans attendre ses effets. Des threads
+workers lisent la table par lots, regroupent les événements par type et
+appellent le handler du type (``register_handler``) ; les écritures du
+handler sont commitées avec la suppression des événements traités, dans une
+seule transaction. Les publications temps réel renvoyées par les handlers
+partent après ce commit.
+
+PostgreSQL : lots réservés par ``FOR UPDATE SKIP LOCKED`` (plusieurs
+workers, plusieurs process). SQLite : un seul écrivain, les lots d'un même
+process sont sérialisés.
+
+Un lot en échec est rejoué événement par événement ; un événement en échec
+est retenté avec backoff, puis conservé après ``OUTBOX_MAX_ATTEMPTS``
+tentatives (``last_error``) pour inspection.
+"""
+import json
+import os
+import threading
+from datetime import timedelta
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import event, func
+from sqlmodel import Session, select
+
+from ..db import get_engine
+from ..models import OutboxEvent, utcnow
+from ..utils.metrics import register_queue
+from . import realtime
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "1"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Attente max entre deux lectures quand aucun commit n'a réveillé les workers
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "5"))
+
+# (destinataires, type, données) : publié via services.realtime après commit
+RealtimeEvent = tuple[Iterable[str], str, Any]
+# Reçoit les payloads d'un lot (même type, ordre d'enregistrement) ; ne committe pas
+Handler = Callable[[Session, list[dict]], Optional[list[RealtimeEvent]]]
+
+_handlers: dict[str, Handler] = {}
+_sqlite_lock = threading.Lock()
+
+
+def register_handler(kind: str, handler: Handler) -> None:
+    _handlers[kind] = handler
+
+
+def enqueue(session: Session, kind: str, payload: dict) -> None:
+    """Ajoute l'événement à la transaction en cours ; l'appelant committe."""
+    session.add(OutboxEvent(kind=kind, payload=json.dumps(payload)))
+    if not session.info.get("outbox_wake"):
+        session.info["outbox_wake"] = True
+        event.listen(session, "after_commit", _wake_after_commit, once=True)
+
+
+def _wake_after_commit(session: Session) -> None:
+    session.info.pop("outbox_wake", None)
+    if _dispatcher is not None:
+        _dispatcher.wake()
+
+
+def _run_handlers(session: Session, events: list[OutboxEvent]) -> list[RealtimeEvent]:
+    by_kind: dict[str, list[dict]] = {}
+    for outbox_event in events:
+        by_kind.setdefault(outbox_event.kind, []).append(json.loads(outbox_event.payload))
+    published: list[RealtimeEvent] = []
+    for kind, payloads in by_kind.items():
+        handler = _handlers.get(kind)
+        if handler is None:
+            raise LookupError(f"outbox: aucun handler pour {kind!r}")
+        published.extend(handler(session, payloads) or ())
+    for outbox_event in events:
+        session.delete(outbox_event)
+    return published
+
+
+def _claim(session: Session, limit: int, event_id: Optional[str] = None) -> list[OutboxEvent]:
+    statement = select(OutboxEvent)
+    if event_id is not None:
+        statement = statement.where(OutboxEvent.id == event_id)
+    else:
+        statement = statement.where(
+            OutboxEvent.available_at <= utcnow(),
+            OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS,
+        )
+    return list(session.exec(
+        statement
+        .order_by(OutboxEvent.created_at, OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all())
+
+
+def _record_failure(session: Session, event_id: str, exc: Exception) -> None:
+    outbox_event = session.get(OutboxEvent, event_id)
+    if outbox_event is None:
+        return
+    outbox_event.attempts += 1
+    outbox_event.last_error = f"{type(exc).__name__}: {exc}"[:500]
+    outbox_event.available_at = utcnow() + timedelta(
+        seconds=OUTBOX_RETRY_SECONDS * 2 ** (outbox_event.attempts - 1)
+    )
+    session.add(outbox_event)
+    session.commit()
+    if outbox_event.attempts >= OUTBOX_MAX_ATTEMPTS:
+        print(f"⚠️  outbox: {outbox_event.kind} {event_id} abandonné ({outbox_event.last_error})")
+
+
+def _process(session: Session, limit: int) -> tuple[int, list[RealtimeEvent]]:
+    events = _claim(session, limit)
+    if not events:
+        return 0, []
+    event_ids = [e.id for e in events]
+    try:
+        published = _run_handlers(session, events)
+        session.commit()
+        return len(events), published
+    except Exception:
+        session.rollback()
+
+    # Lot en échec : on isole le ou les événements fautifs
+    published = []
+    for event_id in event_ids:
+        claimed = _claim(session, 1, event_id)
+        if not claimed:
+            continue
+        try:
+            batch = _run_handlers(session, claimed)
+            session.commit()
+            published.extend(batch)
+        except Exception as exc:
+            session.rollback()
+            _record_failure(session, event_id, exc)
+    return len(event_ids), published
+
+
+def process_batch(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Traite un lot d'événements disponibles ; renvoie le nombre d'événements lus."""
+    engine = get_engine()
+    lock = _sqlite_lock if engine.dialect.name == "sqlite" else None
+    with Session(engine, expire_on_commit=False) as session:
+        if lock is not None:
+            with lock:
+                count, published = _process(session, limit)
+        else:
+            count, published = _process(session, limit)
+    for user_ids, event_type, data in published:
+        realtime.publish(user_ids, event_type, data)
+    return count
+
+
+def drain_outbox() -> int:
+    """Traite tout ce qui est disponible, dans le thread appelant (tests, scripts)."""
+    total = 0
+    while count := process_batch():
+        total += count
+    return total
+
+
+def pending_events() -> int:
+    with Session(get_engine()) as session:
+        return session.exec(
+            select(func.count(OutboxEvent.id)).where(OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS)
+        ).one()
+
+
+class OutboxDispatcher:
+    """Threads workers : réveillés après chaque commit qui enregistre un événement."""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS) -> None:
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                count = process_batch()
+            except Exception as exc:
+                print(f"⚠️  outbox: lot non traité ({exc})")
+                count = 0
+            if count < OUTBOX_BATCH_SIZE:
+                self._wake.wait(OUTBOX_POLL_SECONDS)
+
+
+_dispatcher: Optional[OutboxDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_outbox() -> None:
+    """Démarre les workers (lifespan) ; ``OUTBOX_WORKERS=0`` : aucun, voir ``drain_outbox``."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None and OUTBOX_WORKERS > 0:
+            _dispatcher = OutboxDispatcher()
+            _dispatcher.start()
+
+
+def shutdown_outbox() -> None:
+    """Arrête les workers ; les événements restants sont repris au prochain démarrage."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+        _dispatcher = None
+
+
+register_queue("outbox", pending_events)
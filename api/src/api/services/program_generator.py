@@ -11,13 +11,18 @@ Principes clés:
 - Composés en premier, isolations en dernier
 - Schémas de reps différenciés par rôle d'exercice
 """
+import hashlib
 import random
 import math
-from typing import Optional, Literal, Tuple
-from collections import defaultdict
-from sqlmodel import Session, select
+from dataclasses import astuple, dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping, Optional, Literal, Tuple
+from collections import Counter, defaultdict
+from sqlmodel import Session
 
-from ..models import Exercise
+from ..utils.metrics import record_cache, register_cache
+from .exercise_index import ExerciseEntry, ExerciseIndex, get_exercise_index
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -159,6 +164,9 @@ SETS_PER_ROLE = {
     'Advanced':     {'compound': 4, 'accessory': 4, 'isolation': 3},
 }
 
+# Facteur de volume de la semaine de deload (séances raccourcies, pas recomplétées)
+DELOAD_VOLUME_FACTOR = 0.50
+
 # Blessures → mots-clés à éviter dans les noms d'exercices
 INJURY_AVOID = {
     'Dos':      ['deadlift', 'good morning', 'barbell row', 'heavy'],
@@ -280,7 +288,7 @@ def _week_volume_factor(week: int, total_weeks: int) -> float:
     training_weeks = total_weeks - (1 if has_deload else 0)
 
     if has_deload and week == total_weeks:
-        return 0.50
+        return DELOAD_VOLUME_FACTOR
 
     if training_weeks <= 1:
         return 1.0
@@ -365,11 +373,135 @@ def determine_split(frequency: int, preferred_method: Optional[str] = None) -> l
     return defaults.get(freq, ['Full Body'] * freq)
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# PROFIL NORMALISÉ & SQUELETTE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@dataclass(frozen=True, slots=True)
+class ProfileKey:
+    """Tout ce qui influe sur la génération, sous forme canonique et hashable.
+
+    Deux profils de même clé donnent le même squelette et, pour une même
+    graine, le même programme.
+    """
+
+    frequency: int
+    duration_weeks: int
+    level: str
+    goal: str
+    method: str
+    session_minutes: int
+    exercises_per_session: int
+    equipment: tuple[str, ...]
+    injuries: tuple[str, ...]           # filtre du catalogue (texte libre + déclarées)
+    declared_injuries: tuple[str, ...]  # évitées aussi en dernier recours
+
+    @property
+    def token(self) -> str:
+        return repr(astuple(self))
+
+
+def profile_key(profile: dict) -> ProfileKey:
+    level = get_difficulty_level(profile.get('niveau', 'Intermédiaire'))
+    frequency = profile.get('frequency', 3)
+    # Garde-fous selon le niveau
+    if level == 'Beginner' and frequency > 4:
+        frequency = 4
+    elif level == 'Advanced' and frequency < 3:
+        frequency = 3
+    equipment = profile.get('equipment_available') or []
+    return ProfileKey(
+        frequency=frequency,
+        duration_weeks=profile.get('duration_weeks', 4),
+        level=level,
+        goal=get_goal_type(profile.get('objective', profile.get('objectif', 'Hypertrophie'))),
+        method=profile.get('methode_preferee') or '',
+        session_minutes=_get_target_minutes(profile.get('duree_seance', '45')),
+        exercises_per_session=profile.get('exercises_per_session', 0) or 0,
+        equipment=tuple(sorted({eq.strip().lower() for eq in equipment if eq and eq.strip()})),
+        injuries=tuple(sorted(set(_injury_zones(profile, include_free_text=True)))),
+        declared_injuries=tuple(sorted(set(_injury_zones(profile)))),
+    )
+
+
+def derive_seed(user_id: Optional[str], key: ProfileKey, variant: Optional[int] = None) -> int:
+    """Graine stable : même utilisateur + même profil + même variante → même programme."""
+    raw = f"{user_id or ''}|{key.token}|{'' if variant is None else variant}"
+    return int.from_bytes(hashlib.sha256(raw.encode()).digest()[:8], 'big')
+
+
+@dataclass(frozen=True, slots=True)
+class WeekPlan:
+    number: int
+    label: str
+    volume_factor: float
+    rpe_offset: float
+
+
+@dataclass(frozen=True, slots=True)
+class ProgramSkeleton:
+    """Partie structurelle d'un programme, indépendante du catalogue et du hasard."""
+
+    split: tuple[str, ...]
+    session_labels: tuple[str, ...]   # suffixe A/B si le type revient dans la semaine
+    weekly_volume: Mapping[str, int]
+    weeks: tuple[WeekPlan, ...]
+
+
+_MAX_SKELETONS = 512
+_skeletons: dict[tuple[int, int, str, str, str], ProgramSkeleton] = {}
+_skeletons_lock = Lock()
+
+register_cache("program_skeleton", lambda: len(_skeletons))
+
+
+def _build_skeleton(key: ProfileKey) -> ProgramSkeleton:
+    split = determine_split(key.frequency, key.method or None)
+    labels = []
+    for day_index, session_type in enumerate(split):
+        label = session_type
+        if split.count(session_type) > 1:
+            occurrence = split[:day_index + 1].count(session_type)
+            label = f"{session_type} {'ABCDEFG'[occurrence - 1]}"
+        labels.append(label)
+
+    has_deload = key.duration_weeks >= 5
+    weeks = tuple(
+        WeekPlan(
+            number=week,
+            label="Deload" if has_deload and week == key.duration_weeks else f"Semaine {week}",
+            volume_factor=_week_volume_factor(week, key.duration_weeks),
+            rpe_offset=_week_rpe_offset(week, key.duration_weeks),
+        )
+        for week in range(1, key.duration_weeks + 1)
+    )
+    return ProgramSkeleton(
+        split=tuple(split),
+        session_labels=tuple(labels),
+        weekly_volume=MappingProxyType(_plan_weekly_volume(key.level, key.goal)),
+        weeks=weeks,
+    )
+
+
+def get_program_skeleton(key: ProfileKey) -> ProgramSkeleton:
+    """Squelette mis en cache par les seuls champs qui le déterminent."""
+    cache_key = (key.frequency, key.duration_weeks, key.level, key.goal, key.method)
+    skeleton = _skeletons.get(cache_key)
+    record_cache("program_skeleton", skeleton is not None)
+    if skeleton is None:
+        skeleton = _build_skeleton(key)
+        with _skeletons_lock:
+            if len(_skeletons) >= _MAX_SKELETONS:
+                _skeletons.pop(next(iter(_skeletons)))
+            _skeletons[cache_key] = skeleton
+    return skeleton
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # SÉLECTION D'EXERCICES
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def _classify_role(exercise: Exercise) -> str:
+def _classify_role(exercise: ExerciseEntry) -> str:
     """Classifie un exercice : compound / accessory / isolation."""
     name = (exercise.name or '').lower()
 
@@ -395,78 +527,236 @@ def _classify_role(exercise: Exercise) -> str:
     return 'accessory'
 
 
+def _injury_zones(profile: dict, include_free_text: bool = False) -> list[str]:
+    """Zones de INJURY_AVOID déclarées par le profil."""
+    zones: list[str] = []
+    if include_free_text:
+        injuries = profile.get('injuries', '') or ''
+        zones.extend(zone for zone in INJURY_AVOID if zone in injuries)
+    if profile.get('has_blessure'):
+        for field in ('blessure_first', 'blessure_second'):
+            b = profile.get(field, '')
+            if b and b in INJURY_AVOID:
+                zones.append(b)
+    return zones
+
+
+def _equipment_matches(ex_eq: str, ex_name: str, equipment_available: tuple[str, ...],
+                       match_name: bool) -> bool:
+    """Équipement de l'exercice compatible avec celui de l'utilisateur (FR/EN)."""
+    if not ex_eq or 'bodyweight' in ex_eq:
+        return True
+    for eq in equipment_available:
+        e = eq.lower()
+        if (e in ex_eq or (match_name and e in ex_name) or
+                ('haltères' in e and 'dumbbell' in ex_eq) or
+                ('barre' in e and 'barbell' in ex_eq) or
+                ('machine' in e and 'machine' in ex_eq) or
+                ('câble' in e and 'cable' in ex_eq)):
+            return True
+    return False
+
+
+def _first_ids(mask: int, limit: int) -> list[int]:
+    """Positions des ``limit`` premiers bits à 1 (ordre du catalogue)."""
+    ids: list[int] = []
+    while mask and len(ids) < limit:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+
+# Rôles acceptés en priorité pour un slot de blueprint (le reste sert de repli)
+_ROLE_ACCEPTS = {
+    'compound': ('compound',),
+    'accessory': ('accessory', 'compound'),
+    'isolation': ('isolation',),
+}
+
+# Combinaisons d'équipement mémorisées par catalogue compilé
+_MAX_EQUIPMENT_MASKS = 256
+
+
+class CompiledCatalogue:
+    """Catalogue pré-classé pour le générateur, construit une fois par version.
+
+    Chaque exercice a une position fixe ; les ensembles (muscle cible, rôle,
+    blessure, équipement) sont des entiers utilisés comme bitsets, si bien
+    qu'un slot de blueprint se résout par quelques ``&`` au lieu d'un parcours
+    du catalogue. Le bit de poids faible est le premier exercice : l'ordre des
+    pools reste celui du catalogue.
+    """
+
+    def __init__(self, source: ExerciseIndex) -> None:
+        self.source = source
+        self.exercises = source.exercises
+        self.all_mask = (1 << len(self.exercises)) - 1
+        self._names = tuple((ex.name or '').lower() for ex in self.exercises)
+        self._muscles = tuple((ex.muscle_group or '').lower() for ex in self.exercises)
+        self._equipment = tuple((ex.equipment or '').lower() for ex in self.exercises)
+
+        role_masks = {'compound': 0, 'accessory': 0, 'isolation': 0}
+        key_masks: dict[str, int] = {}
+        bodyweight = 0
+        for i, ex in enumerate(self.exercises):
+            bit = 1 << i
+            role_masks[_classify_role(ex)] |= bit
+            key = ex.slug or ex.name
+            key_masks[key] = key_masks.get(key, 0) | bit
+            if 'bodyweight' in self._equipment[i]:
+                bodyweight |= bit
+        self.bodyweight_mask = bodyweight
+        self._role_pools = {
+            role: sum(role_masks[r] for r in accepted) for role, accepted in _ROLE_ACCEPTS.items()
+        }
+        self._key_masks = key_masks
+        self.injury_masks = {zone: self._mask(lambda i, kws=kws: any(kw in self._names[i] for kw in kws))
+                             for zone, kws in INJURY_AVOID.items()}
+        self._muscle_masks = {target: self._compile_muscle(target) for target in VOLUME_LANDMARKS}
+        self._equipment_masks: dict[tuple[tuple[str, ...], bool], int] = {}
+
+    def _mask(self, predicate) -> int:
+        mask = 0
+        for i in range(len(self.exercises)):
+            if predicate(i):
+                mask |= 1 << i
+        return mask
+
+    def _compile_muscle(self, target: str) -> int:
+        return self._mask(lambda i: _muscle_matches(self._muscles[i], target, self.exercises[i].name or ''))
+
+    def muscle_mask(self, target: str) -> int:
+        mask = self._muscle_masks.get(target)
+        if mask is None:
+            mask = self._muscle_masks[target] = self._compile_muscle(target)
+        return mask
+
+    def role_pool(self, role: str) -> int:
+        return self._role_pools.get(role, 0)
+
+    def key_mask(self, exercise_id: int) -> int:
+        """Exercices partageant la clé « déjà utilisé » (slug, sinon nom)."""
+        ex = self.exercises[exercise_id]
+        return self._key_masks[ex.slug or ex.name]
+
+    def avoid_mask(self, zones) -> int:
+        mask = 0
+        for zone in zones:
+            mask |= self.injury_masks.get(zone, 0)
+        return mask
+
+    def equipment_mask(self, equipment_available, match_name: bool = False) -> int:
+        equipment = tuple(equipment_available or ())
+        if not equipment:
+            return self.all_mask
+        cache_key = (equipment, match_name)
+        mask = self._equipment_masks.get(cache_key)
+        if mask is None:
+            if len(self._equipment_masks) >= _MAX_EQUIPMENT_MASKS:
+                self._equipment_masks.clear()
+            mask = self._mask(lambda i: _equipment_matches(
+                self._equipment[i], self._names[i], equipment, match_name))
+            self._equipment_masks[cache_key] = mask
+        return mask
+
+    def for_profile(self, key: 'ProfileKey') -> 'ProfileCandidates':
+        """Exercices retenus pour un profil (équipement + blessures).
+
+        Repli : si moins de 20 exercices passent, les exercices au poids du
+        corps sont ajoutés après les autres.
+        """
+        primary = (self.equipment_mask(key.equipment, match_name=True)
+                   & ~self.avoid_mask(key.injuries)
+                   & self.all_mask)
+        extra = 0
+        if primary.bit_count() < 20:
+            extra = self.bodyweight_mask & ~primary
+        return ProfileCandidates(
+            catalogue=self,
+            primary=primary,
+            extra=extra,
+            equipment=self.equipment_mask(key.equipment),
+            avoid=self.avoid_mask(key.declared_injuries),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileCandidates:
+    """Vue d'un catalogue compilé pour un profil ; ``primary`` passe avant ``extra``."""
+
+    catalogue: CompiledCatalogue
+    primary: int
+    extra: int
+    equipment: int
+    avoid: int
+
+    def __len__(self) -> int:
+        return (self.primary | self.extra).bit_count()
+
+    @property
+    def exercises(self) -> list[ExerciseEntry]:
+        entries = self.catalogue.exercises
+        return [entries[i] for i in self.first(-1, limit=len(entries))]
+
+    def first(self, mask: int, limit: int = 5) -> list[int]:
+        ids = _first_ids(mask & self.primary, limit)
+        if len(ids) < limit:
+            ids += _first_ids(mask & self.extra, limit - len(ids))
+        return ids
+
+
+_compiled: Optional[CompiledCatalogue] = None
+_compiled_lock = Lock()
+
+
+def get_compiled_catalogue(session: Session) -> CompiledCatalogue:
+    """Catalogue compilé aligné sur l'index d'exercices courant."""
+    global _compiled
+    source = get_exercise_index(session)
+    current = _compiled
+    if current is not None and current.source is source:
+        return current
+    with _compiled_lock:
+        current = _compiled
+        if current is None or current.source is not source:
+            current = CompiledCatalogue(source)
+            _compiled = current
+        return current
+
+
 def _select_exercise(
-    exercises: list[Exercise],
+    candidates: ProfileCandidates,
     muscle_group: str,
     role: str,
-    used: set[str],
-    equipment_available: list[str],
-    avoid_keywords: list[str],
-) -> Optional[Exercise]:
-    """Sélectionne UN exercice en respectant muscle, rôle, équipement, blessures."""
+    used: int,
+    rng: random.Random,
+) -> Optional[int]:
+    """Sélectionne UN exercice en respectant muscle, rôle, équipement, blessures.
+
+    ``used`` est le bitset des exercices déjà choisis ; renvoie une position
+    dans le catalogue compilé.
+    """
     target = _normalize_muscle(muscle_group)
 
     # 'arms' → alterner biceps/triceps
     if target == 'arms':
-        target = random.choice(['biceps', 'triceps'])
-
-    best: list[Exercise] = []
-    fallback: list[Exercise] = []
-
-    for ex in exercises:
-        ex_name = (ex.name or '').lower()
-        ex_muscle = (ex.muscle_group or '').lower()
-
-        # Muscle match
-        if not _muscle_matches(ex_muscle, target, ex.name or ''):
-            continue
-
-        # Already used
-        if (ex.slug or ex.name) in used:
-            continue
-
-        # Injury avoidance
-        if any(kw.lower() in ex_name for kw in avoid_keywords):
-            continue
-
-        # Equipment filter
-        if equipment_available:
-            ex_eq = (ex.equipment or '').lower()
-            if ex_eq and 'bodyweight' not in ex_eq:
-                if not any(eq.lower() in ex_eq or
-                           ('haltères' in eq.lower() and 'dumbbell' in ex_eq) or
-                           ('barre' in eq.lower() and 'barbell' in ex_eq) or
-                           ('machine' in eq.lower() and 'machine' in ex_eq) or
-                           ('câble' in eq.lower() and 'cable' in ex_eq)
-                           for eq in equipment_available):
-                    continue
-
-        # Classify and prioritize
-        ex_role = _classify_role(ex)
-        if role == 'compound' and ex_role == 'compound':
-            best.append(ex)
-        elif role == 'compound' and ex_role == 'accessory':
-            fallback.append(ex)
-        elif role == 'accessory' and ex_role in ('accessory', 'compound'):
-            best.append(ex)
-        elif role == 'isolation' and ex_role == 'isolation':
-            best.append(ex)
-        elif role == 'isolation' and ex_role == 'accessory':
-            fallback.append(ex)
-        else:
-            fallback.append(ex)
-
-    pool = best or fallback
-    if not pool:
-        # Dernier recours : n'importe quel exercice pour ce muscle
-        pool = [ex for ex in exercises
-                if _muscle_matches((ex.muscle_group or '').lower(), target, ex.name or '')
-                and (ex.slug or ex.name) not in used]
+        target = rng.choice(['biceps', 'triceps'])
+
+    catalogue = candidates.catalogue
+    matching = catalogue.muscle_mask(target) & ~used
+    allowed = matching & candidates.equipment & ~candidates.avoid
+    best = catalogue.role_pool(role)
+
+    pool = (candidates.first(allowed & best)
+            or candidates.first(allowed & ~best)
+            # Dernier recours : n'importe quel exercice pour ce muscle
+            or candidates.first(matching))
     if not pool:
         return None
 
     # Variété : pick parmi les 5 meilleurs
-    return random.choice(pool[:min(5, len(pool))])
+    return rng.choice(pool)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -481,18 +771,25 @@ def _get_blueprint(session_type: str) -> list[tuple[str, str]]:
 
 
 def generate_session_exercises(
-    all_exercises: list[Exercise],
+    candidates: ProfileCandidates,
     session_type: str,
     profile: dict,
     week_number: int,
     session_index: int,
     volume_factor: float = 1.0,
     rpe_offset: float = 0.0,
+    rng: Optional[random.Random] = None,
+    week_volume: Optional[Counter] = None,
 ) -> Tuple[list[dict], int]:
     """Génère les exercices d'une séance avec volume et intensité périodisés.
 
     Strategy: select exercises first (respect exercises_per_session),
     then adjust sets to fit within target duration.
+
+    ``week_volume`` (séries par muscle déjà programmées dans la semaine) est
+    mis à jour : aucun muscle ne dépasse son MRV, les réductions pour tenir
+    la durée prennent d'abord sur les muscles les plus au-dessus de leur MV,
+    les ajouts vont d'abord aux muscles sous leur MV.
     """
 
     goal = get_goal_type(profile.get('objective', profile.get('objectif', '')))
@@ -502,16 +799,8 @@ def generate_session_exercises(
     schemes = REP_SCHEMES.get(goal, REP_SCHEMES['prise_de_masse'])
     base_sets = SETS_PER_ROLE.get(level, SETS_PER_ROLE['Intermediate'])
 
-    # Injury keywords
-    avoid_kw: list[str] = []
-    if profile.get('has_blessure'):
-        for field in ('blessure_first', 'blessure_second'):
-            b = profile.get(field, '')
-            if b and b in INJURY_AVOID:
-                avoid_kw.extend(INJURY_AVOID[b])
-
-    equipment = profile.get('equipment_available', [])
     blueprint = _get_blueprint(session_type)
+    rng = rng or random.Random()
 
     # Start with user-specified exercise count, full blueprint available for expansion
     full_blueprint = list(blueprint)
@@ -520,20 +809,45 @@ def generate_session_exercises(
     else:
         initial_count = len(blueprint)
 
+    week_volume = week_volume if week_volume is not None else Counter()
+
+    def _room(muscle: str) -> float:
+        """Séries encore possibles cette semaine avant le MRV."""
+        landmarks = VOLUME_LANDMARKS.get(muscle)
+        return math.inf if landmarks is None else landmarks[4] - week_volume[muscle]
+
+    def _surplus(g: dict) -> float:
+        """Séries de la semaine au-dessus du MV (négatif : sous le MV)."""
+        landmarks = VOLUME_LANDMARKS.get(g['muscle'])
+        return math.inf if landmarks is None else week_volume[g['muscle']] - landmarks[0]
+
+    def _resize(g: dict, series: int) -> float:
+        """Change le nombre de séries ; renvoie la variation de durée."""
+        old_min = g['estimated_minutes']
+        week_volume[g['muscle']] += series - g['series']
+        g['series'] = series
+        g['estimated_minutes'] = _estimate_minutes(series, g['role'])
+        return g['estimated_minutes'] - old_min
+
     # ── Helper: select an exercise for a blueprint slot ──
     def _pick(muscle_group: str, role: str) -> Optional[dict]:
-        ex = _select_exercise(
-            all_exercises, muscle_group, role, used, equipment, avoid_kw,
-        )
-        if not ex:
+        nonlocal used
+        ex_id = _select_exercise(candidates, muscle_group, role, used, rng)
+        if ex_id is None:
             return None
-        used.add(ex.slug or ex.name)
+        used |= candidates.catalogue.key_mask(ex_id)
+        ex = candidates.catalogue.exercises[ex_id]
+        muscle = _normalize_muscle(ex.muscle_group or '')
         scheme = schemes[role]
         role_sets = base_sets[role]
-        adjusted_sets = max(2, round(role_sets * volume_factor))
+        adjusted_sets = min(max(2, round(role_sets * volume_factor)), _room(muscle))
+        if adjusted_sets < 2:
+            return None  # muscle déjà à son MRV cette semaine
         adjusted_rpe = round(min(10, max(5, scheme['rpe'] + rpe_offset)), 1)
+        week_volume[muscle] += adjusted_sets
         return {
             'exercise': ex,
+            'muscle': muscle,
             'series': adjusted_sets,
             'reps': scheme['reps'],
             'rpe': adjusted_rpe,
@@ -543,7 +857,7 @@ def generate_session_exercises(
 
     # ── Phase 1: select initial exercises ──
     generated: list[dict] = []
-    used: set[str] = set()
+    used = 0
 
     for muscle_group, role in blueprint[:initial_count]:
         item = _pick(muscle_group, role)
@@ -561,50 +875,43 @@ def generate_session_exercises(
     tolerance = 3  # acceptable deviation in minutes
     max_sets_cap = {'compound': 6, 'accessory': 5, 'isolation': 4}
 
-    # 3a. If over budget → reduce sets (isolations first, then accessories, compounds)
+    # 3a. If over budget → reduce sets (isolations first, then accessories, compounds),
+    # sur le muscle le plus au-dessus de son MV (à égalité : le dernier exercice)
     reduction_order = ['isolation', 'accessory', 'compound']
     while total > target_minutes + tolerance:
         reduced = False
         for target_role in reduction_order:
-            for g in reversed(generated):
-                if g['role'] == target_role and g['series'] > 2:
-                    old_min = g['estimated_minutes']
-                    g['series'] -= 1
-                    g['estimated_minutes'] = _estimate_minutes(g['series'], g['role'])
-                    total -= (old_min - g['estimated_minutes'])
-                    reduced = True
-                    break
-            if reduced:
+            reducible = [g for g in generated if g['role'] == target_role and g['series'] > 2]
+            if reducible:
+                g = max(reversed(reducible), key=_surplus)
+                total += _resize(g, g['series'] - 1)
+                reduced = True
                 break
         if not reduced:
             # All at minimum — remove last exercise
-            total -= generated[-1]['estimated_minutes']
-            generated.pop()
+            removed = generated.pop()
+            total -= removed['estimated_minutes']
+            week_volume[removed['muscle']] -= removed['series']
             if not generated:
                 break
 
     # 3b. If under budget → first increase sets, then add exercises from blueprint
+    # (sauf en deload : la séance doit rester plus courte)
     increase_order = ['compound', 'accessory', 'isolation']
-    while total < target_minutes - tolerance and generated:
+    is_deload = volume_factor <= DELOAD_VOLUME_FACTOR
+    while total < target_minutes - tolerance and generated and not is_deload:
         increased = False
 
-        # Try increasing sets on existing exercises
-        for target_role in increase_order:
-            for g in generated:
-                cap = max_sets_cap.get(target_role, 4)
-                if g['role'] == target_role and g['series'] < cap:
-                    old_min = g['estimated_minutes']
-                    g['series'] += 1
-                    g['estimated_minutes'] = _estimate_minutes(g['series'], g['role'])
-                    gained = g['estimated_minutes'] - old_min
-                    if total + gained <= target_minutes + tolerance:
-                        total += gained
-                        increased = True
-                        break
-                    else:
-                        g['series'] -= 1
-                        g['estimated_minutes'] = old_min
-            if increased:
+        # Try increasing sets on existing exercises : muscles sous leur MV d'abord,
+        # puis par rôle (composés, accessoires, isolations)
+        growable = [g for g in generated
+                    if g['series'] < max_sets_cap.get(g['role'], 4) and _room(g['muscle']) >= 1]
+        growable.sort(key=lambda g: (_surplus(g) >= 0, increase_order.index(g['role']), min(_surplus(g), 0)))
+        for g in growable:
+            gained = _estimate_minutes(g['series'] + 1, g['role']) - g['estimated_minutes']
+            if total + gained <= target_minutes + tolerance:
+                total += _resize(g, g['series'] + 1)
+                increased = True
                 break
 
         if not increased:
@@ -620,6 +927,30 @@ def generate_session_exercises(
             if not added:
                 break
 
+    # 3c. Rééquilibrage à durée constante : une série passe d'un muscle au-dessus
+    # de son MV à un muscle en dessous
+    while generated and not is_deload:
+        short = [g for g in generated
+                 if _surplus(g) < 0 and g['series'] < max_sets_cap.get(g['role'], 4) and _room(g['muscle']) >= 1]
+        spare = [g for g in generated if _surplus(g) > 0 and g['series'] > 2]
+        moved = False
+        for g in sorted(short, key=_surplus):
+            gained = _estimate_minutes(g['series'] + 1, g['role']) - g['estimated_minutes']
+            for h in sorted(spare, key=_surplus, reverse=True):
+                saved = h['estimated_minutes'] - _estimate_minutes(h['series'] - 1, h['role'])
+                new_total = total + gained - saved
+                # Reste dans la tolérance (ou ne s'en éloigne pas si la séance était déjà courte)
+                fits = (new_total <= target_minutes + tolerance
+                        and new_total >= min(total, target_minutes - tolerance))
+                if h['muscle'] != g['muscle'] and fits:
+                    total += _resize(h, h['series'] - 1) + _resize(g, g['series'] + 1)
+                    moved = True
+                    break
+            if moved:
+                break
+        if not moved:
+            break
+
     return generated, round(total)
 
 
@@ -631,59 +962,56 @@ def generate_program(
     session: Session,
     profile: dict,
     title: str = "Programme personnalisé",
+    seed: Optional[int] = None,
 ) -> dict:
-    """Génère un programme complet avec mésocycle périodisé."""
+    """Génère un programme complet avec mésocycle périodisé.
 
-    frequency = profile.get('frequency', 3)
-    duration_weeks = profile.get('duration_weeks', 4)
-    preferred_method = profile.get('methode_preferee')
+    Déterministe : le tirage des exercices utilise une graine dérivée de
+    l'utilisateur, du profil normalisé et de ``seed`` (variante demandée).
+    """
+    return build_program(get_compiled_catalogue(session), profile, title, seed)
 
-    # Niveau et objectif
-    level_str = profile.get('niveau', 'Intermédiaire')
-    level = get_difficulty_level(level_str)
-    goal = get_goal_type(profile.get('objective', profile.get('objectif', 'Hypertrophie')))
 
-    # Garde-fous selon le niveau
-    if level == 'Beginner' and frequency > 4:
-        frequency = 4
-    elif level == 'Advanced' and frequency < 3:
-        frequency = 3
+def build_program(
+    catalogue: CompiledCatalogue,
+    profile: dict,
+    title: str = "Programme personnalisé",
+    seed: Optional[int] = None,
+) -> dict:
+    """Comme ``generate_program`` mais sans session : utilisable dans un process worker."""
+
+    key = profile_key(profile)
+    level_str = profile.get('niveau', 'Intermédiaire')
 
     # Préférence genrée (bas du corps chez les femmes si pas de priorité)
     if profile.get('user_gender') == 'female' and not profile.get('priorite'):
         profile['priorite'] = 'bas'
 
-    # Split
-    split = determine_split(frequency, preferred_method)
-
-    # Volume hebdomadaire cible
-    weekly_volume = _plan_weekly_volume(level, goal)
+    # Split, volume hebdomadaire cible et progression par semaine
+    skeleton = get_program_skeleton(key)
+    rng = random.Random(derive_seed(profile.get('user_id'), key, seed))
 
     # Titre personnalisé
     if title == "Programme personnalisé":
         obj = profile.get('objective', 'Fitness')
-        title = f"Programme {obj} — {level_str} ({frequency}x/sem)"
+        title = f"Programme {obj} — {level_str} ({key.frequency}x/sem)"
 
     # Exercices
-    all_exercises = list(session.exec(select(Exercise)).all())
-    filtered = _filter_exercises_by_profile(all_exercises, profile)
+    candidates = catalogue.for_profile(key)
 
-    has_deload = duration_weeks >= 5
     all_sessions: list[dict] = []
     global_index = 0
 
-    for week_num in range(1, duration_weeks + 1):
-        vol_factor = _week_volume_factor(week_num, duration_weeks)
-        rpe_off = _week_rpe_offset(week_num, duration_weeks)
-        is_deload = has_deload and week_num == duration_weeks
-        week_label = "Deload" if is_deload else f"Semaine {week_num}"
-
-        for day_index, session_type in enumerate(split):
+    for week in skeleton.weeks:
+        week_volume: Counter[str] = Counter()
+        for day_index, session_type in enumerate(skeleton.split):
             exercises_data, estimated_minutes = generate_session_exercises(
-                filtered, session_type, profile,
-                week_num, day_index,
-                volume_factor=vol_factor,
-                rpe_offset=rpe_off,
+                candidates, session_type, profile,
+                week.number, day_index,
+                volume_factor=week.volume_factor,
+                rpe_offset=week.rpe_offset,
+                rng=rng,
+                week_volume=week_volume,
             )
 
             sets_payload = []
@@ -697,15 +1025,9 @@ def generate_program(
                     'notes': f"{ex_data['series']} séries",
                 })
 
-            # Suffixe A/B si le même type de séance apparaît 2+ fois par semaine
-            label = session_type
-            if split.count(session_type) > 1:
-                occurrence = split[:day_index + 1].count(session_type)
-                label = f"{session_type} {'ABCDEFG'[occurrence - 1]}"
-
             all_sessions.append({
                 'day_index': global_index,
-                'title': f"{label} — {week_label}",
+                'title': f"{skeleton.session_labels[day_index]} — {week.label}",
                 'focus': session_type,
                 'estimated_minutes': estimated_minutes,
                 'sets': sets_payload,
@@ -715,60 +1037,7 @@ def generate_program(
     return {
         'title': title,
         'objective': profile.get('objective'),
-        'duration_weeks': duration_weeks,
+        'duration_weeks': key.duration_weeks,
         'user_id': profile.get('user_id'),
         'sessions': all_sessions,
     }
-
-
-# ═══════════════════════════════════════════════════════════════════════════════
-# FILTRAGE PAR PROFIL
-# ═══════════════════════════════════════════════════════════════════════════════
-
-def _filter_exercises_by_profile(exercises: list[Exercise], profile: dict) -> list[Exercise]:
-    """Filtre les exercices selon équipement et blessures."""
-    equipment_available = profile.get('equipment_available', [])
-
-    # Injury keywords
-    avoid: list[str] = []
-    injuries = profile.get('injuries', '')
-    for zone, keywords in INJURY_AVOID.items():
-        if zone in injuries:
-            avoid.extend(keywords)
-    if profile.get('has_blessure'):
-        for field in ('blessure_first', 'blessure_second'):
-            b = profile.get(field, '')
-            if b and b in INJURY_AVOID:
-                avoid.extend(INJURY_AVOID[b])
-
-    filtered: list[Exercise] = []
-    for ex in exercises:
-        ex_eq = (ex.equipment or '').lower()
-        ex_name = (ex.name or '').lower()
-
-        # Equipment filter
-        if equipment_available:
-            if ex_eq and 'bodyweight' not in ex_eq:
-                if not any(
-                    eq.lower() in ex_eq or eq.lower() in ex_name or
-                    ('haltères' in eq.lower() and 'dumbbell' in ex_eq) or
-                    ('barre' in eq.lower() and 'barbell' in ex_eq) or
-                    ('machine' in eq.lower() and 'machine' in ex_eq) or
-                    ('câble' in eq.lower() and 'cable' in ex_eq)
-                    for eq in equipment_available
-                ):
-                    continue
-
-        # Injury filter
-        if any(kw.lower() in ex_name for kw in avoid):
-            continue
-
-        filtered.append(ex)
-
-    # Fallback : ajouter du bodyweight si trop peu d'exercices
-    if len(filtered) < 20:
-        for ex in exercises:
-            if 'bodyweight' in (ex.equipment or '').lower() and ex not in filtered:
-                filtered.append(ex)
-
-    return filtered
@@ -0,0 +1,142 @@
+"""
+Génération de programmes en lot sur un pool de processus.
+
+La génération est purement CPU : sur le thread de la requête elle bloque un
+worker du serveur et ne profite que d'un cœur (GIL). Les lots (coachs) sont
+répartis sur un ``ProcessPoolExecutor`` dont chaque worker reçoit une fois,
+à son démarrage, l'index d'exercices courant et en tire son propre
+``CompiledCatalogue``. Quand la version du catalogue change, le pool est
+remplacé par un nouveau (l'ancien termine ses tâches en cours).
+
+Les petits lots restent dans le process : l'aller-retour IPC coûte plus que
+la génération elle-même.
+"""
+import multiprocessing
+import os
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Optional, Union
+
+from sqlmodel import Session
+
+from .exercise_catalogue import CatalogueState
+from .exercise_index import ExerciseEntry, ExerciseIndex, get_exercise_index
+from .program_generator import CompiledCatalogue, build_program, get_compiled_catalogue
+
+PROGRAM_POOL_WORKERS = int(os.getenv("PROGRAM_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Taille de lot à partir de laquelle on passe par le pool
+PROGRAM_POOL_MIN_BATCH = int(os.getenv("PROGRAM_POOL_MIN_BATCH", "4"))
+
+# (profil, titre, seed)
+GenerationJob = tuple[dict, str, Optional[int]]
+
+# ── Côté worker ──
+
+_worker_catalogue: Optional[CompiledCatalogue] = None
+
+
+def _init_worker(state: CatalogueState, entries: tuple[ExerciseEntry, ...]) -> None:
+    global _worker_catalogue
+    _worker_catalogue = CompiledCatalogue(ExerciseIndex(state, entries))
+
+
+def _run_job(job: GenerationJob) -> dict:
+    profile, title, seed = job
+    return build_program(_worker_catalogue, profile, title, seed)
+
+
+# ── Côté serveur ──
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_state: Optional[CatalogueState] = None
+_executor_lock = Lock()
+
+
+def _get_executor(index: ExerciseIndex) -> ProcessPoolExecutor:
+    global _executor, _executor_state
+    with _executor_lock:
+        if _executor is None or _executor_state != index.state:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn : pas d'héritage des verrous / connexions du serveur
+            _executor = ProcessPoolExecutor(
+                max_workers=PROGRAM_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(index.state, index.exercises),
+            )
+            _executor_state = index.state
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Retire un pool cassé, seulement s'il est encore le pool courant.
+
+    Une autre requête a pu le remplacer entre-temps (changement de catalogue) :
+    on ne touche alors pas au nouveau pool ni à ses tâches.
+    """
+    global _executor, _executor_state
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+        _executor_state = None
+    executor.shutdown(wait=False)
+
+
+def shutdown_program_pool() -> None:
+    global _executor, _executor_state
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_state = None
+
+
+def _run_inline(catalogue: CompiledCatalogue, jobs: list[GenerationJob]) -> list[Union[dict, Exception]]:
+    results: list[Union[dict, Exception]] = []
+    for profile, title, seed in jobs:
+        try:
+            results.append(build_program(catalogue, profile, title, seed))
+        except Exception as exc:
+            results.append(exc)
+    return results
+
+
+def generate_programs(session: Session, jobs: list[GenerationJob]) -> list[Union[dict, Exception]]:
+    """Génère un programme par job, dans l'ordre ; une erreur n'affecte que son job.
+
+    Même résultat qu'en appelant ``generate_program`` pour chaque profil : la
+    graine ne dépend que de l'utilisateur, du profil et de ``seed``.
+    """
+    if PROGRAM_POOL_WORKERS <= 1 or len(jobs) < PROGRAM_POOL_MIN_BATCH:
+        return _run_inline(get_compiled_catalogue(session), jobs)
+
+    executor = _get_executor(get_exercise_index(session))
+    futures: list[Future] = []
+    try:
+        for job in jobs:
+            futures.append(executor.submit(_run_job, job))
+    except (BrokenProcessPool, RuntimeError):
+        # Pool cassé, ou arrêté par une requête qui l'a remplacé
+        for future in futures:
+            future.cancel()
+        _discard_executor(executor)
+        return _run_inline(get_compiled_catalogue(session), jobs)
+
+    results: list[Union[dict, Exception]] = []
+    for job, future in zip(jobs, futures):
+        try:
+            results.append(future.result())
+        except BrokenProcessPool:
+            # Worker tué (OOM…) : on termine le lot dans le process
+            _discard_executor(executor)
+            results.extend(_run_inline(get_compiled_catalogue(session), jobs[len(results):]))
+            break
+        except CancelledError:
+            # Tâche annulée par l'arrêt du pool : refaite dans le process
+            results.extend(_run_inline(get_compiled_catalogue(session), [job]))
+        except Exception as exc:
+            results.append(exc)
+    return results
@@ -0,0 +1,217 @@
+"""
+Événements temps réel de la messagerie : pub/sub par utilisateur.
+
+Les routes publient après commit (``publish``) : nouveau message, lecture,
+saisie en cours. Chaque connexion WebSocket / SSE s'abonne au canal de son
+utilisateur (``subscribe``) et reçoit les événements sous forme de JSON
+``{"type": ..., "data": ...}``. La base reste la source de vérité : un
+événement perdu (client déconnecté, file pleine) se rattrape avec les routes
+REST.
+
+Backends :
+
+- ``LocalBackend`` (défaut) : en mémoire, un seul process ;
+- ``RedisBackend`` (``REALTIME_BACKEND=redis`` + ``REDIS_URL``) : PUBLISH sur
+  ``gorillax:user:{id}``, chaque worker relaie à ses connexions locales.
+
+Les handlers synchrones publient depuis le threadpool : la remise dans la
+file asyncio d'un abonné passe par ``call_soon_threadsafe``.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Iterable, Optional, Protocol
+
+from ..utils.metrics import register_queue
+from ..utils.responses import dumps
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Événements en attente par connexion ; au-delà, les plus anciens sont perdus
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    """File d'événements d'une connexion, liée à la boucle asyncio qui la lit."""
+
+    def __init__(self, user_id: str, maxsize: int = REALTIME_QUEUE_SIZE) -> None:
+        self.user_id = user_id
+        self.dropped = 0
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+
+    def deliver(self, payload: bytes) -> None:
+        """Appelable depuis n'importe quel thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            pass  # boucle fermée : connexion terminée
+
+    def _put(self, payload: bytes) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(payload)
+
+    async def get(self) -> bytes:
+        return await self._queue.get()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class LocalHub:
+    """Abonnements des connexions de ce process, par utilisateur."""
+
+    def __init__(self) -> None:
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self._lock = Lock()
+
+    def add(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+
+    def remove(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id: str, payload: bytes) -> None:
+        with self._lock:
+            targets = list(self._subscriptions.get(user_id, ()))
+        for subscription in targets:
+            subscription.deliver(payload)
+
+    def connections(self, user_id: Optional[str] = None) -> int:
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscriptions.get(user_id, ()))
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(sub.qsize() for subs in self._subscriptions.values() for sub in subs)
+
+
+class RealtimeBackend(Protocol):
+    def publish(self, user_id: str, payload: bytes) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class LocalBackend:
+    """Remise directe aux connexions du process (un seul worker, tests)."""
+
+    def __init__(self, hub: LocalHub) -> None:
+        self.hub = hub
+
+    def publish(self, user_id: str, payload: bytes) -> None:
+        self.hub.dispatch(user_id, payload)
+
+    def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Redis pub/sub entre workers : chacun relaie à ses propres connexions."""
+
+    CHANNEL_PREFIX = "gorillax:user:"
+
+    def __init__(self, hub: LocalHub, url: str) -> None:
+        if redis is None:
+            raise RuntimeError("REALTIME_BACKEND=redis requiert le paquet redis")
+        self.hub = hub
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{f"{self.CHANNEL_PREFIX}*": self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message: dict[str, Any]) -> None:
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        self.hub.dispatch(channel[len(self.CHANNEL_PREFIX):], message["data"])
+
+    def publish(self, user_id: str, payload: bytes) -> None:
+        self._client.publish(f"{self.CHANNEL_PREFIX}{user_id}", payload)
+
+    def close(self) -> None:
+        self._thread.stop()
+        self._pubsub.close()
+        self._client.close()
+
+
+class Broker:
+    def __init__(self, backend: Optional[RealtimeBackend] = None, hub: Optional[LocalHub] = None) -> None:
+        self.hub = hub or LocalHub()
+        self.backend: RealtimeBackend = backend or LocalBackend(self.hub)
+
+    def publish(self, user_ids: Iterable[str], event_type: str, data: Any) -> None:
+        """Publie un événement ; n'échoue jamais (best effort, après commit)."""
+        payload = dumps({"type": event_type, "data": data})
+        for user_id in set(user_ids):
+            try:
+                self.backend.publish(user_id, payload)
+            except Exception as exc:
+                print(f"⚠️  realtime: publication impossible ({exc})")
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: str) -> AsyncIterator[Subscription]:
+        subscription = Subscription(user_id)
+        self.hub.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.hub.remove(subscription)
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+def _create_broker() -> Broker:
+    hub = LocalHub()
+    if os.getenv("REALTIME_BACKEND", "local").lower() == "redis":
+        return Broker(RedisBackend(hub, os.getenv("REDIS_URL", "redis://localhost:6379/0")), hub)
+    return Broker(hub=hub)
+
+
+_broker: Optional[Broker] = None
+_broker_lock = Lock()
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = _create_broker()
+    return _broker
+
+
+def set_broker(broker: Optional[Broker]) -> None:
+    """Remplace le broker (tests) ; ``None`` le recrée depuis l'environnement."""
+    global _broker
+    with _broker_lock:
+        _broker = broker
+
+
+def shutdown_broker() -> None:
+    global _broker
+    with _broker_lock:
+        if _broker is not None:
+            _broker.close()
+        _broker = None
+
+
+def publish(user_ids: Iterable[str], event_type: str, data: Any) -> None:
+    get_broker().publish(user_ids, event_type, data)
+
+
+register_queue("realtime", lambda: _broker.hub.pending() if _broker is not None else 0)
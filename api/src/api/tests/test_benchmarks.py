@@ -0,0 +1,323 @@
+"""Benchmarks de latence et de nombre de requêtes SQL sur les endpoints chauds.
+
+Désactivés par défaut (lents) : ``RUN_BENCHMARKS=1 pytest src/api/tests/test_benchmarks.py``.
+
+Chaque benchmark appelle directement le handler (ou le helper) sur un jeu de
+données SQLite de taille moyenne généré avec une graine fixe, mesure la latence
+médiane et compte les requêtes SQL, puis compare à ``benchmarks_baseline.json`` :
+
+- échec si la médiane dépasse ``baseline × BENCH_LATENCY_TOLERANCE`` (1.5 par défaut,
+  plus une marge absolue de ``BENCH_LATENCY_SLACK_MS``) ;
+- échec si le nombre de requêtes dépasse ``baseline × BENCH_QUERY_TOLERANCE`` (1.0).
+
+``UPDATE_BENCHMARKS=1`` réécrit la baseline avec les mesures courantes.
+
+``test_fast_response_saves_cpu`` compare, sur les payloads réels des endpoints
+chauds, le chemin ``response_model`` (validation Pydantic + jsonable_encoder +
+JSONResponse) au chemin ``FastJSONResponse`` et affiche le CPU économisé.
+"""
+import json
+import os
+import statistics
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import event, func
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from api.models import Conversation, Exercise, Follower, User
+from api.schemas import ExerciseRead, FeedResponse, SyncPullResponse
+from api.utils.responses import FastJSONResponse
+from api.utils.slug import make_exercise_slug
+from generate_dataset import DatasetConfig, generate_dataset
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_BENCHMARKS") != "1", reason="set RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+BASELINE_PATH = Path(__file__).with_name("benchmarks_baseline.json")
+LATENCY_TOLERANCE = float(os.getenv("BENCH_LATENCY_TOLERANCE", "1.5"))
+LATENCY_SLACK_MS = float(os.getenv("BENCH_LATENCY_SLACK_MS", "2"))
+QUERY_TOLERANCE = float(os.getenv("BENCH_QUERY_TOLERANCE", "1.0"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "7"))
+
+BENCH_DATASET = DatasetConfig(
+    users=2_000, sets=200_000, avg_following=25, likes=40_000,
+    conversations=3_000, messages_per_conversation=30, batch_size=10_000,
+)
+_ANCHOR = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+_MUSCLES = {
+    "Pectoraux": ("Développé couché", "Écarté", "Pompes", "Dips"),
+    "Dos": ("Tirage vertical", "Rowing", "Tractions", "Pull-over"),
+    "Épaules": ("Développé militaire", "Élévations latérales", "Oiseau", "Face pull"),
+    "Quadriceps": ("Squat", "Presse", "Fentes", "Leg extension"),
+    "Ischios": ("Soulevé de terre roumain", "Leg curl", "Good morning", "Nordic curl"),
+    "Fessiers": ("Hip thrust", "Pont fessier", "Abduction", "Step-up"),
+    "Biceps": ("Curl haltères", "Curl barre", "Curl marteau", "Curl pupitre"),
+    "Triceps": ("Extension poulie", "Barre au front", "Kickback", "Dips banc"),
+    "Mollets": ("Mollets debout", "Mollets assis", "Mollets presse", "Sauts"),
+    "Abdos": ("Crunch", "Gainage", "Relevé de jambes", "Roue abdominale"),
+}
+_EQUIPMENT = ("barbell", "dumbbell", "machine", "cable", "bodyweight")
+
+
+def _catalogue() -> list[Exercise]:
+    """~200 exercices répartis sur les groupes musculaires du générateur de programmes."""
+    exercises = []
+    for muscle, names in _MUSCLES.items():
+        for name in names:
+            for equipment in _EQUIPMENT:
+                full_name = f"{name} ({equipment})"
+                exercises.append(Exercise(
+                    name=full_name,
+                    slug=make_exercise_slug(full_name, muscle),
+                    muscle_group=muscle,
+                    equipment=equipment,
+                ))
+    return exercises
+
+
+class _QueryCounter:
+    def __init__(self, engine) -> None:
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+@pytest.fixture(scope="module")
+def bench_env(tmp_path_factory):
+    db_path = tmp_path_factory.mktemp("bench") / "bench.db"
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(_catalogue())
+        session.commit()
+    dataset = generate_dataset(BENCH_DATASET, engine=engine, anchor=_ANCHOR)
+
+    with Session(engine) as session:
+        # Utilisateur « lourd » : celui qui suit le plus de comptes
+        heavy_user_id = session.exec(
+            select(Follower.follower_id)
+            .group_by(Follower.follower_id)
+            .order_by(func.count().desc(), Follower.follower_id)
+            .limit(1)
+        ).one()
+        busiest_inbox_id = session.exec(
+            select(Conversation.participant1_id)
+            .group_by(Conversation.participant1_id)
+            .order_by(func.count().desc(), Conversation.participant1_id)
+            .limit(1)
+        ).one()
+
+    results: dict[str, dict] = {}
+    yield {
+        "engine": engine,
+        "counter": _QueryCounter(engine),
+        "heavy_user_id": heavy_user_id,
+        "inbox_user_id": busiest_inbox_id,
+        "dataset": dataset,
+        "results": results,
+    }
+
+    if os.getenv("UPDATE_BENCHMARKS") == "1" and results:
+        baseline = _load_baseline()
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+    engine.dispose()
+
+
+def _load_baseline() -> dict:
+    if BASELINE_PATH.exists():
+        return json.loads(BASELINE_PATH.read_text())
+    return {}
+
+
+# --- Benchmarks : (session, env) -> fonction mesurée ---------------------------
+
+
+def _bench_get_feed(session, env):
+    from api.routes.feed import get_feed
+
+    user = session.get(User, env["heavy_user_id"])
+    return lambda: get_feed(limit=10, cursor=None, session=session, current_user=user)
+
+
+def _bench_pull_changes(session, env):
+    from api.routes.sync import pull_changes
+
+    user = session.get(User, env["heavy_user_id"])
+    # Premier pull (since=0) : tout l'historique de l'utilisateur
+    return lambda: pull_changes(since=0, session=session, current_user=user)
+
+
+def _bench_push_mutations(session, env):
+    from api.routes.sync import push_mutations
+    from api.schemas import SyncPushRequest
+
+    user = session.get(User, env["heavy_user_id"])
+    exercise_id = session.exec(select(Exercise.id).order_by(Exercise.id).limit(1)).one()
+    counter = iter(range(1_000_000))
+
+    def run():
+        n = next(counter)
+        mutations = [
+            {"queue_id": 1, "action": "create-workout", "created_at": 0,
+             "payload": {"client_id": f"bench-w-{n}", "title": "Bench"}},
+            {"queue_id": 2, "action": "add-exercise", "created_at": 0,
+             "payload": {"client_id": f"bench-e-{n}", "workoutClientId": f"bench-w-{n}",
+                         "exerciseId": exercise_id, "orderIndex": 0, "plannedSets": 3}},
+        ] + [
+            {"queue_id": 3 + i, "action": "add-set", "created_at": 0,
+             "payload": {"client_id": f"bench-s-{n}-{i}", "exerciseClientId": f"bench-e-{n}",
+                         "payload": {"reps": 8, "weight": 60.0}}}
+            for i in range(3)
+        ]
+        return push_mutations(SyncPushRequest(mutations=mutations), session=session, current_user=user)
+
+    return run
+
+
+def _bench_list_exercises(session, env):
+    from api.routes.exercises import list_exercises
+
+    return lambda: list_exercises(since_version=None, if_none_match=None, session=session)
+
+
+def _bench_get_trending_posts(session, env):
+    from api.routes.explore import get_trending_posts
+
+    return lambda: get_trending_posts(limit=20, session=session)
+
+
+def _bench_leaderboard_volume(session, env):
+    from api.routes.leaderboard import get_volume_leaderboard
+
+    return lambda: get_volume_leaderboard(
+        period="all", current_user_id=env["heavy_user_id"], limit=20, session=session
+    )
+
+
+def _bench_compute_volume_scores(session, env):
+    from api.routes.leaderboard import _compute_volume_scores
+
+    return lambda: _compute_volume_scores(session, start_date=None)
+
+
+def _bench_list_conversations(session, env):
+    from api.routes.messaging import list_conversations
+
+    user = session.get(User, env["inbox_user_id"])
+    return lambda: list_conversations(limit=20, cursor=None, session=session, current_user=user)
+
+
+def _bench_generate_program(session, env):
+    from api.routes.programs import GenerateProgramRequest, generate_program
+
+    user = session.get(User, env["heavy_user_id"])
+    payload = GenerateProgramRequest(frequency=4, duration_weeks=6, niveau="Intermédiaire")
+    return lambda: generate_program(payload, session=session, current_user=user)
+
+
+def _bench_program_generator(session, env):
+    from api.services.program_generator import generate_program
+
+    profile = {"frequency": 4, "duration_weeks": 6, "niveau": "Intermédiaire",
+               "objective": "Hypertrophie", "duree_seance": "60"}
+    return lambda: generate_program(session, dict(profile))
+
+
+BENCHMARKS: dict[str, Callable] = {
+    "get_feed": _bench_get_feed,
+    "pull_changes": _bench_pull_changes,
+    "push_mutations": _bench_push_mutations,
+    "get_trending_posts": _bench_get_trending_posts,
+    "list_exercises": _bench_list_exercises,
+    "leaderboard_volume": _bench_leaderboard_volume,
+    "compute_volume_scores": _bench_compute_volume_scores,
+    "list_conversations": _bench_list_conversations,
+    "generate_program": _bench_generate_program,
+    "program_generator": _bench_program_generator,
+}
+
+
+@pytest.mark.parametrize("name", sorted(BENCHMARKS))
+def test_benchmark(name, bench_env):
+    engine = bench_env["engine"]
+    counter = bench_env["counter"]
+
+    with Session(engine) as session:
+        run = BENCHMARKS[name](session, bench_env)
+        run()  # chauffe (caches SQLAlchemy, pages SQLite)
+        counter.count = 0
+        run()
+        queries = counter.count
+        timings = []
+        for _ in range(REPEAT):
+            session.expire_all()
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    median_ms = round(statistics.median(timings), 3)
+    bench_env["results"][name] = {"median_ms": median_ms, "queries": queries}
+
+    baseline = _load_baseline().get(name)
+    if baseline is None or os.getenv("UPDATE_BENCHMARKS") == "1":
+        return
+    max_ms = baseline["median_ms"] * LATENCY_TOLERANCE + LATENCY_SLACK_MS
+    max_queries = baseline["queries"] * QUERY_TOLERANCE
+    assert queries <= max_queries, (
+        f"{name}: {queries} SQL queries, baseline {baseline['queries']}"
+    )
+    assert median_ms <= max_ms, (
+        f"{name}: median {median_ms} ms, baseline {baseline['median_ms']} ms (max {max_ms:.1f})"
+    )
+
+
+# --- Chemin de réponse rapide vs response_model --------------------------------
+
+FAST_RESPONSES: dict[str, tuple[Callable, Any]] = {
+    "get_feed": (_bench_get_feed, FeedResponse),
+    "pull_changes": (_bench_pull_changes, SyncPullResponse),
+    "list_exercises": (_bench_list_exercises, list[ExerciseRead]),
+}
+
+
+def _median_ms(fn: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(max(REPEAT, 25)):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+@pytest.mark.parametrize("name", sorted(FAST_RESPONSES))
+def test_fast_response_saves_cpu(name, bench_env):
+    factory, model = FAST_RESPONSES[name]
+    with Session(bench_env["engine"]) as session:
+        payload = json.loads(factory(session, bench_env)().body)
+    adapter = TypeAdapter(model)
+
+    def pydantic_path():
+        return JSONResponse(jsonable_encoder(adapter.validate_python(payload)))
+
+    def fast_path():
+        return FastJSONResponse(payload)
+
+    assert json.loads(fast_path().body) == json.loads(pydantic_path().body)
+    slow_ms = _median_ms(pydantic_path)
+    fast_ms = _median_ms(fast_path)
+    print(f"\n{name}: response_model {slow_ms:.3f} ms, fast path {fast_ms:.3f} ms, "
+          f"saved {slow_ms - fast_ms:.3f} ms/request")
+    assert fast_ms < slow_ms
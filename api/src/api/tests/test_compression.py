@@ -0,0 +1,120 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from api.utils import compression
+from api.utils.compression import (
+    COMPRESSION_SAVED_BYTES,
+    CompressionMiddleware,
+    negotiate_encoding,
+    skip_compression,
+)
+
+PAYLOAD = "gorillax " * 500
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(PAYLOAD)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    def stream():
+        def chunks():
+            for i in range(5):
+                yield f"chunk {i} ".encode() * 100
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/opt-out")
+    @skip_compression
+    def opt_out():
+        return PlainTextResponse(PAYLOAD)
+
+    @app.get("/pkpass")
+    def pkpass():
+        return Response(PAYLOAD.encode(), media_type="application/vnd.apple.pkpass")
+
+    return app
+
+
+@pytest.fixture
+def raw_client():
+    # Pas de décodage automatique : on vérifie les octets réellement envoyés
+    with TestClient(_app()) as test_client:
+        yield test_client
+
+
+def _get(client, path, accept="gzip"):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("*") == ("br" if compression.brotli else "gzip")
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+
+
+def test_large_response_is_gzipped(raw_client):
+    before = COMPRESSION_SAVED_BYTES.value(labels={"route": "/big", "encoding": "gzip"})
+    response, body = _get(raw_client, "/big")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body).decode() == PAYLOAD
+
+    saved = COMPRESSION_SAVED_BYTES.value(labels={"route": "/big", "encoding": "gzip"}) - before
+    assert saved == len(PAYLOAD) - len(body)
+
+
+def test_identity_and_small_responses_are_untouched(raw_client):
+    response, body = _get(raw_client, "/big", accept="identity")
+    assert "content-encoding" not in response.headers
+    assert body.decode() == PAYLOAD
+
+    response, body = _get(raw_client, "/small")
+    assert "content-encoding" not in response.headers
+    assert body == b"ok"
+
+
+def test_streaming_response_is_compressed_per_chunk(raw_client):
+    response, body = _get(raw_client, "/stream")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    expected = b"".join(f"chunk {i} ".encode() * 100 for i in range(5))
+    assert zlib.decompress(body, 31) == expected
+
+
+def test_opt_out_route_and_excluded_content_type(raw_client):
+    for path in ("/opt-out", "/pkpass"):
+        response, body = _get(raw_client, path)
+        assert "content-encoding" not in response.headers
+        assert body.decode() == PAYLOAD
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+def test_brotli_preferred_when_available(raw_client):
+    response, body = _get(raw_client, "/big", accept="gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert compression.brotli.decompress(body).decode() == PAYLOAD
+
+
+def test_app_compresses_exercise_list(client):
+    response = client.get("/exercises", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 15
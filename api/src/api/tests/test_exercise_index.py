@@ -0,0 +1,49 @@
+from sqlmodel import Session
+
+from api.db import get_engine
+from api.models import Exercise
+from api.services.exercise_catalogue import bump_catalogue_version
+from api.services.exercise_index import get_exercise_index, resolve_exercises
+
+
+def test_index_lookups(client):
+    with Session(get_engine()) as session:
+        index = get_exercise_index(session)
+        assert len(index) == 15
+
+        squat = index.by_slug["squat-legs"]
+        assert index.resolve(squat.id) is squat
+        assert index.resolve("squat-legs") is squat
+        assert squat in index.for_muscle(" LEGS ")
+        assert all(e.equipment == "barbell" for e in index.for_equipment("Barbell"))
+        # Même instantané tant que la version ne change pas
+        assert get_exercise_index(session) is index
+
+
+def test_index_refreshes_on_catalogue_write(client):
+    with Session(get_engine()) as session:
+        before = get_exercise_index(session)
+        session.add(Exercise(name="Hip Thrust", slug="hip-thrust-fessiers", muscle_group="Fessiers",
+                             equipment="barbell", version=bump_catalogue_version(session)))
+        session.commit()
+
+        after = get_exercise_index(session)
+        assert after is not before
+        assert len(after) == len(before) + 1
+        assert [e.name for e in after.for_muscle("fessiers")] == ["Hip Thrust"]
+        # L'ancien instantané n'a pas bougé
+        assert "hip-thrust-fessiers" not in before.by_slug
+
+
+def test_resolve_falls_back_to_database_for_unindexed_rows(client):
+    with Session(get_engine()) as session:
+        get_exercise_index(session)
+        # Écriture hors catalogue (sans bump) : absente de l'index courant
+        row = Exercise(name="Nordic Curl", slug="nordic-curl-hamstrings", muscle_group="hamstrings")
+        session.add(row)
+        session.commit()
+
+        found = resolve_exercises(session, [row.id, "nordic-curl-hamstrings", "unknown"])
+        assert found[row.id].name == "Nordic Curl"
+        assert found["nordic-curl-hamstrings"].id == row.id
+        assert "unknown" not in found
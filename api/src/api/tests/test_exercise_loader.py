@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, select
+
+from api.db import get_engine
+from api.models import Exercise
+from api.services.exercise_catalogue import get_catalogue_state
+from api.services.exercise_loader import (
+    import_exercises_from_url,
+    iter_json_array,
+    load_exercises_from_url,
+)
+
+EXAMPLE = Path(__file__).resolve().parents[3] / "exercises_example.json"
+
+
+def _write(tmp_path, items) -> Path:
+    path = tmp_path / "catalogue.json"
+    path.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def test_iter_json_array_across_chunk_boundaries():
+    text = json.dumps([{"name": f"Ex {i}", "tags": ["a", "b"]} for i in range(50)])
+    # Morceaux de 7 caractères : chaque objet est coupé plusieurs fois
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    assert [item["name"] for item in iter_json_array(chunks)] == [f"Ex {i}" for i in range(50)]
+    assert list(iter_json_array(["  [ ] "])) == []
+
+
+@pytest.mark.parametrize("text", ['{"name": "x"}', '[{"name": "x"}', '[{"name": "x"} {"name": "y"}]'])
+def test_iter_json_array_rejects_invalid_documents(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array([text]))
+
+
+def test_local_files_require_opt_in(tmp_path):
+    path = _write(tmp_path, [{"name": "Squat", "muscle_group": "legs"}])
+    with pytest.raises(ValueError):
+        load_exercises_from_url(str(path))
+    assert len(load_exercises_from_url(path.as_uri(), allow_local_files=True)) == 1
+
+
+def test_import_example_file_then_upsert(client, tmp_path):
+    with Session(get_engine()) as session:
+        version_before = get_catalogue_state(session).version
+        result = import_exercises_from_url(
+            session, EXAMPLE.as_uri(), force=True, batch_size=7, allow_local_files=True
+        )
+    assert result["inserted"] == result["total"] == 20
+    assert result["updated"] == result["skipped"] == 0
+
+    items = json.loads(EXAMPLE.read_text(encoding="utf-8"))
+    items[0]["description"] = "Nouvelle description"
+    items.append({"name": "Nordic Curl", "muscle_group": "hamstrings", "equipment": "bodyweight"})
+    path = _write(tmp_path, items)
+
+    with Session(get_engine()) as session:
+        result = import_exercises_from_url(session, str(path), batch_size=7, allow_local_files=True)
+        assert result == {"inserted": 1, "updated": 1, "skipped": 19, "total": 21, "imported": 1}
+
+        state = get_catalogue_state(session)
+        assert state.version == version_before + 2
+        squat = session.exec(select(Exercise).where(Exercise.slug == "squat-quads")).one()
+        assert squat.instructions == "Nouvelle description"
+        assert squat.version == state.version
+        assert len(session.exec(select(Exercise)).all()) == 21
+
+
+def test_invalid_item_rolls_back_whole_import(client, tmp_path):
+    path = _write(tmp_path, [{"name": "Good", "muscle_group": "legs"}, {"muscle_group": "legs"}])
+    with Session(get_engine()) as session:
+        count = len(session.exec(select(Exercise)).all())
+        with pytest.raises(ValueError):
+            import_exercises_from_url(session, str(path), allow_local_files=True)
+    with Session(get_engine()) as session:
+        assert len(session.exec(select(Exercise)).all()) == count
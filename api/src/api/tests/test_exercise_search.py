@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from sqlmodel import Session
+
+from api.db import get_engine
+from api.models import Exercise
+from api.services.exercise_catalogue import CatalogueState, bump_catalogue_version
+from api.services.exercise_index import ExerciseEntry, ExerciseIndex
+from api.services.exercise_search import ExerciseSearchIndex, tokenize
+
+
+def _entry(i: int, name: str, muscle: str, equipment: str = "barbell") -> ExerciseEntry:
+    return ExerciseEntry(
+        id=f"ex-{i}", name=name, slug=f"ex-{i}", category=muscle, muscle_group=muscle,
+        equipment=equipment, instructions=None, video_url=None, version=1,
+    )
+
+
+CATALOGUE = (
+    _entry(1, "Développé couché", "Pectoraux"),
+    _entry(2, "Bench Press", "chest"),
+    _entry(3, "Élévations latérales", "Épaules", "dumbbell"),
+    _entry(4, "Squat", "quads"),
+    _entry(5, "Soulevé de terre roumain", "Ischios"),
+    _entry(6, "Leg Curl", "hamstrings", "machine"),
+)
+
+
+def _index(entries=CATALOGUE) -> ExerciseSearchIndex:
+    return ExerciseSearchIndex(ExerciseIndex(CatalogueState(1, 0), tuple(entries)))
+
+
+def _names(hits) -> list[str]:
+    return [hit.exercise.name for hit in hits]
+
+
+def test_tokenize_is_accent_and_case_insensitive():
+    assert tokenize("Élévations LATÉRALES") == ["elevations", "laterales"]
+    assert tokenize("posterior_chain") == ["posterior", "chain"]
+
+
+def test_search_prefix_accents_and_typos():
+    index = _index()
+    assert _names(index.search("dev"))[0] == "Développé couché"
+    assert _names(index.search("elevation lat"))[0] == "Élévations latérales"
+    assert _names(index.search("benhc pres"))[0] == "Bench Press"
+    assert _names(index.search("squatt")) == ["Squat"]
+    assert index.search("zzzz") == []
+
+
+def test_search_matches_muscle_groups_in_both_languages():
+    index = _index()
+    # « pectoraux » retrouve aussi les exercices indexés en anglais (chest), et inversement
+    assert set(_names(index.search("pectoraux"))) == {"Développé couché", "Bench Press"}
+    assert set(_names(index.search("hamstrings"))) == {"Soulevé de terre roumain", "Leg Curl"}
+    # Le nom l'emporte sur le groupe musculaire
+    assert _names(index.search("curl"))[0] == "Leg Curl"
+
+
+def test_search_is_fast_on_large_catalogue():
+    words = ["curl", "press", "row", "squat", "fly", "raise", "extension", "pulldown"]
+    muscles = ["chest", "Dos", "Épaules", "quads", "Ischios", "biceps", "triceps"]
+    entries = [
+        _entry(i, f"{words[i % 8]} {words[(i // 8) % 8]} variante {i}", muscles[i % 7])
+        for i in range(1_000)
+    ]
+    index = _index(entries)
+    timings = []
+    for query in ("cur", "pres inc", "squatt", "epaules raise", "row"):
+        for _ in range(20):
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            timings.append(time.perf_counter() - start)
+    # Cible < 1 ms ; marge pour les machines de CI lentes
+    assert statistics.median(timings) < 0.002
+
+
+def test_search_endpoint_follows_catalogue_changes(client):
+    response = client.get("/exercises/search", params={"q": "sqat"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body[0]["name"] == "Squat"
+    assert 0 < body[0]["score"] <= 1
+    assert "server-timing" in response.headers
+
+    with Session(get_engine()) as session:
+        session.add(Exercise(name="Hip Thrust", slug="hip-thrust-glutes", muscle_group="glutes",
+                             equipment="barbell", version=bump_catalogue_version(session)))
+        session.commit()
+
+    response = client.get("/exercises/search", params={"q": "fessiers"})
+    assert [item["name"] for item in response.json()] == ["Hip Thrust"]
+    assert client.get("/exercises/search").status_code == 422
@@ -4,6 +4,7 @@ from sqlmodel import select
 from api.db import get_engine
 from api.models import Exercise
 from api.seeds import seed_exercises
+from api.services.exercise_catalogue import bump_catalogue_version
 
 
 def test_seed_populates_and_list_endpoint(client):
@@ -101,3 +102,52 @@ def test_bulk_create_exercises(client):
     names = {item["name"] for item in body}
     assert names == {"Hip Thrust", "Pallof Press"}
 
+
+
+def test_list_exercises_etag_and_not_modified(client):
+    first = client.get("/exercises")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('"exercises-')
+
+    cached = client.get("/exercises", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    with Session(get_engine()) as session:
+        version = bump_catalogue_version(session)
+        session.add(Exercise(name="Nordic Curl", slug="nordic-curl", muscle_group="hamstrings",
+                             equipment="bodyweight", version=version))
+        session.commit()
+
+    changed = client.get("/exercises", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert "Nordic Curl" in {item["name"] for item in changed.json()}
+
+
+def test_list_exercises_delta_since_version(client):
+    full = client.get("/exercises")
+    version = int(full.headers["x-catalogue-version"])
+
+    empty = client.get(f"/exercises?since_version={version}")
+    assert empty.status_code == 200
+    assert empty.json() == []
+    assert empty.headers["x-catalogue-delta"] == "partial"
+
+    with Session(get_engine()) as session:
+        new_version = bump_catalogue_version(session)
+        session.add(Exercise(name="Nordic Curl", slug="nordic-curl", muscle_group="hamstrings",
+                             equipment="bodyweight", version=new_version))
+        session.commit()
+
+    delta = client.get(f"/exercises?since_version={version}")
+    assert [item["name"] for item in delta.json()] == ["Nordic Curl"]
+    assert delta.headers["x-catalogue-version"] == str(new_version)
+
+    # Reseed (suppression) : un delta antérieur renvoie le catalogue complet
+    seed_exercises(force=True)
+    reset = client.get(f"/exercises?since_version={new_version}")
+    assert reset.headers["x-catalogue-delta"] == "full"
+    assert len(reset.json()) == 15
@@ -0,0 +1,76 @@
+"""Tests du générateur de données synthétiques (scripts/generate_dataset.py)."""
+from datetime import datetime, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from api.db import get_engine
+from api.models import Conversation, Exercise, Follower, Like, Message, Set, Share, User, message_preview
+from generate_dataset import DatasetConfig, generate_dataset
+
+_ANCHOR = datetime(2026, 1, 1, tzinfo=timezone.utc)
+_CONFIG = DatasetConfig(
+    users=50, sets=2_000, avg_following=5, likes=300,
+    conversations=20, messages_per_conversation=5, batch_size=137,
+)
+
+
+def _count(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_generates_requested_volumes():
+    result = generate_dataset(_CONFIG, anchor=_ANCHOR)
+
+    with Session(get_engine()) as session:
+        assert _count(session, User) >= 50
+        assert _count(session, Set) == 2_000
+        assert _count(session, Follower) == result["rows"]["follower"]
+        assert _count(session, Like) == result["rows"]["like"] > 0
+        assert _count(session, Message) == result["rows"]["message"]
+        assert _count(session, Share) == len(result["share_ids"])
+        follows = session.exec(select(Follower.follower_id, Follower.followed_id)).all()
+    assert all(a != b for a, b in follows)
+    assert len(set(follows)) == len(follows)
+
+
+def test_conversation_summaries_match_messages():
+    generate_dataset(_CONFIG, anchor=_ANCHOR)
+
+    with Session(get_engine()) as session:
+        conversations = session.exec(select(Conversation)).all()
+        assert any(c.participant1_unread or c.participant2_unread for c in conversations)
+        assert any(c.participant1_last_read_at or c.participant2_last_read_at for c in conversations)
+        for conv in conversations:
+            assert conv.participant1_id < conv.participant2_id
+            messages = session.exec(
+                select(Message).where(Message.conversation_id == conv.id).order_by(Message.created_at)
+            ).all()
+            last = messages[-1]
+            assert conv.last_message_id == last.id
+            assert conv.last_message_sender_id == last.sender_id
+            assert conv.last_message_preview == message_preview(last.content)
+            assert all(m.read_at is None for m in messages)
+            for participant, unread, mark in (
+                (conv.participant1_id, conv.participant1_unread, conv.participant1_last_read_at),
+                (conv.participant2_id, conv.participant2_unread, conv.participant2_last_read_at),
+            ):
+                received = [m for m in messages if m.sender_id != participant]
+                assert mark is None or mark in [m.created_at for m in received]
+                assert unread == sum(mark is None or m.created_at > mark for m in received)
+
+
+def test_same_seed_is_reproducible(tmp_path):
+    first = generate_dataset(_CONFIG, anchor=_ANCHOR)
+    with pytest.raises(RuntimeError):
+        generate_dataset(_CONFIG, anchor=_ANCHOR)
+
+    other = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    SQLModel.metadata.create_all(other)
+    with Session(other) as session:
+        session.add_all([Exercise(name=f"Ex {i}", muscle_group="chest") for i in range(15)])
+        session.commit()
+    second = generate_dataset(_CONFIG, engine=other, anchor=_ANCHOR)
+    assert first["rows"] == second["rows"]
+    assert first["user_ids"] == second["user_ids"]
+    assert first["share_ids"] == second["share_ids"]
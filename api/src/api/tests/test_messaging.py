@@ -1,12 +1,26 @@
 """Tests for messaging routes: conversations, messages, unread count."""
+import asyncio
 import os
 import uuid
+from datetime import datetime, timedelta, timezone
 
 import pytest
-from sqlmodel import Session, select
-
-from api.db import get_engine
-from api.models import User, Conversation, Message
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, create_engine, select
+
+from api.db import (
+    _ensure_conversation_read_marks,
+    _ensure_conversation_summary_columns,
+    _ensure_unique_conversation_pairs,
+    get_engine,
+)
+from api.models import MESSAGE_PREVIEW_LENGTH, User, Conversation, Message
+from api.routes import messaging
+from api.routes.messaging import _event_stream
+from api.services.message_search import ensure_message_search_index
+from api.services.realtime import Broker, get_broker, set_broker
 from api.utils.auth import hash_password, create_access_token
 
 
@@ -47,6 +61,14 @@ def _auth_header(user_id: str) -> dict[str, str]:
     return {"Authorization": f"Bearer {token}"}
 
 
+def _make_users(*usernames: str) -> list[str]:
+    """Create users and return their ids (not detached User instances)."""
+    with Session(get_engine()) as session:
+        for username in usernames:
+            _make_user(session, username)
+    return list(usernames)
+
+
 def _setup_two_users() -> tuple[User, User]:
     """Create two users and return them."""
     with Session(get_engine()) as session:
@@ -55,6 +77,15 @@ def _setup_two_users() -> tuple[User, User]:
     return alice, bob
 
 
+def _open_conversation(client, user_id: str, other_id: str) -> str:
+    resp = client.post(
+        "/messaging/conversations",
+        json={"participant_id": other_id},
+        headers=_auth_header(user_id),
+    )
+    return resp.json()["conversation"]["id"]
+
+
 # ---------------------------------------------------------------------------
 # Create / get conversation
 # ---------------------------------------------------------------------------
@@ -478,3 +509,432 @@ class TestDeleteConversation:
             headers=_auth_header(charlie.id),
         )
         assert resp2.status_code == 403
+
+
+# ---------------------------------------------------------------------------
+# Denormalized last message / unread counters
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture()
+def message_queries():
+    """SQL statements touching the message table, recorded while the list is truthy."""
+    statements: list[str] = []
+    engine = get_engine()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if " message" in statement.lower():
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _record)
+
+
+class TestConversationSummary:
+    def _send(self, client, sender: str, conv_id: str, content: str) -> dict:
+        resp = client.post(
+            f"/messaging/conversations/{conv_id}/messages",
+            json={"content": content},
+            headers=_auth_header(sender),
+        )
+        assert resp.status_code == 200
+        return resp.json()["message"]
+
+    def test_inbox_reads_counters_without_scanning_messages(self, client, message_queries):
+        alice, bob, charlie = _make_users("alice", "bob", "charlie")
+        conv_ab = _open_conversation(client, alice, bob)
+        conv_cb = _open_conversation(client, charlie, bob)
+        for i in range(3):
+            self._send(client, alice, conv_ab, f"Message {i}")
+        self._send(client, bob, conv_ab, "Réponse")
+        last = self._send(client, charlie, conv_cb, "x" * 500)
+
+        message_queries.clear()
+        resp = client.get("/messaging/conversations", headers=_auth_header(bob))
+        unread = client.get("/messaging/unread-count", headers=_auth_header(bob))
+        assert message_queries == []
+
+        convs = {c["id"]: c for c in resp.json()["conversations"]}
+        assert [c["id"] for c in resp.json()["conversations"]] == [conv_cb, conv_ab]
+        assert convs[conv_ab]["unread_count"] == 3
+        assert convs[conv_ab]["last_message"]["content"] == "Réponse"
+        assert convs[conv_ab]["last_message"]["sender_id"] == bob
+        assert convs[conv_cb]["last_message"]["id"] == last["id"]
+        assert len(convs[conv_cb]["last_message"]["content"]) == MESSAGE_PREVIEW_LENGTH
+        assert convs[conv_cb]["last_message"]["content"].endswith("…")
+        assert unread.json()["unread_count"] == 4
+
+    def test_first_page_advances_read_mark_with_one_update(self, client, message_queries):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+        for i in range(3):
+            self._send(client, alice, conv_id, f"Message {i}")
+
+        message_queries.clear()
+        resp = client.get(f"/messaging/conversations/{conv_id}/messages?limit=2", headers=_auth_header(bob))
+        assert not [q for q in message_queries if q.lstrip().upper().startswith("UPDATE")]
+        assert all(m["read_at"] is not None for m in resp.json()["messages"])
+
+        # Marque de lecture : le message hors page est lu aussi
+        assert client.get("/messaging/unread-count", headers=_auth_header(bob)).json()["unread_count"] == 0
+        older = client.get(
+            f"/messaging/conversations/{conv_id}/messages",
+            params={"cursor": resp.json()["next_cursor"]},
+            headers=_auth_header(alice),
+        )
+        assert [m["read_at"] is not None for m in older.json()["messages"]] == [True]
+
+        self._send(client, alice, conv_id, "Encore un")
+        convs = client.get("/messaging/conversations", headers=_auth_header(alice)).json()["conversations"]
+        assert convs[0]["last_message"]["read_at"] is None
+        client.post(f"/messaging/conversations/{conv_id}/read", headers=_auth_header(bob))
+        with Session(get_engine()) as session:
+            conv = session.get(Conversation, conv_id)
+            assert (conv.participant1_unread, conv.participant2_unread) == (0, 0)
+            assert conv.participant2_last_read_at is not None
+        convs = client.get("/messaging/conversations", headers=_auth_header(alice)).json()["conversations"]
+        assert convs[0]["last_message"]["read_at"] is not None
+
+    def test_read_marks_migration_uses_message_read_at(self, client):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+        first = self._send(client, alice, conv_id, "Bonjour")
+        self._send(client, alice, conv_id, "Tu es là ?")
+        with Session(get_engine()) as session:
+            session.get(Message, first["id"]).read_at = datetime.now(timezone.utc)
+            session.commit()
+
+        engine = get_engine()
+        with engine.begin() as connection:
+            for column in ("participant1_last_read_at", "participant2_last_read_at"):
+                connection.execute(text(f"ALTER TABLE conversation DROP COLUMN {column}"))
+        _ensure_conversation_read_marks(engine)
+
+        with Session(engine) as session:
+            conv = session.get(Conversation, conv_id)
+            assert conv.participant1_last_read_at is None
+            assert conv.participant2_last_read_at is not None
+            # Le 2e message a été créé avant la lecture du 1er : couvert par la marque
+            assert (conv.participant1_unread, conv.participant2_unread) == (0, 0)
+
+    def test_migration_backfills_existing_conversations(self, client):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+        first = self._send(client, alice, conv_id, "Bonjour")
+        self._send(client, alice, conv_id, "Tu es là ?")
+        last = self._send(client, bob, conv_id, "Oui")
+        with Session(get_engine()) as session:
+            session.get(Message, first["id"]).read_at = datetime.now(timezone.utc)
+            session.commit()
+
+        engine = get_engine()
+        with engine.begin() as connection:
+            for index in ("ix_conversation_p1_last_message", "ix_conversation_p2_last_message"):
+                connection.execute(text(f"DROP INDEX {index}"))
+            for column in ("last_message_id", "last_message_sender_id", "last_message_preview",
+                           "participant1_unread", "participant2_unread"):
+                connection.execute(text(f"ALTER TABLE conversation DROP COLUMN {column}"))
+
+        _ensure_conversation_summary_columns(engine)
+
+        with Session(engine) as session:
+            conv = session.get(Conversation, conv_id)
+            assert conv.last_message_id == last["id"]
+            assert conv.last_message_preview == "Oui"
+            # alice : la réponse de bob ; bob : le 2e message d'alice (le 1er est lu)
+            assert (conv.participant1_unread, conv.participant2_unread) == (1, 1)
+
+
+# ---------------------------------------------------------------------------
+# One conversation per pair
+# ---------------------------------------------------------------------------
+
+
+class TestConversationPairs:
+    def test_pair_is_stored_once_in_canonical_order(self, client):
+        alice, bob = _make_users("alice", "bob")
+        from_bob = client.post("/messaging/conversations", json={"participant_id": alice},
+                               headers=_auth_header(bob)).json()
+        from_alice = client.post("/messaging/conversations", json={"participant_id": bob},
+                                 headers=_auth_header(alice)).json()
+        sent = client.post("/messaging/send", json={"recipient_id": alice, "content": "Yo"},
+                           headers=_auth_header(bob)).json()
+
+        assert (from_bob["created"], from_alice["created"]) == (True, False)
+        assert from_bob["conversation"]["id"] == from_alice["conversation"]["id"] == sent["conversation_id"]
+        with Session(get_engine()) as session:
+            conv = session.exec(select(Conversation)).one()
+            assert (conv.participant1_id, conv.participant2_id) == ("alice", "bob")
+            session.add(Conversation(participant1_id="alice", participant2_id="bob"))
+            with pytest.raises(IntegrityError):
+                session.commit()
+
+    def test_migration_merges_duplicate_conversations(self, client):
+        alice, bob, charlie = _make_users("alice", "bob", "charlie")
+        engine = get_engine()
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ux_conversation_participants"))
+        now = datetime.now(timezone.utc)
+        with Session(engine) as session:
+            # Anciennes lignes : ordre quelconque et doublons pour alice/bob
+            first = Conversation(participant1_id=bob, participant2_id=alice,
+                                 created_at=now - timedelta(days=2),
+                                 participant1_last_read_at=now - timedelta(hours=3))
+            second = Conversation(participant1_id=alice, participant2_id=bob,
+                                  created_at=now - timedelta(days=1))
+            other = Conversation(participant1_id=charlie, participant2_id=alice)
+            session.add_all([first, second, other])
+            session.flush()
+            for conv, sender, hours in ((first, alice, 4), (second, alice, 2), (second, bob, 1)):
+                session.add(Message(conversation_id=conv.id, sender_id=sender, content=f"{hours}h",
+                                    created_at=now - timedelta(hours=hours)))
+            session.commit()
+            first_id, other_id = first.id, other.id
+
+        _ensure_unique_conversation_pairs(engine)
+
+        indexes = {index["name"]: index for index in inspect(engine).get_indexes("conversation")}
+        assert indexes["ux_conversation_participants"]["unique"]
+        assert "ix_conversation_participants" not in indexes
+        with Session(engine) as session:
+            convs = {c.id: c for c in session.exec(select(Conversation)).all()}
+            assert set(convs) == {first_id, other_id}
+            merged = convs[first_id]
+            assert (merged.participant1_id, merged.participant2_id) == ("alice", "bob")
+            assert (convs[other_id].participant1_id, convs[other_id].participant2_id) == ("alice", "charlie")
+            messages = session.exec(select(Message).where(Message.conversation_id == first_id)).all()
+            assert len(messages) == 3
+            assert merged.last_message_preview == "1h"
+            # bob a lu jusqu'à -3 h : seul le message d'alice à -2 h reste non lu
+            assert merged.participant2_last_read_at is not None
+            assert (merged.participant1_unread, merged.participant2_unread) == (1, 1)
+
+
+# ---------------------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------------------
+
+
+class TestMessageSearch:
+    def _send(self, client, sender: str, recipient: str, content: str) -> str:
+        resp = client.post(
+            "/messaging/send",
+            json={"recipient_id": recipient, "content": content},
+            headers=_auth_header(sender),
+        )
+        return resp.json()["message"]["id"]
+
+    def _search(self, client, user_id: str, **params) -> dict:
+        resp = client.get("/messaging/search", params=params, headers=_auth_header(user_id))
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    def test_search_is_ranked_scoped_and_accent_insensitive(self, client):
+        alice, bob, charlie = _make_users("alice", "bob", "charlie")
+        squat = self._send(client, bob, alice, "Grosse séance de squat ce matin, squat squat !")
+        self._send(client, alice, charlie, "Tu fais du squat avant ou après le développé ?")
+        self._send(client, alice, bob, "Rien à voir")
+        self._send(client, bob, charlie, "Squat entre nous, alice ne doit pas voir ça")
+
+        body = self._search(client, alice, q="squat")
+        assert len(body["results"]) == 2
+        assert body["results"][0]["id"] == squat
+        assert "<mark>squat</mark>" in body["results"][0]["snippet"].lower()
+        assert body["next_cursor"] is None
+
+        assert [r["id"] for r in self._search(client, alice, q="SEANCE squ")["results"]] == [squat]
+        # Syntaxe FTS neutralisée
+        assert self._search(client, alice, q='squat" (*')["results"]
+        assert self._search(client, alice, q="!!")["results"] == []
+
+    def test_search_keyset_pagination_and_deletion(self, client):
+        alice, bob = _make_users("alice", "bob")
+        ids = {self._send(client, alice, bob, f"message protéines numéro {i}") for i in range(5)}
+
+        seen, cursor = [], None
+        while True:
+            params = {"q": "proteines", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            body = self._search(client, bob, **params)
+            seen.extend(r["id"] for r in body["results"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert len(seen) == 5 and set(seen) == ids
+
+        bad = client.get("/messaging/search", params={"q": "x", "cursor": "nope"}, headers=_auth_header(bob))
+        assert bad.status_code == 400
+
+        conv_id = client.get("/messaging/conversations", headers=_auth_header(bob)).json()["conversations"][0]["id"]
+        client.delete(f"/messaging/conversations/{conv_id}", headers=_auth_header(bob))
+        assert self._search(client, bob, q="proteines")["results"] == []
+        with Session(get_engine()) as session:
+            assert session.execute(text(
+                "SELECT COUNT(*) FROM message_fts WHERE message_fts MATCH 'proteines'"
+            )).scalar() == 0
+            session.execute(text("INSERT INTO message_fts (message_fts) VALUES ('integrity-check')"))
+
+    def test_search_index_follows_edits_and_replaces_legacy_table(self, client, tmp_path):
+        alice, bob = _make_users("alice", "bob")
+        message_id = self._send(client, alice, bob, "séance jambes")
+        with Session(get_engine()) as session:
+            session.execute(text("UPDATE message SET content = 'séance dos' WHERE id = :id"), {"id": message_id})
+            session.commit()
+        assert self._search(client, bob, q="jambes")["results"] == []
+        assert [r["id"] for r in self._search(client, bob, q="dos")["results"]] == [message_id]
+
+        # Ancienne table (message_id UNINDEXED) : remplacée et réindexée
+        legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with legacy.begin() as connection:
+            connection.execute(text("CREATE TABLE message (id TEXT PRIMARY KEY, content TEXT)"))
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE message_fts USING fts5(content, message_id UNINDEXED)"
+            ))
+            connection.execute(text(
+                "CREATE TRIGGER message_fts_delete AFTER DELETE ON message BEGIN "
+                "DELETE FROM message_fts WHERE message_id = old.id; END"
+            ))
+            connection.execute(text("INSERT INTO message VALUES ('m1', 'squat lourd')"))
+            ensure_message_search_index(connection, "sqlite")
+        with legacy.begin() as connection:
+            assert connection.execute(text(
+                "SELECT m.id FROM message_fts JOIN message m ON m.rowid = message_fts.rowid "
+                "WHERE message_fts MATCH 'squat'"
+            )).scalars().all() == ["m1"]
+            connection.execute(text("DELETE FROM message WHERE id = 'm1'"))
+            connection.execute(text("INSERT INTO message_fts (message_fts) VALUES ('integrity-check')"))
+        legacy.dispose()
+
+
+# ---------------------------------------------------------------------------
+# Realtime (WebSocket / SSE)
+# ---------------------------------------------------------------------------
+
+
+class TestRealtime:
+    def test_websocket_pushes_messages_reads_and_typing(self, client):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+
+        with client.websocket_connect(f"/messaging/ws?access_token={create_access_token(alice)}") as ws_alice, \
+                client.websocket_connect("/messaging/ws", headers=_auth_header(bob)) as ws_bob:
+            resp = client.post(
+                f"/messaging/conversations/{conv_id}/messages",
+                json={"content": "Salut Bob"},
+                headers=_auth_header(alice),
+            )
+            message_id = resp.json()["message"]["id"]
+            for ws in (ws_alice, ws_bob):
+                event = ws.receive_json()
+                assert event["type"] == "message"
+                assert event["data"]["id"] == message_id
+                assert event["data"]["content"] == "Salut Bob"
+
+            ws_bob.send_json({"type": "typing", "conversation_id": conv_id})
+            assert ws_alice.receive_json() == {
+                "type": "typing",
+                "data": {"conversation_id": conv_id, "user_id": bob},
+            }
+
+            ws_bob.send_json({"type": "read", "conversation_id": conv_id})
+            event = ws_alice.receive_json()
+            assert event["type"] == "read"
+            assert event["data"]["reader_id"] == bob
+
+        with Session(get_engine()) as session:
+            assert session.get(Conversation, conv_id).participant2_last_read_at is not None
+
+    def test_websocket_ignores_other_conversations(self, client):
+        alice, bob, charlie = _make_users("alice", "bob", "charlie")
+        conv_id = _open_conversation(client, alice, bob)
+
+        with client.websocket_connect("/messaging/ws", headers=_auth_header(bob)) as ws_bob, \
+                client.websocket_connect("/messaging/ws", headers=_auth_header(charlie)) as ws_charlie:
+            # Charlie n'est pas participant : rien n'est publié
+            ws_charlie.send_json({"type": "typing", "conversation_id": conv_id})
+            ws_charlie.send_text("pas du json")
+            client.post(f"/messaging/conversations/{conv_id}/typing", headers=_auth_header(alice))
+            assert ws_bob.receive_json()["data"]["user_id"] == alice
+
+    def test_websocket_read_on_deleted_conversation_keeps_socket_open(self, client):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+
+        with client.websocket_connect("/messaging/ws", headers=_auth_header(bob)) as ws_bob, \
+                client.websocket_connect("/messaging/ws", headers=_auth_header(alice)) as ws_alice:
+            ws_bob.send_json({"type": "typing", "conversation_id": conv_id})
+            assert ws_alice.receive_json()["type"] == "typing"
+            with Session(get_engine()) as session:
+                session.delete(session.get(Conversation, conv_id))
+                session.commit()
+            ws_bob.send_json({"type": "read", "conversation_id": conv_id})
+            # La conversation est oubliée : plus rien n'est publié pour elle
+            ws_bob.send_json({"type": "typing", "conversation_id": conv_id})
+            other = _open_conversation(client, bob, alice)
+            ws_bob.send_json({"type": "typing", "conversation_id": other})
+            assert ws_alice.receive_json()["data"] == {"conversation_id": other, "user_id": bob}
+
+    def test_websocket_rejects_invalid_token(self, client):
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/messaging/ws?access_token=invalid"):
+                pass
+
+    def test_rest_read_publishes_only_when_something_changed(self, client):
+        alice, bob = _make_users("alice", "bob")
+        conv_id = _open_conversation(client, alice, bob)
+        client.post(
+            f"/messaging/conversations/{conv_id}/messages",
+            json={"content": "Hello"},
+            headers=_auth_header(alice),
+        )
+        published = []
+        broker = get_broker()
+        original = broker.publish
+        broker.publish = lambda user_ids, event_type, data: published.append((list(user_ids), event_type))
+        try:
+            client.post(f"/messaging/conversations/{conv_id}/read", headers=_auth_header(bob))
+            client.post(f"/messaging/conversations/{conv_id}/read", headers=_auth_header(bob))
+            client.get(f"/messaging/conversations/{conv_id}/messages", headers=_auth_header(bob))
+        finally:
+            broker.publish = original
+        assert published == [([alice], "read")]
+
+    def test_sse_stream_frames_and_heartbeat(self):
+        set_broker(Broker())
+        try:
+            async def run() -> list[bytes]:
+                stream = _event_stream("alice", _never_disconnected, heartbeat=0.05)
+                frames = [await anext(stream)]
+                get_broker().publish(["alice", "bob"], "typing", {"conversation_id": "c1"})
+                frames.append(await anext(stream))
+                frames.append(await anext(stream))
+                await stream.aclose()
+                return frames
+
+            frames = asyncio.run(run())
+        finally:
+            set_broker(None)
+        assert frames[0].startswith(b"retry:")
+        assert frames[1] == b'data: {"type":"typing","data":{"conversation_id":"c1"}}\n\n'
+        assert frames[2] == b": ping\n\n"
+        assert get_broker().hub.connections() == 0
+
+    def test_sse_endpoint_releases_the_db_connection_while_streaming(self, client, monkeypatch):
+        (alice,) = _make_users("alice")
+        checked_out = []
+
+        async def stream(user_id, is_disconnected):
+            checked_out.append(get_engine().pool.checkedout())
+            yield b"data: {}\n\n"
+
+        monkeypatch.setattr(messaging, "_event_stream", stream)
+        resp = client.get(f"/messaging/events?access_token={create_access_token(alice)}")
+        assert resp.status_code == 200
+        assert checked_out == [0]
+        assert client.get("/messaging/events?access_token=invalid").status_code == 401
+
+
+async def _never_disconnected() -> bool:
+    return False
@@ -0,0 +1,59 @@
+"""Tests de l'endpoint /metrics (format Prometheus, protégé par X-Admin-Key)."""
+import pytest
+
+from api.utils.metrics import Histogram, REGISTRY, record_cache
+
+
+_ADMIN_HEADERS = {"X-Admin-Key": "test-admin-key"}
+
+
+@pytest.fixture(autouse=True)
+def _admin_secret(monkeypatch):
+    monkeypatch.setattr("api.routes.admin._ADMIN_SECRET", "test-admin-key")
+
+
+def test_metrics_requires_admin_key(client):
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"X-Admin-Key": "wrong"}).status_code == 403
+
+
+def test_metrics_exposes_route_latency_and_pool(client):
+    client.get("/")
+    response = client.get("/metrics", headers=_ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'gorillax_http_request_duration_seconds_count{method="GET",route="/",status="2xx"}' in body
+    assert "# TYPE gorillax_http_request_duration_seconds histogram" in body
+    assert "gorillax_http_requests_in_flight" in body
+    assert 'gorillax_db_pool_connections{pool=' in body
+    assert 'gorillax_threadpool_threads{state="total"}' in body
+
+
+def test_metrics_uses_route_template_not_raw_path(client):
+    client.get("/exercises/abc-123")
+    body = client.get("/metrics", headers=_ADMIN_HEADERS).text
+    assert 'route="/exercises/{exercise_id}"' in body
+    assert "abc-123" not in body
+
+
+def test_cache_hits_are_counted(client):
+    record_cache("unit-test", hit=True)
+    record_cache("unit-test", hit=False)
+    body = client.get("/metrics", headers=_ADMIN_HEADERS).text
+    assert 'gorillax_cache_requests_total{cache="unit-test",result="hit"}' in body
+    assert 'gorillax_cache_requests_total{cache="unit-test",result="miss"}' in body
+    assert 'gorillax_cache_entries{cache="salle"}' in body
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("test_hist", "doc", buckets=(0.1, 1.0))
+    hist.observe(0.05)
+    hist.observe(0.5)
+    hist.observe(5.0)
+    lines = hist.render()
+    assert 'test_hist_bucket{le="0.1"} 1' in lines
+    assert 'test_hist_bucket{le="1"} 2' in lines
+    assert 'test_hist_bucket{le="+Inf"} 3' in lines
+    assert "test_hist_count 3" in lines
+    assert REGISTRY.render()
@@ -0,0 +1,254 @@
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from api.db import get_engine
+from api.models import Notification, OutboxEvent, Share, User
+from api.routes import notifications
+from api.routes.notifications import _notification_stream, create_notification, enqueue_notification, event_cursor
+from api.services import outbox
+from api.services.outbox import drain_outbox
+from api.services.realtime import Broker, get_broker, set_broker
+from api.utils.auth import create_access_token, hash_password
+
+
+@pytest.fixture(autouse=True)
+def _auth_env(monkeypatch):
+    monkeypatch.setenv("AUTH_SECRET", "test-secret-that-is-at-least-32-characters-long-ok")
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+
+
+def _users(*usernames: str) -> list[str]:
+    with Session(get_engine()) as session:
+        for username in usernames:
+            session.add(User(id=username, username=username, email=f"{username}@test.local",
+                             password_hash=hash_password("StrongPass1"), email_verified=True))
+        session.commit()
+    return list(usernames)
+
+
+def _share(owner: str) -> str:
+    with Session(get_engine()) as session:
+        share = Share(owner_id=owner, owner_username=owner, workout_title="Push day")
+        session.add(share)
+        session.commit()
+        return share.share_id
+
+
+def _headers(user_id: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+
+def _like(client, share_id: str, user_id: str) -> None:
+    response = client.post(f"/likes/{share_id}", json={"user_id": user_id}, headers=_headers(user_id))
+    assert response.status_code == 200
+
+
+def _notifications(client, user_id: str) -> list[dict]:
+    drain_outbox()
+    return client.get("/notifications", headers=_headers(user_id)).json()["notifications"]
+
+
+def test_likes_on_a_share_are_coalesced(client):
+    owner, *fans = _users("owner", "ana", "ben", "cleo", "dan", "eve")
+    share_id = _share(owner)
+    other_share = _share(owner)
+
+    for fan in fans:
+        _like(client, share_id, fan)
+    # like / unlike / like : pas recompté
+    _like(client, share_id, "eve")
+    _like(client, share_id, "eve")
+    _like(client, other_share, "ana")
+
+    items = _notifications(client, owner)
+    assert len(items) == 2
+    grouped = next(n for n in items if n["reference_id"] == share_id)
+    assert grouped["actor_count"] == 5
+    assert grouped["message"] == "eve et 4 autres ont aimé ta séance"
+    assert [a["username"] for a in grouped["actors"]] == ["eve", "dan", "cleo"]
+    assert items[0]["reference_id"] == other_share  # le plus récent en tête
+    assert items[0]["message"] == "ana a aimé ta séance"
+
+
+def test_new_activity_reopens_a_read_group(client):
+    owner, ana, ben = _users("owner", "ana", "ben")
+    client.post(f"/profile/{owner}/follow", headers=_headers(ana))
+    drain_outbox()
+    client.post("/notifications/read-all", headers=_headers(owner))
+    client.post(f"/profile/{owner}/follow", headers=_headers(ben))
+
+    [item] = _notifications(client, owner)
+    assert item["read"] is False
+    assert item["message"] == "ben et ana ont commencé à te suivre"
+
+
+def test_groups_are_split_by_time_bucket(client, monkeypatch):
+    owner, ana, ben = _users("owner", "ana", "ben")
+    with Session(get_engine()) as session:
+        first = create_notification(session, owner, "like", ana, ana, "ana a aimé ta séance", "s1")
+        # Tranche suivante
+        real_utcnow = notifications.utcnow
+        monkeypatch.setattr(notifications, "utcnow",
+                            lambda: real_utcnow() + timedelta(hours=notifications.NOTIFICATION_GROUP_HOURS))
+        second = create_notification(session, owner, "like", ben, ben, "ben a aimé ta séance", "s1")
+        mention = create_notification(session, owner, "mention", ben, ben, "ben t'a mentionné", "s1")
+        assert first.id != second.id
+        assert mention.group_key is None
+        assert len(session.exec(select(Notification)).all()) == 3
+
+
+def _unread_count(client, user_id: str) -> int:
+    drain_outbox()
+    response = client.get("/notifications/unread-count", headers=_headers(user_id))
+    assert response.status_code == 200
+    return response.json()["unread_count"]
+
+
+def test_unread_counter_follows_reads_and_coalescing(client):
+    owner, ana, ben, cleo = _users("owner", "ana", "ben", "cleo")
+    share_id = _share(owner)
+    _like(client, share_id, ana)
+    _like(client, share_id, ben)  # même groupe : toujours une non lue
+    client.post(f"/profile/{owner}/follow", headers=_headers(cleo))
+    assert _unread_count(client, owner) == 2
+
+    follow = next(n for n in _notifications(client, owner) if n["type"] == "follow")
+    for _ in range(2):  # relire ne décrémente pas deux fois
+        client.post(f"/notifications/{follow['id']}/read", headers=_headers(owner))
+    assert _unread_count(client, owner) == 1
+
+    assert client.post("/notifications/read-all", headers=_headers(owner)).json() == {"marked_read": 1}
+    assert _unread_count(client, owner) == 0
+    _like(client, share_id, cleo)  # groupe lu rouvert
+    assert _unread_count(client, owner) == 1
+    assert client.get("/notifications", headers=_headers(owner)).json()["unread_count"] == 1
+
+    like = next(n for n in _notifications(client, owner) if n["type"] == "like")
+    client.delete(f"/notifications/{like['id']}", headers=_headers(owner))
+    assert _unread_count(client, owner) == 0
+
+
+def test_outbox_batches_notifications_and_publishes_after_commit(monkeypatch):
+    owner, ana, ben = _users("owner", "ana", "ben")
+    published = []
+    monkeypatch.setattr(outbox.realtime, "publish", lambda *event: published.append(event))
+    with Session(get_engine()) as session:
+        for fan in (ana, ben):
+            enqueue_notification(session, owner, "like", fan, fan, f"{fan} a aimé ta séance", "s1")
+        enqueue_notification(session, owner, "mention", ana, ana, "ana t'a mentionné", "s1")
+        session.rollback()  # abandonnés avec la transaction
+        assert drain_outbox() == 0
+
+        for fan in (ana, ben):
+            enqueue_notification(session, owner, "like", fan, fan, f"{fan} a aimé ta séance", "s1")
+        enqueue_notification(session, owner, "mention", ana, ana, "ana t'a mentionné", "s1")
+        session.commit()
+
+    assert drain_outbox() == 3
+    with Session(get_engine()) as session:
+        assert session.exec(select(OutboxEvent)).all() == []
+        assert session.get(User, owner).unread_notifications == 2
+        like = session.exec(select(Notification).where(Notification.type == "like")).one()
+        assert like.message == "ben et ana ont aimé ta séance"
+    assert [(ids, kind, data["unread_count"]) for ids, kind, data in published] == [
+        ([owner], "notification", 2), ([owner], "notification", 2),
+    ]
+
+
+def test_outbox_isolates_a_failing_event(monkeypatch):
+    owner, ana = _users("owner", "ana")
+    monkeypatch.setattr(outbox.realtime, "publish", lambda *event: None)
+    with Session(get_engine()) as session:
+        enqueue_notification(session, owner, "follow", ana, ana, "ana a commencé à te suivre")
+        outbox.enqueue(session, "unknown", {})
+        session.commit()
+
+    assert drain_outbox() == 2
+    with Session(get_engine()) as session:
+        [failed] = session.exec(select(OutboxEvent)).all()
+        assert failed.kind == "unknown"
+        assert failed.attempts == 1
+        assert "LookupError" in failed.last_error
+        assert len(session.exec(select(Notification)).all()) == 1
+
+
+async def _never_disconnected() -> bool:
+    return False
+
+
+def _frame_data(frame: bytes) -> dict:
+    return json.loads(frame.split(b"data: ", 1)[1])
+
+
+def test_stream_pushes_notifications_and_unread_count():
+    owner, ana = _users("owner", "ana")
+    set_broker(Broker())
+    try:
+        async def run() -> list[bytes]:
+            stream = _notification_stream(owner, 0, None, _never_disconnected, heartbeat=0.05)
+            frames = [await anext(stream), await anext(stream)]
+            with Session(get_engine()) as session:
+                enqueue_notification(session, owner, "follow", ana, ana, "ana a commencé à te suivre")
+                session.commit()
+            await asyncio.to_thread(drain_outbox)
+            get_broker().publish([owner], "typing", {"conversation_id": "c1"})  # pas pour ce flux
+            frames.append(await anext(stream))
+            frames.append(await anext(stream))
+            await stream.aclose()
+            return frames
+
+        frames = asyncio.run(run())
+    finally:
+        set_broker(None)
+    assert frames[0].startswith(b"retry:")
+    assert _frame_data(frames[1]) == {"type": "unread_count", "data": {"unread_count": 0}}
+    assert frames[2].startswith(b"id: ")
+    event = _frame_data(frames[2])
+    assert event["type"] == "notification"
+    assert event["data"]["unread_count"] == 1
+    assert event["data"]["notification"]["message"] == "ana a commencé à te suivre"
+    assert frames[3] == b": ping\n\n"
+
+
+def test_stream_endpoint_releases_the_db_connection_while_streaming(client, monkeypatch):
+    owner, ana = _users("owner", "ana")
+    with Session(get_engine()) as session:
+        create_notification(session, owner, "follow", ana, ana, "ana a commencé à te suivre")
+    calls = []
+
+    async def stream(user_id, unread_count, since, is_disconnected):
+        calls.append((unread_count, get_engine().pool.checkedout()))
+        yield b"data: {}\n\n"
+
+    monkeypatch.setattr(notifications, "_notification_stream", stream)
+    resp = client.get(f"/notifications/stream?access_token={create_access_token(owner)}")
+    assert resp.status_code == 200
+    assert calls == [(1, 0)]
+    assert client.get("/notifications/stream?access_token=invalid").status_code == 401
+
+
+def test_stream_replays_notifications_after_last_event_id(monkeypatch):
+    owner, ana, ben = _users("owner", "ana", "ben")
+    with Session(get_engine()) as session:
+        seen = create_notification(session, owner, "follow", ana, ana, "ana a commencé à te suivre")
+        missed = create_notification(session, owner, "mention", ben, ben, "ben t'a mentionné")
+        since = event_cursor(seen.updated_at)
+
+    async def run() -> list[bytes]:
+        stream = _notification_stream(owner, 2, notifications._parse_event_cursor(since),
+                                      _never_disconnected, heartbeat=0.05)
+        frames = [await anext(stream) for _ in range(3)]
+        await stream.aclose()
+        return frames
+
+    frames = asyncio.run(run())
+    assert frames[2].startswith(f"id: {event_cursor(missed.updated_at)}\n".encode())
+    assert _frame_data(frames[2])["data"]["notification"]["id"] == missed.id
+
+    monkeypatch.setattr(notifications, "NOTIFICATION_REPLAY_LIMIT", 0)
+    frames = asyncio.run(run())
+    assert _frame_data(frames[2]) == {"type": "resync", "data": {}}
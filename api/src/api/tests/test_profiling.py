@@ -0,0 +1,66 @@
+"""Tests du profilage à la demande (X-Profile: 1 + X-Admin-Key)."""
+import pytest
+
+from api.seeds import seed_exercises
+
+
+_ADMIN_HEADERS = {"X-Admin-Key": "test-admin-key"}
+
+
+@pytest.fixture(autouse=True)
+def _admin_secret(monkeypatch):
+    monkeypatch.setattr("api.routes.admin._ADMIN_SECRET", "test-admin-key")
+
+
+def test_request_without_header_is_not_profiled(client):
+    response = client.get("/exercises", headers=_ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_profile_requires_admin_key(client):
+    response = client.get("/exercises", headers={"X-Profile": "1", "X-Admin-Key": "wrong"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_profiled_request_stores_report_with_sql(client):
+    seed_exercises(force=True)
+    response = client.get("/exercises", headers={"X-Profile": "1", **_ADMIN_HEADERS})
+    assert response.status_code == 200
+    assert len(response.json()) == 15
+    profile_id = response.headers["x-profile-id"]
+
+    report = client.get(f"/admin/profiles/{profile_id}", headers=_ADMIN_HEADERS).json()
+    assert report["path"] == "/exercises"
+    assert report["status_code"] == 200
+    assert report["sql_count"] >= 1
+    assert any("FROM exercise" in q["statement"] for q in report["sql"])
+
+    listing = client.get("/admin/profiles", headers=_ADMIN_HEADERS).json()
+    assert listing["profiles"][0]["id"] == profile_id
+
+    collapsed = client.get(f"/admin/profiles/{profile_id}/collapsed", headers=_ADMIN_HEADERS)
+    assert collapsed.status_code == 200
+    for line in collapsed.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("thread:")
+        assert int(count) > 0
+
+
+def test_unknown_profile_returns_404(client):
+    response = client.get("/admin/profiles/nope", headers=_ADMIN_HEADERS)
+    assert response.status_code == 404
+
+
+def test_failed_profiler_start_releases_the_lock(client, monkeypatch):
+    from api.utils import profiling
+
+    def _refuse(hook):
+        if hook is not None:
+            raise RuntimeError("profiler already installed")
+
+    monkeypatch.setattr(profiling.threading, "setprofile_all_threads", _refuse)
+    with pytest.raises(RuntimeError):
+        client.get("/exercises", headers={"X-Profile": "1", **_ADMIN_HEADERS})
+    assert not profiling._profile_lock.locked()
@@ -0,0 +1,120 @@
+import random
+
+from sqlmodel import Session
+
+from api.db import get_engine
+from api.models import Exercise
+from api.services.exercise_catalogue import CatalogueState, bump_catalogue_version
+from api.services.exercise_index import ExerciseEntry, ExerciseIndex
+from api.services.program_generator import (
+    CompiledCatalogue,
+    _select_exercise,
+    derive_seed,
+    generate_program,
+    get_compiled_catalogue,
+    get_program_skeleton,
+    profile_key,
+)
+
+
+def _entry(i: int, name: str, muscle: str, equipment: str = "barbell") -> ExerciseEntry:
+    return ExerciseEntry(
+        id=f"ex-{i}", name=name, slug=f"ex-{i}", category=muscle, muscle_group=muscle,
+        equipment=equipment, instructions=None, video_url=None, version=1,
+    )
+
+
+CATALOGUE = (
+    _entry(0, "Bench Press", "chest"),
+    _entry(1, "Cable Fly", "Pectoraux", "cable"),
+    _entry(2, "Push-up", "chest", "bodyweight"),
+    _entry(3, "Barbell Curl", "arms"),
+    _entry(4, "Tricep Pushdown", "arms", "dumbbell"),
+    _entry(5, "Back Squat", "legs"),
+    _entry(6, "Leg Curl", "posterior_chain", "machine"),
+)
+
+
+def _compiled() -> CompiledCatalogue:
+    return CompiledCatalogue(ExerciseIndex(CatalogueState(1, 0), CATALOGUE))
+
+
+def _names(compiled: CompiledCatalogue, mask: int) -> list[str]:
+    return [e.name for i, e in enumerate(compiled.exercises) if mask >> i & 1]
+
+
+def test_compiled_pools():
+    compiled = _compiled()
+    assert _names(compiled, compiled.muscle_mask("chest")) == ["Bench Press", "Cable Fly", "Push-up"]
+    assert _names(compiled, compiled.muscle_mask("biceps")) == ["Barbell Curl"]
+    assert _names(compiled, compiled.muscle_mask("triceps")) == ["Tricep Pushdown"]
+    assert _names(compiled, compiled.muscle_mask("glutes")) == ["Back Squat", "Leg Curl"]
+    assert _names(compiled, compiled.role_pool("compound")) == ["Bench Press", "Back Squat"]
+    assert _names(compiled, compiled.injury_masks["Genoux"]) == ["Back Squat"]
+    assert _names(compiled, compiled.equipment_mask(["Haltères"])) == ["Push-up", "Tricep Pushdown"]
+
+
+def test_profile_candidates_and_selection():
+    compiled = _compiled()
+    candidates = compiled.for_profile(profile_key({"equipment_available": ["câble"], "injuries": "Genoux"}))
+    # Peu d'exercices retenus : le poids du corps est ajouté en repli
+    assert [e.name for e in candidates.exercises] == ["Cable Fly", "Push-up"]
+
+    candidates = compiled.for_profile(profile_key({}))
+    rng = random.Random(0)
+    first = _select_exercise(candidates, "Pectoraux", "compound", used=0, rng=rng)
+    assert compiled.exercises[first].name == "Bench Press"
+    # Déjà utilisé → repli sur les autres exercices du muscle
+    second = _select_exercise(candidates, "chest", "compound", used=compiled.key_mask(first), rng=rng)
+    assert compiled.exercises[second].name in {"Cable Fly", "Push-up"}
+    assert _select_exercise(candidates, "calves", "isolation", used=0, rng=rng) is None
+
+
+def test_compiled_catalogue_follows_catalogue_version(client):
+    with Session(get_engine()) as session:
+        compiled = get_compiled_catalogue(session)
+        assert get_compiled_catalogue(session) is compiled
+
+        session.add(Exercise(name="Standing Calf Raise", slug="standing-calf-raise-calves",
+                             muscle_group="calves", equipment="machine",
+                             version=bump_catalogue_version(session)))
+        session.commit()
+        refreshed = get_compiled_catalogue(session)
+        assert refreshed is not compiled
+        assert "Standing Calf Raise" in _names(refreshed, refreshed.muscle_mask("calves"))
+        assert "Standing Calf Raise" not in _names(compiled, compiled.muscle_mask("calves"))
+
+        program = generate_program(session, {"frequency": 3, "duration_weeks": 2})
+        assert len(program["sessions"]) == 6
+        assert all(s["sets"] for s in program["sessions"])
+
+
+def test_profile_key_normalizes_equivalent_profiles():
+    a = profile_key({"frequency": 6, "niveau": "Débutant", "objective": "Prise de masse",
+                     "equipment_available": ["Haltères", "machine "], "duree_seance": "60min"})
+    b = profile_key({"frequency": 5, "niveau": "debutant", "objective": "Hypertrophie musculaire",
+                     "equipment_available": ["Machine", "haltères"], "duree_seance": "60"})
+    assert a == b
+    assert a.frequency == 4 and a.session_minutes == 60
+    assert derive_seed("u1", a) == derive_seed("u1", b)
+    assert derive_seed("u1", a) != derive_seed("u2", a)
+    assert derive_seed("u1", a) != derive_seed("u1", a, variant=1)
+    assert get_program_skeleton(a) is get_program_skeleton(b)
+
+
+def test_generation_is_deterministic(client):
+    profile = {"frequency": 4, "duration_weeks": 5, "niveau": "Avancé", "objective": "Force",
+               "user_id": "user-1", "duree_seance": "60"}
+    with Session(get_engine()) as session:
+        first = generate_program(session, dict(profile))
+        random.seed(123)  # le module random global n'intervient pas
+        assert generate_program(session, dict(profile)) == first
+
+        other_user = generate_program(session, {**profile, "user_id": "user-2"})
+        variants = [generate_program(session, dict(profile), seed=i) for i in range(5)]
+
+    def slugs(program):
+        return [[s["exercise_slug"] for s in session["sets"]] for session in program["sessions"]]
+
+    assert first["sessions"][-1]["title"].endswith("Deload")
+    assert slugs(other_user) != slugs(first) or any(slugs(v) != slugs(first) for v in variants)
@@ -0,0 +1,225 @@
+"""Invariants et benchmark du générateur de programmes sur tout l'espace des profils.
+
+L'espace : fréquence (1–7) × niveau × objectif × équipement × blessures ×
+durée du programme × durée de séance (~21 500 profils), générés sur le
+catalogue de ``test_benchmarks`` sans base de données.
+
+Toujours exécuté : un échantillon déterministe vérifie les invariants stricts.
+Avec ``RUN_BENCHMARKS=1`` : les mêmes invariants sur l'espace complet, plus
+latence par profil (médiane, p95) et pic d'allocations (tracemalloc, sur un
+échantillon), comparés à ``benchmarks_baseline.json`` (clé
+``program_space``) ; ``UPDATE_BENCHMARKS=1`` réécrit la baseline.
+
+Invariants stricts :
+
+- deload en dernière semaine si et seulement si ≥ 5 semaines, avec au plus
+  70 % des séries de la semaine précédente (ou le plancher de 2 séries par
+  exercice) et un RPE plus bas ;
+- durée estimée ≤ ``duree_seance`` + 3 min, et ≥ ``duree_seance`` − 3 min
+  hors deload, sauf ``KNOWN_SHORT_SESSIONS`` ;
+- pas d'exercice répété dans une séance ;
+- hors deload, séries directes par muscle et par semaine dans [MV, MRV]
+  (``VOLUME_LANDMARKS``) ; sous le MV seulement pour ``KNOWN_VOLUME_GAPS``,
+  jamais au-dessus du MRV.
+
+Les deux listes d'écarts connus décrivent des limites structurelles du
+générateur (blueprints, budget de temps) ; tout autre écart fait échouer le
+test.
+"""
+import itertools
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+
+import pytest
+
+from api.services.exercise_catalogue import CatalogueState
+from api.services.exercise_index import ExerciseEntry, ExerciseIndex
+from api.services.program_generator import (
+    VOLUME_LANDMARKS,
+    CompiledCatalogue,
+    ProfileKey,
+    _normalize_muscle,
+    build_program,
+    profile_key,
+)
+
+from .test_benchmarks import (
+    BASELINE_PATH,
+    LATENCY_SLACK_MS,
+    LATENCY_TOLERANCE,
+    _catalogue,
+    _load_baseline,
+)
+
+FREQUENCIES = range(1, 8)
+LEVELS = ("Débutant", "Intermédiaire", "Avancé")
+GOALS = ("Force", "Hypertrophie", "Perte de poids", "Endurance")
+EQUIPMENT = ((), ("Haltères",), ("Barre", "machine"), ("câble", "Haltères", "machine"))
+INJURIES = ((), ("Genoux",), ("Dos", "Épaules"), ("Coudes", "Poignets"))
+WEEKS = (1, 4, 5, 8)
+SESSION_MINUTES = ("30", "45", "60", "90")
+
+TOLERANCE_MINUTES = 3
+SAMPLE_STEP = 97       # échantillon toujours exécuté
+ALLOCATION_STEP = 50   # profils mesurés sous tracemalloc
+
+_ARMS_AND_CALVES = frozenset({"biceps", "triceps", "calves"})
+
+# Profils autorisés sous le MV : (condition sur le profil normalisé, muscles, raison)
+KNOWN_VOLUME_GAPS = (
+    (lambda key: key.frequency * key.session_minutes <= 90, frozenset(VOLUME_LANDMARKS),
+     "budget hebdomadaire ≤ 90 min : les MV cumulés (41 séries) n'y tiennent pas"),
+    (lambda key: key.frequency <= 3, _ARMS_AND_CALVES,
+     "split Full Body : pas de slot mollets, un seul slot bras (biceps ou triceps)"),
+    (lambda key: key.session_minutes == 30, _ARMS_AND_CALVES,
+     "séance de 30 min : les isolations de fin de blueprint ne tiennent pas"),
+)
+
+# Séances autorisées sous duree_seance − 3 min : (frequence ou None, minutes, focus) -> raison
+_AT_SET_CAPS = "blueprint au plafond de séries par exercice : moins de 87 min"
+KNOWN_SHORT_SESSIONS = {
+    (None, 90, "Haut du corps"): _AT_SET_CAPS,
+    (None, 90, "Bas du corps"): _AT_SET_CAPS,
+    (None, 90, "Poussée"): _AT_SET_CAPS,
+    (None, 90, "Jambes"): _AT_SET_CAPS,
+    (None, 90, "Tirage"): _AT_SET_CAPS + " ; dos au MRV à la 2e séance de tirage",
+    (6, 60, "Tirage"): "PPL 6×/semaine : dos au MRV à la 2e séance de tirage",
+}
+
+
+def _profiles() -> list[dict]:
+    profiles = []
+    for frequency, level, goal, equipment, injuries, weeks, minutes in itertools.product(
+        FREQUENCIES, LEVELS, GOALS, EQUIPMENT, INJURIES, WEEKS, SESSION_MINUTES,
+    ):
+        profile = {
+            "frequency": frequency, "niveau": level, "objective": goal,
+            "equipment_available": list(equipment), "duration_weeks": weeks,
+            "duree_seance": minutes, "user_id": "space",
+        }
+        if injuries:
+            profile.update(has_blessure=True, blessure_first=injuries[0],
+                           blessure_second=injuries[1] if len(injuries) > 1 else None)
+        profiles.append(profile)
+    return profiles
+
+
+@pytest.fixture(scope="module")
+def space():
+    entries = tuple(ExerciseEntry.from_row(row) for row in _catalogue())
+    catalogue = CompiledCatalogue(ExerciseIndex(CatalogueState(1, 0), entries))
+    muscles = {entry.slug: _normalize_muscle(entry.muscle_group) for entry in entries}
+    return catalogue, muscles, _profiles()
+
+
+def _series(program_set: dict) -> int:
+    return int(program_set["notes"].split()[0])  # « 4 séries »
+
+
+def _volume_gap_allowed(key: ProfileKey, muscle: str) -> bool:
+    return any(applies(key) and muscle in gap_muscles for applies, gap_muscles, _reason in KNOWN_VOLUME_GAPS)
+
+
+def _short_session_allowed(key: ProfileKey, focus: str) -> bool:
+    return any((frequency, key.session_minutes, focus) in KNOWN_SHORT_SESSIONS
+               for frequency in (None, key.frequency))
+
+
+def _check_program(profile: dict, program: dict, muscles: dict[str, str]) -> None:
+    """Vérifie les invariants stricts (voir le docstring du module)."""
+    key = profile_key(profile)
+    weeks = profile["duration_weeks"]
+    target = int(profile["duree_seance"])
+    sessions = program["sessions"]
+    per_week = len(sessions) // weeks
+    assert per_week * weeks == len(sessions)
+    has_deload = weeks >= 5
+
+    week_sets: list[int] = []
+    week_exercises: list[int] = []
+    week_rpe: list[float] = []
+    for week in range(weeks):
+        week_sessions = sessions[week * per_week:(week + 1) * per_week]
+        is_deload = has_deload and week == weeks - 1
+        assert all(s["title"].endswith("Deload") == is_deload for s in week_sessions), profile
+
+        volume: Counter[str] = Counter()
+        rpes = []
+        for s in week_sessions:
+            slugs = [ps["exercise_slug"] for ps in s["sets"]]
+            assert len(slugs) == len(set(slugs)), profile
+            assert s["estimated_minutes"] <= target + TOLERANCE_MINUTES, profile
+            if not is_deload and not _short_session_allowed(key, s["focus"]):
+                assert s["estimated_minutes"] >= target - TOLERANCE_MINUTES, (profile, s["title"])
+            for ps in s["sets"]:
+                volume[muscles[ps["exercise_slug"]]] += _series(ps)
+                rpes.append(ps["rpe"])
+        week_sets.append(sum(volume.values()))
+        week_exercises.append(sum(len(s["sets"]) for s in week_sessions))
+        week_rpe.append(statistics.fmean(rpes) if rpes else 0.0)
+
+        if not is_deload:
+            for muscle, (mv, _mev, _mav_lo, _mav_hi, mrv) in VOLUME_LANDMARKS.items():
+                assert volume[muscle] <= mrv, (profile, week + 1, muscle, volume[muscle])
+                if not _volume_gap_allowed(key, muscle):
+                    assert volume[muscle] >= mv, (profile, week + 1, muscle, volume[muscle])
+
+    if has_deload:
+        assert week_sets[-1] <= max(0.7 * week_sets[-2], 2 * week_exercises[-1]), profile
+        assert week_rpe[-1] < week_rpe[-2], profile
+
+
+def test_invariants_on_profile_sample(space):
+    catalogue, muscles, profiles = space
+    for profile in profiles[::SAMPLE_STEP]:
+        _check_program(profile, build_program(catalogue, dict(profile)), muscles)
+
+
+@pytest.mark.skipif(os.getenv("RUN_BENCHMARKS") != "1", reason="set RUN_BENCHMARKS=1 to run benchmarks")
+def test_profile_space_benchmark(space):
+    catalogue, muscles, profiles = space
+    timings: list[float] = []
+    for profile in profiles:
+        start = time.perf_counter()
+        program = build_program(catalogue, dict(profile))
+        timings.append((time.perf_counter() - start) * 1000)
+        _check_program(profile, program, muscles)
+
+    peaks: list[int] = []
+    tracemalloc.start()
+    try:
+        for profile in profiles[::ALLOCATION_STEP]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            build_program(catalogue, dict(profile))
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        "profiles": len(profiles),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(statistics.quantiles(timings, n=20)[-1], 3),
+        "peak_kib": round(max(peaks) / 1024, 1),
+    }
+    print(f"\nprogram_space: {result}")
+
+    baseline = _load_baseline()
+    if os.getenv("UPDATE_BENCHMARKS") == "1":
+        baseline["program_space"] = result
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        return
+    expected = baseline.get("program_space")
+    if expected is None:
+        return
+
+    for key in ("median_ms", "p95_ms"):
+        max_ms = expected[key] * LATENCY_TOLERANCE + LATENCY_SLACK_MS
+        assert result[key] <= max_ms, f"{key}: {result[key]} ms, baseline {expected[key]} ms (max {max_ms:.1f})"
+    assert result["peak_kib"] <= expected["peak_kib"] * LATENCY_TOLERANCE, (
+        f"peak allocations: {result['peak_kib']} KiB, baseline {expected['peak_kib']} KiB"
+    )
@@ -1,8 +1,11 @@
+import pytest
+from sqlalchemy import event
 from sqlmodel import Session, select
 
 
 from api.db import get_engine, reset_engine, init_db
-from api.models import Program, ProgramSession, ProgramSet
+from api.models import CoachProfile, Program, ProgramSession, ProgramSet, Set, User, Workout, WorkoutExercise
+from api.utils.auth import create_access_token, hash_password
 
 
 def setup_function() -> None:
@@ -50,3 +53,199 @@ def test_create_program(client):
     assert len(programs) == 1
     assert len(sessions) == 1
     assert len(sets) == 1
+
+
+_AUTH_SECRET = "test-secret-that-is-at-least-32-characters-long-ok"
+
+
+@pytest.fixture()
+def coach_headers(monkeypatch) -> dict[str, str]:
+    monkeypatch.setenv("AUTH_SECRET", _AUTH_SECRET)
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "false")
+    with Session(get_engine()) as session:
+        session.add(User(id="coach-1", username="coach", email="coach@test.local",
+                         password_hash=hash_password("StrongPass1"), email_verified=True))
+        session.add(CoachProfile(user_id="coach-1", display_name="Coach"))
+        session.commit()
+    return {"Authorization": f"Bearer {create_access_token('coach-1')}"}
+
+
+_CLIENTS = [
+    {"frequency": 3, "duration_weeks": 2, "niveau": "Débutant", "objective": "Force"},
+    {"frequency": 4, "duration_weeks": 2, "niveau": "Avancé", "has_blessure": True, "blessure_first": "Genoux"},
+    {"frequency": 2, "duration_weeks": 1, "equipment_available": ["Haltères"], "seed": 3},
+]
+
+
+def test_generate_batch_persists_programs_for_coach(client, coach_headers):
+    response = client.post("/programs/generate/batch", json={"profiles": _CLIENTS}, headers=coach_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["generated"] == 3 and body["failed"] == 0
+    assert [item["index"] for item in body["results"]] == [0, 1, 2]
+    assert [len(item["program"]["sessions"]) for item in body["results"]] == [6, 8, 2]
+
+    with Session(get_engine()) as session:
+        assert len(session.exec(select(Program).where(Program.user_id == "coach-1")).all()) == 3
+        assert session.get(User, "coach-1").ai_programs_generated == 3
+    # Blessure déclarée par le coach pour ce client : pas de squat
+    knee_program = body["results"][1]["program"]
+    assert all("squat" not in s["exercise_slug"] for ps in knee_program["sessions"] for s in ps["sets"])
+
+
+def test_generate_batch_on_process_pool_matches_inline(client, coach_headers, monkeypatch):
+    from api.services import program_pool
+
+    jobs = [({**profile, "user_id": "coach-1"}, "Programme", None) for profile in _CLIENTS * 2]
+    with Session(get_engine()) as session:
+        monkeypatch.setattr(program_pool, "PROGRAM_POOL_WORKERS", 1)
+        inline = program_pool.generate_programs(session, jobs)
+        monkeypatch.setattr(program_pool, "PROGRAM_POOL_WORKERS", 2)
+        monkeypatch.setattr(program_pool, "PROGRAM_POOL_MIN_BATCH", 2)
+        try:
+            pooled = program_pool.generate_programs(session, jobs)
+        finally:
+            program_pool.shutdown_program_pool()
+    assert pooled == inline
+
+
+def test_replaced_pool_is_left_alone_and_cancelled_jobs_run_inline(client, coach_headers, monkeypatch):
+    from concurrent.futures import Future
+
+    from api.services import program_pool
+
+    class _StalePool:
+        """Pool arrêté par une autre requête : submit refusé."""
+        def submit(self, fn, job):
+            raise RuntimeError("cannot schedule new futures after shutdown")
+
+    class _CancellingPool:
+        def submit(self, fn, job):
+            future = Future()
+            future.cancel()
+            return future
+
+    jobs = [({**profile, "user_id": "coach-1"}, "Programme", None) for profile in _CLIENTS * 2]
+    current_pool = object()  # pool créé par la requête concurrente
+    monkeypatch.setattr(program_pool, "PROGRAM_POOL_WORKERS", 2)
+    monkeypatch.setattr(program_pool, "PROGRAM_POOL_MIN_BATCH", 2)
+    monkeypatch.setattr(program_pool, "_executor", current_pool)
+    with Session(get_engine()) as session:
+        inline = program_pool._run_inline(program_pool.get_compiled_catalogue(session), jobs)
+        for pool in (_StalePool(), _CancellingPool()):
+            monkeypatch.setattr(program_pool, "_get_executor", lambda index, pool=pool: pool)
+            assert program_pool.generate_programs(session, jobs) == inline
+            assert program_pool._executor is current_pool
+
+
+def test_generate_batch_checks_coach_and_quota(client, coach_headers, monkeypatch):
+    with Session(get_engine()) as session:
+        session.add(User(id="user-2", username="user2", email="u2@test.local",
+                         password_hash=hash_password("StrongPass1"), email_verified=True))
+        coach = session.get(User, "coach-1")
+        coach.ai_programs_generated = 8
+        session.add(coach)
+        session.commit()
+
+    user_headers = {"Authorization": f"Bearer {create_access_token('user-2')}"}
+    response = client.post("/programs/generate/batch", json={"profiles": _CLIENTS}, headers=user_headers)
+    assert response.status_code == 403 and response.json()["detail"] == "not_a_coach"
+
+    # 8 + 3 > 10 : tout le lot est refusé, rien n'est généré
+    response = client.post("/programs/generate/batch", json={"profiles": _CLIENTS}, headers=coach_headers)
+    assert response.status_code == 403 and response.json()["detail"] == "ai_program_limit_reached"
+    response = client.post("/programs/generate/batch", json={"profiles": _CLIENTS[:2]}, headers=coach_headers)
+    assert response.status_code == 200
+    assert client.post("/programs/generate/batch", json={"profiles": []}, headers=coach_headers).status_code == 422
+
+
+@pytest.fixture()
+def insert_statements():
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT"):
+            statements.append(statement)
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _record)
+
+
+def test_program_write_paths_use_bulk_inserts(client, coach_headers, insert_statements):
+    sessions = [
+        {"day_index": day, "title": f"Séance {day + 1}", "focus": "Full Body", "estimated_minutes": 60,
+         "sets": [{"exercise_slug": f"ex-{i // 3}", "reps": "8-12", "rpe": 8, "order_index": i}
+                  for i in range(9)]}
+        for day in range(60)
+    ]
+    response = client.post("/programs", headers=coach_headers,
+                           json={"title": "12 semaines", "duration_weeks": 12, "sessions": sessions})
+    assert response.status_code == 201
+    # programme + sessions + sets, quelle que soit la longueur du programme
+    assert len(insert_statements) == 3
+    program_id = response.json()["id"]
+
+    insert_statements.clear()
+    response = client.post(f"/programs/{program_id}/save", headers=coach_headers)
+    assert response.status_code == 200
+    assert response.json()["workouts_created"] == 60
+    assert len(insert_statements) == 3
+
+    with Session(get_engine()) as session:
+        workouts = session.exec(select(Workout).where(Workout.user_id == "coach-1")).all()
+        assert sorted(w.title for w in workouts) == sorted(f"Séance {d + 1}" for d in range(60))
+        workout = next(w for w in workouts if w.title == "Séance 1")
+        exercises = session.exec(select(WorkoutExercise).where(WorkoutExercise.workout_id == workout.id)
+                                 .order_by(WorkoutExercise.order_index)).all()
+        assert [(e.exercise_id, e.planned_sets) for e in exercises] == [("ex-0", 3), ("ex-1", 3), ("ex-2", 3)]
+        sets = session.exec(select(Set).where(Set.workout_exercise_id == exercises[0].id)
+                            .order_by(Set.order)).all()
+        assert [(s.order, s.reps, s.completed) for s in sets] == [(0, 8, False), (1, 8, False), (2, 8, False)]
+        assert all(s.created_at is not None for s in sets)
+
+
+@pytest.fixture()
+def select_statements():
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _record)
+
+
+def test_program_reads_are_batched_and_cached(client, coach_headers, select_statements):
+    for weeks in (1, 4, 12):
+        sessions = [
+            {"day_index": day, "title": f"J{day}",
+             "sets": [{"exercise_slug": "squat", "order_index": i} for i in (2, 0, 1)]}
+            for day in reversed(range(weeks * 3))
+        ]
+        created = client.post("/programs", headers=coach_headers,
+                              json={"title": f"{weeks} sem", "duration_weeks": weeks, "sessions": sessions})
+        assert created.status_code == 201
+
+    # Les créations ont rempli le cache : aucune lecture de sessions/sets
+    select_statements.clear()
+    listed = client.get("/programs", headers=coach_headers).json()
+    assert not [s for s in select_statements if "programsession" in s or "programset" in s]
+    assert [p["title"] for p in listed] == ["1 sem", "4 sem", "12 sem"]
+
+    # Cache vide : 2 requêtes IN quel que soit le nombre de programmes / séances
+    from api.routes import programs as programs_routes
+    programs_routes._program_cache.clear()
+    select_statements.clear()
+    assert client.get("/programs", headers=coach_headers).json() == listed
+    assert len([s for s in select_statements if "programsession" in s or "programset" in s]) == 2
+
+    long_program = listed[2]
+    assert [s["day_index"] for s in long_program["sessions"]] == list(range(36))
+    assert [s["order_index"] for s in long_program["sessions"][0]["sets"]] == [0, 1, 2]
+    detail = client.get(f"/programs/{long_program['id']}", headers=coach_headers)
+    assert detail.status_code == 200 and detail.json() == long_program
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session
+
+from api.db import get_engine
+from api.models import Follower, Share, User, Workout
+from api.schemas import ExerciseRead, FeedResponse, SyncPullResponse
+from api.seeds import seed_exercises
+from api.utils import responses
+from api.utils.auth import create_access_token, hash_password
+
+
+@pytest.fixture(autouse=True)
+def _auth_secret(monkeypatch):
+    monkeypatch.setenv("AUTH_SECRET", "test-secret-that-is-at-least-32-characters-long-ok")
+
+
+SAMPLE = FeedResponse(
+    items=[{
+        "share_id": "sh_1",
+        "owner_id": "u1",
+        "owner_username": "léa",
+        "workout_title": "Séance jambes",
+        "exercise_count": 2,
+        "set_count": 8,
+        "created_at": datetime(2026, 3, 1, 12, 30, 15, 123456),
+        "comments": [{"id": "c1", "username": "max", "content": "Bravo 💪"}],
+    }],
+    next_cursor=datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc),
+)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_pydantic_serialization(monkeypatch, use_orjson):
+    if use_orjson and responses.orjson is None:
+        pytest.skip("orjson not installed")
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+
+    raw = SAMPLE.model_dump()
+    assert responses.dumps(raw) == SAMPLE.model_dump_json().encode()
+    # Les datetimes avec offset non nul gardent leur offset
+    paris = datetime(2026, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=1)))
+    assert responses.dumps({"at": paris}) == b'{"at":"2026-03-01T12:30:00+01:00"}'
+
+
+def _seed_reader() -> str:
+    with Session(get_engine()) as session:
+        owner = User(username="owner", email="owner@test.com", password_hash=hash_password("Pass1234"))
+        reader = User(username="reader", email="reader@test.com", password_hash=hash_password("Pass1234"))
+        session.add_all([owner, reader])
+        session.commit()
+        for i in range(3):
+            session.add(Share(
+                share_id=f"sh_{i}", owner_id=owner.id, owner_username="owner",
+                workout_title=f"Séance {i}", exercise_count=1, set_count=1,
+                snapshot={}, created_at=datetime.now(timezone.utc) - timedelta(minutes=i),
+            ))
+        session.add(Follower(follower_id=reader.id, followed_id=owner.id))
+        session.add(Workout(user_id=reader.id, client_id="w1", title="Push"))
+        session.commit()
+        return reader.id
+
+
+def test_fast_endpoints_match_response_models(client):
+    reader_id = _seed_reader()
+    seed_exercises(force=True)
+    client.headers["Authorization"] = f"Bearer {create_access_token(reader_id)}"
+
+    feed = client.get("/feed?limit=2")
+    assert feed.status_code == 200
+    assert feed.headers["content-type"] == "application/json"
+    assert len(feed.json()["items"]) == 2
+    assert FeedResponse.model_validate(feed.json()).model_dump(mode="json") == feed.json()
+
+    pull = client.get("/sync/pull?since=0")
+    assert pull.status_code == 200
+    assert len(pull.json()["events"]) == 1
+    assert SyncPullResponse.model_validate(pull.json()).model_dump(mode="json") == pull.json()
+
+    exercises = client.get("/exercises")
+    assert exercises.status_code == 200
+    for item in exercises.json():
+        assert ExerciseRead.model_validate(item).model_dump(mode="json") == item
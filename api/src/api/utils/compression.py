@@ -0,0 +1,268 @@
+"""Response compression negotiated via Accept-Encoding (brotli, gzip).
+
+Bodies below ``COMPRESSION_MIN_SIZE`` bytes go out untouched: on small JSON the
+headers and CPU cost more than the bytes saved. Streaming responses are
+compressed chunk by chunk with a sync flush so the client still receives each
+chunk as soon as it is produced.
+
+Opt-out:
+- per route with the ``@skip_compression`` decorator on the endpoint;
+- per content type (already-compressed formats, SSE) via ``EXCLUDED_CONTENT_TYPES``;
+- any response that already carries a Content-Encoding.
+
+brotli is used when installed (``pip install brotli``), gzip otherwise.
+"""
+from __future__ import annotations
+
+import os
+import zlib
+from collections.abc import Callable
+from typing import Any, Optional, TypeVar
+
+from starlette.datastructures import MutableHeaders
+
+from .metrics import REGISTRY, _route_label
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # type: ignore
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Qualité 4-5 : bon compromis CPU / ratio pour de la compression à la volée
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+EXCLUDED_CONTENT_TYPES: tuple[str, ...] = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/pdf",
+    "application/vnd.apple.pkpass",
+    "text/event-stream",
+)
+
+COMPRESSION_INPUT_BYTES = REGISTRY.counter(
+    "gorillax_http_compression_input_bytes_total",
+    "Response bytes before compression, by route and encoding.",
+)
+COMPRESSION_OUTPUT_BYTES = REGISTRY.counter(
+    "gorillax_http_compression_output_bytes_total",
+    "Response bytes sent after compression, by route and encoding.",
+)
+COMPRESSION_SAVED_BYTES = REGISTRY.counter(
+    "gorillax_http_compression_saved_bytes_total",
+    "Bytes saved by response compression, by route and encoding.",
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def skip_compression(endpoint: F) -> F:
+    """Marque un endpoint dont la réponse ne doit jamais être compressée."""
+    endpoint._skip_compression = True  # type: ignore[attr-defined]
+    return endpoint
+
+
+class _GzipCompressor:
+    def __init__(self) -> None:
+        # wbits=31 : en-tête et trailer gzip
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def flush(self) -> bytes:
+        return self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._z.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self) -> None:
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+_COMPRESSORS: dict[str, Callable[[], Any]] = {"gzip": _GzipCompressor}
+if brotli is not None:
+    _COMPRESSORS["br"] = _BrotliCompressor
+
+# Préférence serveur à q égal
+_PREFERENCE = ("br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Choisit l'encodage supporté de plus haut q (br avant gzip à égalité)."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+
+    best: Optional[str] = None
+    best_q = 0.0
+    for encoding in _PREFERENCE:
+        if encoding not in _COMPRESSORS:
+            continue
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _header(scope: dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing responses according to Accept-Encoding."""
+
+    def __init__(
+        self,
+        app: Any,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        excluded_content_types: tuple[str, ...] = EXCLUDED_CONTENT_TYPES,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_content_types = excluded_content_types
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(_header(scope, b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(
+        self, middleware: CompressionMiddleware, scope: dict[str, Any], send: Any, encoding: str
+    ) -> None:
+        self.middleware = middleware
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.start: Optional[dict[str, Any]] = None
+        # None : en attente du premier chunk ; "identity" ou "stream" ensuite
+        self.mode: Optional[str] = None
+        self.compressor: Any = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _eligible(self) -> bool:
+        assert self.start is not None
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return False
+        headers = MutableHeaders(raw=self.start["headers"])
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(self.middleware.excluded_content_types):
+            return False
+        endpoint = getattr(self.scope.get("route"), "endpoint", None)
+        return not getattr(endpoint, "_skip_compression", False)
+
+    def _compressed_headers(self, content_length: Optional[int]) -> None:
+        assert self.start is not None
+        headers = MutableHeaders(raw=self.start.setdefault("headers", []))
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+    def _record(self) -> None:
+        labels = {"route": _route_label(self.scope), "encoding": self.encoding}
+        COMPRESSION_INPUT_BYTES.inc(self.bytes_in, labels=labels)
+        COMPRESSION_OUTPUT_BYTES.inc(self.bytes_out, labels=labels)
+        COMPRESSION_SAVED_BYTES.inc(self.bytes_in - self.bytes_out, labels=labels)
+
+    async def send(self, message: dict[str, Any]) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Retenu jusqu'au premier chunk : on ne connaît pas encore la taille
+            self.start = {**message, "headers": list(message.get("headers", []))}
+            return
+        if message_type != "http.response.body":
+            if self.start is not None and self.mode is None:
+                self.mode = "identity"
+                await self.downstream(self.start)
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            if not self._eligible():
+                self.mode = "identity"
+            elif not more_body:
+                await self._send_whole(body)
+                return
+            else:
+                self.mode = "stream"
+                self.compressor = _COMPRESSORS[self.encoding]()
+                self._compressed_headers(None)
+            await self.downstream(self.start)
+
+        if self.mode == "identity":
+            await self.downstream(message)
+            return
+
+        self.bytes_in += len(body)
+        chunk = self.compressor.compress(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        self.bytes_out += len(chunk)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            self._record()
+
+    async def _send_whole(self, body: bytes) -> None:
+        assert self.start is not None
+        self.mode = "identity"
+        if len(body) < self.middleware.minimum_size:
+            MutableHeaders(raw=self.start["headers"]).add_vary_header("Accept-Encoding")
+            await self.downstream(self.start)
+            await self.downstream({"type": "http.response.body", "body": body})
+            return
+        compressor = _COMPRESSORS[self.encoding]()
+        compressed = compressor.compress(body) + compressor.finish()
+        self.bytes_in, self.bytes_out = len(body), len(compressed)
+        self._compressed_headers(len(compressed))
+        await self.downstream(self.start)
+        await self.downstream({"type": "http.response.body", "body": compressed})
+        self._record()
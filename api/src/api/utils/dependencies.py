@@ -8,7 +8,7 @@ from typing import Annotated, Optional
 from fastapi import Depends, HTTPException, status, Header, Query
 from sqlmodel import Session
 
-from ..db import get_session, set_session_user_id
+from ..db import get_engine, get_session, set_session_user_id
 from ..models import User
 from .auth import decode_token
 
@@ -59,6 +59,19 @@ def get_current_user_header_or_query(
     return _user_from_token(token, session)
 
 
+def get_stream_user(
+    authorization: Annotated[Optional[str], Header()] = None,
+    access_token: Annotated[Optional[str], Query()] = None,
+) -> User:
+    """Comme ``get_current_user_header_or_query``, dans une session courte.
+
+    Pour les flux (SSE) : la session de requête ne se ferme qu'à la fin de la
+    réponse, elle garderait une connexion du pool pendant tout le flux.
+    """
+    with Session(get_engine()) as session:
+        return get_current_user_header_or_query(authorization, access_token, session)
+
+
 def require_premium(
     current_user: User = Depends(get_current_user),
 ) -> User:
@@ -71,14 +84,22 @@ def require_premium(
     return current_user
 
 
+FREE_AI_PROGRAMS = 10
+
+
+def check_ai_program_quota(user: User, count: int = 1) -> None:
+    """Raise 403 unless ``user`` may generate ``count`` more AI programs."""
+    if user.subscription_tier in ("premium",):
+        return
+    if user.ai_programs_generated + count > FREE_AI_PROGRAMS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="ai_program_limit_reached")
+
+
 def check_ai_program_limit(
     current_user: User = Depends(get_current_user),
 ) -> User:
     """Allow 10 free AI programs, then require premium."""
-    if current_user.subscription_tier in ("premium",):
-        return current_user
-    if current_user.ai_programs_generated >= 10:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="ai_program_limit_reached")
+    check_ai_program_quota(current_user)
     return current_user
 
 
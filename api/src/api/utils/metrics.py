@@ -0,0 +1,359 @@
+"""In-process metrics exposed in Prometheus text format.
+
+Counters and histograms are updated under a per-metric lock held only for a
+dict lookup and a few integer additions, so instrumentation is cheap enough to
+stay on in production. Gauges that reflect external state (DB pool, threadpool,
+cache sizes, queue depths) are computed at scrape time by registered collectors.
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from threading import Lock
+from typing import Any
+
+# Buckets (secondes) adaptés à une API mobile : de 5 ms à 10 s.
+DEFAULT_LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[str, dict[str, str], float]
+
+
+def _labels_key(labels: dict[str, str] | None) -> Labels:
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: dict[Labels, float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0, labels: dict[str, str] | None = None) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, labels: dict[str, str] | None = None) -> float:
+        with self._lock:
+            return self._values.get(_labels_key(labels), 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (in-flight requests, queue depth...)."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, labels: dict[str, str] | None = None) -> None:
+        self.inc(-amount, labels)
+
+    def set(self, value: float, labels: dict[str, str] | None = None) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, rendered the Prometheus way."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # Par série : [compte par bucket (+Inf inclus), somme]
+        self._series: dict[Labels, list[Any]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, labels: dict[str, str] | None = None) -> None:
+        key = _labels_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, labels: dict[str, str] | None = None) -> int:
+        with self._lock:
+            series = self._series.get(_labels_key(labels))
+            return sum(series[0]) if series else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1]) for k, v in self._series.items()]
+        lines: list[str] = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += n
+                labels = _format_labels((*key, ("le", _format_value(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: dict[str, tuple[str, str, Callable[[], Iterable[Sample]]]] = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, cls: type, name: str, documentation: str, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def register_collector(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Iterable[Sample]],
+        kind: str = "gauge",
+    ) -> None:
+        """Register a callback evaluated at scrape time. Re-registering replaces it."""
+        with self._lock:
+            self._collectors[name] = (kind, documentation, collect)
+
+    def render(self, extra: Iterable[tuple[str, str, str, Iterable[Sample]]] = ()) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        lines: list[str] = []
+        for metric in metrics:
+            body = metric.render()
+            if not body:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(body)
+
+        def _emit(name: str, kind: str, documentation: str, samples: Iterable[Sample]) -> None:
+            rendered = [
+                f"{sample_name}{_format_labels(_labels_key(labels))} {_format_value(value)}"
+                for sample_name, labels, value in samples
+            ]
+            if not rendered:
+                return
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(rendered)
+
+        for name, (kind, documentation, collect) in collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                # Un collecteur défaillant ne doit pas casser tout le scrape
+                continue
+            _emit(name, kind, documentation, samples)
+        for name, kind, documentation, samples in extra:
+            _emit(name, kind, documentation, samples)
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "gorillax_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status class.",
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "gorillax_http_requests_in_flight",
+    "HTTP requests currently being processed.",
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "gorillax_cache_requests_total",
+    "In-memory cache lookups by cache name and result (hit/miss).",
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup. Hit rate = hit / (hit + miss) per cache."""
+    CACHE_REQUESTS.inc(labels={"cache": cache, "result": "hit" if hit else "miss"})
+
+
+_CACHE_SIZES: dict[str, Callable[[], int]] = {}
+_QUEUE_DEPTHS: dict[str, Callable[[], int]] = {}
+
+
+def register_cache(name: str, size: Callable[[], int]) -> None:
+    """Expose the number of entries held by an in-memory cache."""
+    _CACHE_SIZES[name] = size
+
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """Expose the depth of a background queue, sampled at scrape time."""
+    _QUEUE_DEPTHS[name] = depth
+
+
+def _collect_queue_depths() -> Iterable[Sample]:
+    for name, depth in list(_QUEUE_DEPTHS.items()):
+        yield "gorillax_queue_depth", {"queue": name}, float(depth())
+
+
+def _collect_cache_sizes() -> Iterable[Sample]:
+    for name, size in list(_CACHE_SIZES.items()):
+        yield "gorillax_cache_entries", {"cache": name}, float(size())
+
+
+REGISTRY.register_collector(
+    "gorillax_cache_entries",
+    "Entries currently held by in-memory caches.",
+    _collect_cache_sizes,
+)
+REGISTRY.register_collector(
+    "gorillax_queue_depth",
+    "Pending items in background queues.",
+    _collect_queue_depths,
+)
+
+
+def _collect_db_pool() -> Iterable[Sample]:
+    from ..db import get_engine
+
+    pool = get_engine().pool
+    for state, attr in (
+        ("size", "size"),
+        ("checked_out", "checkedout"),
+        ("overflow", "overflow"),
+        ("checked_in", "checkedin"),
+    ):
+        fn = getattr(pool, attr, None)
+        if callable(fn):
+            labels = {"pool": type(pool).__name__, "state": state}
+            yield "gorillax_db_pool_connections", labels, float(fn())
+
+
+REGISTRY.register_collector(
+    "gorillax_db_pool_connections",
+    "SQLAlchemy connection pool state (size, checked_out, overflow, checked_in).",
+    _collect_db_pool,
+)
+
+
+def threadpool_samples() -> list[Sample]:
+    """Threadpool saturation (anyio limiter used by sync endpoints).
+
+    Must be called from the event loop thread.
+    """
+    from anyio import to_thread
+
+    limiter = to_thread.current_default_thread_limiter()
+    name = "gorillax_threadpool_threads"
+    return [
+        (name, {"state": "borrowed"}, float(limiter.borrowed_tokens)),
+        (name, {"state": "total"}, float(limiter.total_tokens)),
+        (name, {"state": "waiting"}, float(limiter.statistics().tasks_waiting)),
+    ]
+
+
+def _route_label(scope: dict[str, Any]) -> str:
+    # Le template de route (/users/{user_id}) et pas le chemin brut, pour borner la cardinalité
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path else "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and in-flight requests per route."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def _send(message: dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                labels={
+                    "route": _route_label(scope),
+                    "method": scope.get("method", ""),
+                    "status": f"{status_code // 100}xx",
+                },
+            )
@@ -0,0 +1,241 @@
+"""On-demand request profiling (X-Profile: 1 + X-Admin-Key).
+
+A profiled request runs normally; while it is in flight a sampling thread
+records the Python stacks of every thread currently executing code on behalf
+of that request (event loop task or threadpool worker, tracked through a
+context variable that anyio copies into worker threads). SQL statements issued
+under the same context are captured with their duration. The report is stored
+in memory and its id returned in the ``X-Profile-Id`` response header; the
+stacks are exported in collapsed format (flamegraph.pl, speedscope, inferno).
+
+Nothing is installed when the header is absent: no profiler hook, no SQL
+listener, only a header lookup in the middleware.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", "20"))
+
+
+@dataclass
+class ProfileReport:
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    interval_ms: float
+    status_code: int = 0
+    duration_ms: float = 0.0
+    stacks: dict[str, int] = field(default_factory=dict)
+    sql: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Une ligne ``frame;frame;frame count`` par pile (format flame graph)."""
+        ordered = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in ordered)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 2),
+            "samples": self.sample_count,
+            "sql_count": len(self.sql),
+            "sql_ms": round(sum(q["duration_ms"] for q in self.sql), 2),
+        }
+
+
+_ACTIVE_PROFILE: ContextVar[Optional[ProfileReport]] = ContextVar("active_profile", default=None)
+
+# Un seul profil à la fois : le hook est global (tous les threads)
+_profile_lock = threading.Lock()
+_profiled_threads: set[int] = set()
+
+_reports: OrderedDict[str, ProfileReport] = OrderedDict()
+_reports_lock = threading.Lock()
+
+
+def get_report(report_id: str) -> Optional[ProfileReport]:
+    with _reports_lock:
+        return _reports.get(report_id)
+
+
+def list_reports() -> list[ProfileReport]:
+    with _reports_lock:
+        return list(reversed(_reports.values()))
+
+
+def _store_report(report: ProfileReport) -> None:
+    with _reports_lock:
+        _reports[report.id] = report
+        while len(_reports) > PROFILE_MAX_REPORTS:
+            _reports.popitem(last=False)
+
+
+def _thread_hook(frame: Any, event_name: str, arg: Any) -> None:
+    # Appelé sur chaque appel Python de chaque thread pendant un profil uniquement
+    if event_name != "call":
+        return
+    if _ACTIVE_PROFILE.get() is not None:
+        _profiled_threads.add(threading.get_ident())
+    else:
+        _profiled_threads.discard(threading.get_ident())
+
+
+def _stack_key(thread_name: str, frame: Any) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        parts.append(f"{code.co_qualname} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    parts.append(f"thread:{thread_name}")
+    parts.reverse()
+    return ";".join(parts)
+
+
+def _sampler(report: ProfileReport, stop: threading.Event) -> None:
+    interval = report.interval_ms / 1000.0
+    own_id = threading.get_ident()
+    while not stop.wait(interval):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        for tid in tuple(_profiled_threads):
+            if tid == own_id:
+                continue
+            frame = frames.get(tid)
+            if frame is None:
+                continue
+            key = _stack_key(names.get(tid, str(tid)), frame)
+            report.stacks[key] = report.stacks.get(key, 0) + 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _ACTIVE_PROFILE.get() is not None:
+        conn.info.setdefault("_profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    report = _ACTIVE_PROFILE.get()
+    if report is None:
+        return
+    starts = conn.info.get("_profile_query_start")
+    started = starts.pop() if starts else time.perf_counter()
+    report.sql.append({
+        "statement": statement,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        "executemany": bool(executemany),
+    })
+
+
+class _Session:
+    """Installe le hook de threads, l'échantillonneur et les listeners SQL."""
+
+    def __init__(self, report: ProfileReport) -> None:
+        self.report = report
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=_sampler, args=(report, self._stop), name="profile-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        _profiled_threads.clear()
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        threading.setprofile_all_threads(_thread_hook)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Défait ce que ``start`` a installé, même si ``start`` a échoué en cours de route."""
+        threading.setprofile_all_threads(None)
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+        for name, listener in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if event.contains(Engine, name, listener):
+                event.remove(Engine, name, listener)
+        _profiled_threads.clear()
+
+
+def _header(scope: dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: profiles requests sent with ``X-Profile: 1`` by an admin.
+
+    ``authorize`` reçoit la valeur de X-Admin-Key et retourne True si elle est valide.
+    """
+
+    def __init__(self, app: Any, authorize: Callable[[str], bool]) -> None:
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or _header(scope, b"x-profile") != "1":
+            await self.app(scope, receive, send)
+            return
+        if not self.authorize(_header(scope, b"x-admin-key") or ""):
+            await self.app(scope, receive, send)
+            return
+        # Déjà un profil en cours : on sert la requête sans profiler
+        if not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        report = ProfileReport(
+            id=uuid.uuid4().hex,
+            method=scope.get("method", ""),
+            path=scope.get("path", ""),
+            started_at=datetime.now(timezone.utc),
+            interval_ms=PROFILE_SAMPLE_INTERVAL_MS,
+        )
+
+        async def _send(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                report.status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", report.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        session = _Session(report)
+        token = _ACTIVE_PROFILE.set(report)
+        start = time.perf_counter()
+        try:
+            session.start()
+            await self.app(scope, receive, _send)
+        finally:
+            report.duration_ms = (time.perf_counter() - start) * 1000
+            _ACTIVE_PROFILE.reset(token)
+            session.stop()
+            _profile_lock.release()
+            _store_report(report)
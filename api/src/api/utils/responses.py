@@ -0,0 +1,51 @@
+"""Fast JSON response path for hot endpoints.
+
+FastAPI validates and re-serializes whatever a handler returns through its
+``response_model``. For endpoints that build their payload from trusted data
+(rows we just read ourselves) that second validation pass is pure CPU. Returning
+a ``FastJSONResponse`` bypasses it: FastAPI hands Response instances back as-is,
+while ``response_model`` stays on the route for the OpenAPI schema.
+
+orjson is used when installed; otherwise the stdlib encoder produces the same
+output (ISO 8601 datetimes, ``Z`` suffix for UTC, like Pydantic).
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        if value.utcoffset() is not None and value.utcoffset().total_seconds() == 0:
+            return text[:-6] + "Z"
+        return text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize trusted content (dicts, lists, datetimes, Pydantic models) to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson, without response_model validation."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)